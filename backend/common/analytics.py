@@ -0,0 +1,233 @@
+"""Daily usage counters which are aggregated in memory and periodically written to sharded Firestore documents."""
+
+from __future__ import annotations
+from collections import Counter, defaultdict
+from collections.abc import Iterable
+from datetime import date, datetime, timedelta, timezone
+import random
+import threading
+import time
+from typing import TypeVar
+from urllib.parse import parse_qsl, urlencode
+
+from google.cloud import firestore
+
+from backend.common.database import Database
+from backend.common.models import AnalyticsShard, Library
+
+# The number of shards each day's counters are spread across
+NUM_SHARDS = 10
+# The minimum number of seconds between writes from a single worker
+FLUSH_INTERVAL = 30
+# The number of days of inserts used to compute popularity
+POPULARITY_DAYS = 60
+# The number of days after which an insert counts for half as much towards popularity
+POPULARITY_HALF_LIFE = 14
+
+
+def get_day(value: datetime | None = None) -> str:
+    """Returns the day of a given time (or now) in UTC in YYYY-MM-DD format."""
+    if value == None:
+        value = datetime.now(timezone.utc)
+    return value.astimezone(timezone.utc).date().isoformat()
+
+
+def encode_configuration(configuration: dict[str, str]) -> str:
+    """Encodes a configuration as a stable string which can be used as a counter key."""
+    return urlencode(sorted(configuration.items()))
+
+
+def decode_configuration(key: str) -> dict[str, str]:
+    return dict(parse_qsl(key, keep_blank_values=True))
+
+
+class DayCounts:
+    """Pending counts for a single day."""
+
+    def __init__(self) -> None:
+        self.app_opens = 0
+        self.libraries: Counter[str] = Counter()
+        self.elements: defaultdict[str, Counter[str]] = defaultdict(Counter)
+        self.configurations: defaultdict[str, Counter[str]] = defaultdict(Counter)
+
+    def merge(self, other: DayCounts) -> None:
+        """Adds another set of counts to these counts."""
+        self.app_opens += other.app_opens
+        self.libraries.update(other.libraries)
+        for library, counter in other.elements.items():
+            self.elements[library].update(counter)
+        for element_id, counter in other.configurations.items():
+            self.configurations[element_id].update(counter)
+
+    def to_increments(self) -> dict:
+        """Returns the counts as a partial AnalyticsShard of Firestore increments."""
+
+        def increments(counter: Counter[str]) -> dict:
+            return {key: firestore.Increment(count) for key, count in counter.items()}
+
+        data: dict = {}
+        if self.app_opens > 0:
+            data["appOpens"] = firestore.Increment(self.app_opens)
+        if len(self.libraries) > 0:
+            data["libraries"] = increments(self.libraries)
+        if len(self.elements) > 0:
+            data["elements"] = {
+                library: increments(counter)
+                for library, counter in self.elements.items()
+            }
+        if len(self.configurations) > 0:
+            data["configurations"] = {
+                element_id: increments(counter)
+                for element_id, counter in self.configurations.items()
+            }
+        return data
+
+
+class UsageAnalytics:
+    """Aggregates usage events in memory so each worker writes at most once per flush interval."""
+
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL) -> None:
+        self.flush_interval = flush_interval
+        self._pending: defaultdict[str, DayCounts] = defaultdict(DayCounts)
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def record_app_opened(self) -> None:
+        with self._lock:
+            self._pending[get_day()].app_opens += 1
+
+    def record_part_inserted(
+        self,
+        library: Library,
+        element_id: str,
+        configuration: dict[str, str] | None = None,
+    ) -> None:
+        with self._lock:
+            counts = self._pending[get_day()]
+            counts.libraries[library] += 1
+            counts.elements[library][element_id] += 1
+            if configuration != None:
+                counts.configurations[element_id][
+                    encode_configuration(configuration)
+                ] += 1
+
+    def flush(self, db: Database, force: bool = False) -> None:
+        """Writes pending counts to a random shard of each day.
+
+        Counts which fail to write are kept so the next flush retries them, and the error is re-raised.
+
+        Parameters:
+            force: Whether to write even if the flush interval hasn't elapsed.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_flush < self.flush_interval:
+                return
+            self._last_flush = now
+            pending = self._pending
+            self._pending = defaultdict(DayCounts)
+
+        unwritten: dict[str, DayCounts] = {}
+        error: Exception | None = None
+        for day, counts in pending.items():
+            shard = db.get_analytics_shard(day, random.randrange(NUM_SHARDS))
+            try:
+                # merge=True merges nested maps, so only the incremented counters are touched
+                shard.update(counts.to_increments())
+            except Exception as e:
+                unwritten[day] = counts
+                error = e
+
+        if error != None:
+            with self._lock:
+                for day, counts in unwritten.items():
+                    self._pending[day].merge(counts)
+            raise error
+
+
+ANALYTICS = UsageAnalytics()
+
+
+def get_days(end: date, count: int) -> list[str]:
+    """Returns count days ending at (and including) end."""
+    return [(end - timedelta(days=offset)).isoformat() for offset in range(count)]
+
+
+def read_shards(db: Database, days: list[str]) -> dict[str, list[AnalyticsShard]]:
+    """Reads every shard of the given days in a single round trip.
+
+    Returns:
+        A mapping of days to their shards. Missing shards are omitted.
+    """
+    shard_docs = db.get_all(
+        db.get_analytics_shard(day, shard)
+        for day in days
+        for shard in range(NUM_SHARDS)
+    )
+
+    shards: dict[str, list[AnalyticsShard]] = {day: [] for day in days}
+    for index, shard_doc in enumerate(shard_docs):
+        shard = shard_doc.maybe_get()
+        if shard != None:
+            shards[days[index // NUM_SHARDS]].append(shard)
+    return shards
+
+
+def sum_shards(shards: Iterable[AnalyticsShard]) -> AnalyticsShard:
+    """Sums multiple shards into a single AnalyticsShard."""
+    totals = AnalyticsShard()
+    for shard in shards:
+        totals.appOpens += shard.appOpens
+        add_counts(totals.libraries, shard.libraries)
+        for library, counts in shard.elements.items():
+            add_counts(totals.elements.setdefault(library, {}), counts)
+        for element_id, counts in shard.configurations.items():
+            add_counts(totals.configurations.setdefault(element_id, {}), counts)
+    return totals
+
+
+def read_totals(db: Database, days: list[str]) -> AnalyticsShard:
+    """Sums every shard of the given days into a single AnalyticsShard."""
+    shards = read_shards(db, days)
+    return sum_shards(shard for day_shards in shards.values() for shard in day_shards)
+
+
+def add_counts(totals: dict[str, int], counts: dict[str, int]) -> None:
+    for key, count in counts.items():
+        totals[key] = totals.get(key, 0) + count
+
+
+N = TypeVar("N", int, float)
+
+
+def top_n(counts: dict[str, N], n: int) -> list[tuple[str, N]]:
+    """Returns the n largest counts, largest first."""
+    return sorted(counts.items(), key=lambda item: item[1], reverse=True)[:n]
+
+
+def compute_popularity(
+    db: Database,
+    library: Library,
+    today: date,
+    num_days: int = POPULARITY_DAYS,
+    half_life: float = POPULARITY_HALF_LIFE,
+) -> dict[str, float]:
+    """Scores each element of a library by its number of inserts, with older inserts counting for less.
+
+    Parameters:
+        half_life: The number of days after which an insert counts for half as much.
+
+    Returns:
+        A mapping of element ids to scores.
+    """
+    days = get_days(today, num_days)
+    shards = read_shards(db, days)
+
+    scores: dict[str, float] = {}
+    for age, day in enumerate(days):
+        weight = 0.5 ** (age / half_life)
+        day_totals = sum_shards(shards[day])
+        for element_id, count in day_totals.elements.get(library, {}).items():
+            scores[element_id] = scores.get(element_id, 0) + count * weight
+
+    return {element_id: round(score, 3) for element_id, score in scores.items()}
@@ -1,12 +1,25 @@
+from datetime import datetime, timedelta, timezone
 from functools import wraps
 import inspect
+import threading
+import time
 
-import flask
 from backend.common import connect
 from backend.common import env
+from backend.common.app_logging import APP_LOGGER
 from backend.common.backend_exceptions import AuthException
+from backend.common.database import Database, delete_collection
+from backend.common.models import CachedAccessLevel
 from onshape_api.api.api_base import Api
-from onshape_api.endpoints.users import AccessLevel, get_access_level
+from onshape_api.api.oauth_api import OAuthApi
+from onshape_api.endpoints.users import AccessLevel, get_access_level, get_user_id
+
+
+def get_access_level_override() -> AccessLevel | None:
+    """Returns the access level every user has in development, if ACCESS_LEVEL_OVERRIDE is set."""
+    if env.IS_PRODUCTION or env.ACCESS_LEVEL_OVERRIDE == None:
+        return None
+    return AccessLevel(env.ACCESS_LEVEL_OVERRIDE)
 
 
 def compute_app_access_level(api: Api) -> AccessLevel:
@@ -16,8 +29,9 @@ def compute_app_access_level(api: Api) -> AccessLevel:
         # In production get the user's access level, no ifs or buts
         return get_access_level(api, env.ADMIN_TEAM)
 
-    if env.ACCESS_LEVEL_OVERRIDE != None:
-        return AccessLevel(env.ACCESS_LEVEL_OVERRIDE)
+    access_level_override = get_access_level_override()
+    if access_level_override != None:
+        return access_level_override
 
     if env.ADMIN_TEAM == None:
         raise ValueError(
@@ -26,16 +40,111 @@ def compute_app_access_level(api: Api) -> AccessLevel:
     return get_access_level(api, env.ADMIN_TEAM)
 
 
-def get_app_access_level() -> AccessLevel:
-    access_level = flask.session.get("access_level")
+class AccessLevelCache:
+    """A TTL cache mapping user ids to access levels.
+
+    Entries are stored in Firestore so they are shared across sessions and workers.
+    A short lived in-process cache sits in front of Firestore to avoid a read on every access check.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        ttl: timedelta = timedelta(minutes=15),
+        local_ttl: timedelta = timedelta(minutes=1),
+    ) -> None:
+        """
+        Parameters:
+            local_ttl: How long entries are kept in-process. Invalidations may take this long to reach other workers.
+        """
+        self.db = db
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self._local: dict[str, tuple[AccessLevel, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str) -> AccessLevel | None:
+        with self._lock:
+            local = self._local.get(user_id)
+        if local != None:
+            access_level, local_expires_at = local
+            if local_expires_at > time.monotonic():
+                return access_level
+
+        cached = self.db.get_access_level(user_id).maybe_get()
+        if cached == None or cached.expiresAt < datetime.now(timezone.utc):
+            return None
+
+        self._set_local(user_id, cached.accessLevel)
+        return cached.accessLevel
+
+    def set(self, user_id: str, access_level: AccessLevel) -> None:
+        self.db.get_access_level(user_id).set(
+            CachedAccessLevel(
+                accessLevel=access_level,
+                expiresAt=datetime.now(timezone.utc) + self.ttl,
+            )
+        )
+        self._set_local(user_id, access_level)
+
+    def invalidate(self, user_id: str | None = None) -> None:
+        """Removes a user's cached access level, or every cached access level if user_id is None."""
+        with self._lock:
+            if user_id == None:
+                self._local.clear()
+            else:
+                self._local.pop(user_id, None)
+
+        if user_id == None:
+            delete_collection(self.db.access_levels)
+        else:
+            self.db.get_access_level(user_id).delete()
+
+    def _set_local(self, user_id: str, access_level: AccessLevel) -> None:
+        with self._lock:
+            self._local[user_id] = (
+                access_level,
+                time.monotonic() + self.local_ttl.total_seconds(),
+            )
+
+
+ACCESS_LEVEL_CACHE = AccessLevelCache(connect.get_db())
+
 
+def get_cached_access_level(api: Api, user_id: str) -> AccessLevel:
+    access_level = ACCESS_LEVEL_CACHE.get(user_id)
     if access_level == None:
-        api = connect.get_api()
         access_level = compute_app_access_level(api)
+        ACCESS_LEVEL_CACHE.set(user_id, access_level)
+    return access_level
 
-        flask.session["access_level"] = access_level
 
-    return access_level
+def get_app_access_level() -> AccessLevel:
+    # Skips looking up the session's user
+    access_level_override = get_access_level_override()
+    if access_level_override != None:
+        return access_level_override
+
+    user_id = connect.get_session_user_id()
+    return get_cached_access_level(connect.get_api(), user_id)
+
+
+def prewarm_access_level(api: OAuthApi, session_id: str) -> None:
+    """Resolves the user id and access level of a newly signed in session in the background.
+
+    This moves the Onshape calls needed by the first access check off of the request path.
+    """
+
+    def _prewarm():
+        try:
+            user_id = get_user_id(api)
+            connect.save_session_user_id(connect.get_db(), session_id, user_id)
+            get_cached_access_level(api, user_id)
+        except Exception:
+            # The first access check will try again
+            APP_LOGGER.exception("Failed to prewarm the access level of a new session")
+
+    threading.Thread(target=_prewarm, daemon=True).start()
 
 
 def check_access_level(required_access_level: AccessLevel = AccessLevel.MEMBER):
@@ -1,20 +1,26 @@
+import atexit
 from enum import StrEnum
 import logging
 from logging import Handler, LogRecord
 import pprint
+import queue
+import threading
+from typing import Callable
 import google.cloud.logging as cloud_logging
 
 
-from backend.common import env
+from backend.common import connect, env
+from backend.common.analytics import ANALYTICS
 from backend.common.database import (
     ConfigurationParameters,
+    DocumentRef,
 )
 from backend.common.env import IS_PRODUCTION, VERBOSE_LOGGING
 
 from backend.common.models import (
-    Document,
     Library,
     ParameterType,
+    VersionInfo,
     get_parameter_type_name,
 )
 from onshape_api.api.onshape_logger import ONSHAPE_LOGGER
@@ -73,6 +79,108 @@ set_logging_level(FLASK_LOGGER)
 set_logging_level(ONSHAPE_LOGGER)
 
 
+# Dropped tasks are logged once per this many drops so a full queue doesn't flood the logs
+DROP_LOG_INTERVAL = 100
+
+
+class TelemetryPipeline:
+    """A bounded queue of telemetry tasks which are run in batches by a background thread.
+
+    Tasks may perform database lookups, so they should be submitted instead of being run on the request path.
+    If the queue is full, new tasks are dropped rather than blocking requests.
+    """
+
+    def __init__(
+        self, max_size: int = 1000, batch_size: int = 50, wait_timeout: float = 10
+    ) -> None:
+        """
+        Parameters:
+            wait_timeout: The maximum number of seconds to wait for new tasks before running flush hooks.
+        """
+        self.batch_size = batch_size
+        self.wait_timeout = wait_timeout
+        self.dropped = 0
+        self._queue: queue.Queue[Callable[[], None]] = queue.Queue(max_size)
+        self._flush_hooks: list[Callable[[bool], None]] = []
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def add_flush_hook(self, hook: Callable[[bool], None]) -> None:
+        """Adds a function which is called after every batch and when the pipeline is flushed.
+
+        The hook is passed True when the pipeline is flushed, in which case it should write everything it has buffered.
+        """
+        self._flush_hooks.append(hook)
+
+    def submit(self, task: Callable[[], None]) -> bool:
+        """Adds a task to the queue. Returns False if the task was dropped."""
+        self._start()
+        try:
+            self._queue.put_nowait(task)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                dropped = self.dropped
+            if dropped % DROP_LOG_INTERVAL == 1:
+                APP_LOGGER.warning(f"Telemetry queue is full, dropped {dropped} tasks")
+            return False
+        return True
+
+    def flush(self) -> None:
+        """Blocks until every submitted task has been run."""
+        if self._thread != None:
+            self._queue.join()
+        self._run_flush_hooks(True)
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread != None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="telemetry", daemon=True
+            )
+            self._thread.start()
+
+    def _run_flush_hooks(self, force: bool) -> None:
+        for hook in self._flush_hooks:
+            try:
+                hook(force)
+            except Exception:
+                APP_LOGGER.exception("Failed to run telemetry flush hook")
+
+    def _run(self) -> None:
+        while True:
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=self.wait_timeout))
+            except queue.Empty:
+                pass
+
+            while 0 < len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            for task in batch:
+                try:
+                    task()
+                except Exception:
+                    APP_LOGGER.exception("Failed to run telemetry task")
+
+            for handler in CLOUD_LOGGER.handlers:
+                handler.flush()
+            self._run_flush_hooks(False)
+
+            for _ in batch:
+                self._queue.task_done()
+
+
+TELEMETRY = TelemetryPipeline()
+TELEMETRY.add_flush_hook(lambda force: ANALYTICS.flush(connect.DATABASE, force))
+atexit.register(TELEMETRY.flush)
+
+
 class LogType(StrEnum):
     APP_OPENED = "App opened"
     PART_INSERTED = "Part inserted"
@@ -88,7 +196,12 @@ def make_log_extra(log_data: dict | None = None) -> dict:
 
 def log_app_opened(user_id: str):
     log_data = {"userId": user_id}
-    CLOUD_LOGGER.info(LogType.APP_OPENED, extra=make_log_extra(log_data))
+
+    def write_log() -> None:
+        ANALYTICS.record_app_opened()
+        CLOUD_LOGGER.info(LogType.APP_OPENED, extra=make_log_extra(log_data))
+
+    TELEMETRY.submit(write_log)
 
 
 def build_config_array(
@@ -100,11 +213,7 @@ def build_config_array(
 
     config_array = []
     for id, value in configuration.items():
-        config_parameter = next(
-            parameter
-            for parameter in configuration_parameters.parameters
-            if parameter.id == id
-        )
+        config_parameter = configuration_parameters.get_parameter(id)
         if config_parameter == None:
             continue
 
@@ -115,11 +224,9 @@ def build_config_array(
             "value": value,
         }
         if config_parameter.type == ParameterType.ENUM:
-            option_name = next(
-                option.name for option in config_parameter.options if option.id == value
-            )
-            if option_name != None:
-                config_dict["value"] = option_name
+            option = configuration_parameters.get_option(id, value)
+            if option != None:
+                config_dict["value"] = option.name
 
         config_array.append(config_dict)
     return config_array
@@ -133,31 +240,51 @@ def log_part_inserted(
     is_favorite: bool,
     is_quick_insert: bool,
     library: Library,
-    document: Document,
+    document_ref: DocumentRef,
+    version_id: str,
+    version_info: VersionInfo | None = None,
     configuration: dict[str, str] | None = None,
     configuration_parameters: ConfigurationParameters | None = None,
     supports_fasten: bool = False,
     fasten: bool = False,
 ):
-    """Logs adding an element to an assembly or part studio."""
-    log_data = {
-        "name": name,
-        "elementId": element_id,
-        "userId": user_id,
-        "version": {
-            "createdAt": str(document.versionInfo.createdAt),
-            "name": document.versionInfo.name,
-            "id": document.instanceId,
-        },
-        "targetElementType": str(target_element_type),
-        "library": str(library),
-        "quickInsert": is_quick_insert,
-        "isFavorite": is_favorite,
-        "supportsFasten": supports_fasten,
-        "fasten": fasten,
-    }
-    if configuration != None:
-        log_data["configuration"] = build_config_array(
-            configuration, configuration_parameters
-        )
-    CLOUD_LOGGER.info(LogType.PART_INSERTED, extra=make_log_extra(log_data))
+    """Logs adding an element to an assembly or part studio.
+
+    The log is written by the telemetry pipeline, so any of version_info or configuration_parameters which
+    aren't passed are read from document_ref in the background.
+    """
+
+    def write_log() -> None:
+        nonlocal version_info, configuration_parameters
+        ANALYTICS.record_part_inserted(library, element_id, configuration)
+
+        if version_info == None:
+            version_info = document_ref.get().versionInfo
+
+        log_data = {
+            "name": name,
+            "elementId": element_id,
+            "userId": user_id,
+            "version": {
+                "createdAt": str(version_info.createdAt),
+                "name": version_info.name,
+                "id": version_id,
+            },
+            "targetElementType": str(target_element_type),
+            "library": str(library),
+            "quickInsert": is_quick_insert,
+            "isFavorite": is_favorite,
+            "supportsFasten": supports_fasten,
+            "fasten": fasten,
+        }
+        if configuration != None:
+            if configuration_parameters == None:
+                configuration_parameters = document_ref.configurations.configuration(
+                    element_id
+                ).get()
+            log_data["configuration"] = build_config_array(
+                configuration, configuration_parameters
+            )
+        CLOUD_LOGGER.info(LogType.PART_INSERTED, extra=make_log_extra(log_data))
+
+    TELEMETRY.submit(write_log)
@@ -23,8 +23,8 @@ def cacheable_route(router: flask.Blueprint, rule: str, private: bool = False):
         @functools.wraps(func)
         def wrapped(*args, **kwargs):
             response = make_response(func(*args, **kwargs))
-            # If /admin in path, skip cache
-            if "/admin" in request.path:
+            # If /admin in path or the request failed, skip cache
+            if "/admin" in request.path or response.status_code >= 400:
                 response.headers["Cache-Control"] = "no-cache"
             else:
                 response.headers["Cache-Control"] = cache_control_header(private)
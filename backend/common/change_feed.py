@@ -0,0 +1,191 @@
+"""Finds the documents in a library which may have new versions, so reloads can skip documents which haven't changed.
+
+Onshape lists documents by owner sorted by modifiedAt, so a handful of requests per owner covers an entire library
+instead of one version request per document. modifiedAt also changes on edits which don't create versions, so
+candidates are still checked against their latest version before being reloaded.
+"""
+
+from __future__ import annotations
+from collections import defaultdict
+from collections.abc import Iterable
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+from google.cloud import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from backend.common.database import (
+    Database,
+    LibraryRef,
+    replace_fields,
+    update_transactional,
+)
+from backend.common.models import ChangeFeed
+from backend.common.reload_context import ReloadContext
+from onshape_api.api.api_base import Api
+from onshape_api.endpoints.documents import DocumentFilter, get_documents
+
+# Documents modified this long before the last poll are still listed, to tolerate differences between clocks
+CLOCK_SKEW = timedelta(minutes=5)
+# The number of documents requested per page
+PAGE_SIZE = 50
+# How long a worker may reload a document before another worker can take over
+RELOAD_LEASE = timedelta(minutes=10)
+
+
+def parse_date(value: str) -> datetime:
+    """Parses a date returned by Onshape."""
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def list_modified_documents(
+    api: Api, owner_id: str, owner_type: int, since: datetime
+) -> set[str]:
+    """Returns the ids of documents owned by an owner which were modified after a given time."""
+    modified = set()
+    offset = 0
+    while True:
+        page = get_documents(
+            api,
+            DocumentFilter.BY_OWNER,
+            owner=owner_id,
+            owner_type=owner_type,
+            sort_column="modifiedAt",
+            sort_order="desc",
+            offset=offset,
+            limit=PAGE_SIZE,
+        )
+        items = page.get("items", [])
+        for item in items:
+            # Documents are listed newest first, so the rest are older
+            if parse_date(item["modifiedAt"]) < since:
+                return modified
+            modified.add(item["id"])
+
+        if page.get("next") == None or len(items) == 0:
+            return modified
+        offset += len(items)
+
+
+def get_marks(document_ids: Iterable[str]) -> dict[str, str]:
+    """Returns new pending marks for documents."""
+    return {document_id: uuid4().hex for document_id in document_ids}
+
+
+def poll_changes(
+    api: Api,
+    library_ref: LibraryRef,
+    document_ids: list[str],
+    reload_context: ReloadContext,
+) -> dict[str, str]:
+    """Records the documents in a library which have been modified since the last poll.
+
+    Documents remain pending until they are reloaded successfully, so a failed reload is retried by the next one.
+
+    Parameters:
+        document_ids: The ids of the documents in the library.
+        reload_context: The saved data of the documents in the library, used to look up their owners.
+
+    Returns:
+        The marks of every pending document, to pass to clear_pending once they're reloaded.
+    """
+    # Taken before listing so documents modified during the poll are picked up next time
+    polled_at = datetime.now(timezone.utc)
+    change_feed = library_ref.get().changeFeed
+
+    owners: defaultdict[tuple[str, int], set[str]] = defaultdict(set)
+    changed = set()
+    for document_id in document_ids:
+        document = reload_context.get_document(document_id)
+        if change_feed.cursor == None or document.ownerId == None:
+            # Never polled, or saved before owners were recorded
+            changed.add(document_id)
+        else:
+            owners[(document.ownerId, document.ownerType or 0)].add(document_id)
+
+    if change_feed.cursor != None:
+        since = change_feed.cursor - CLOCK_SKEW
+        for (owner_id, owner_type), owned_ids in owners.items():
+            modified = list_modified_documents(api, owner_id, owner_type, since)
+            changed.update(modified & owned_ids)
+
+    marks = get_marks(changed)
+    update: dict = {"cursor": polled_at}
+    if len(marks) > 0:
+        update["pendingDocuments"] = marks
+    library_ref.update({"changeFeed": update})
+    return {**change_feed.pendingDocuments, **marks}
+
+
+def mark_pending(library_ref: LibraryRef, document_ids: list[str]) -> dict[str, str]:
+    """Marks documents as having new versions, e.g., when Onshape notifies us of one.
+
+    Returns:
+        The marks of the documents, to pass to clear_pending once they're reloaded.
+    """
+    marks = get_marks(document_ids)
+    library_ref.update({"changeFeed": {"pendingDocuments": marks}})
+    return marks
+
+
+def get_cleared_fields(change_feed: ChangeFeed, marks: dict[str, str]) -> dict:
+    """Returns the fields which clear reloaded documents from a change feed.
+
+    Documents which were marked again since their marks were read are left pending, since their reload may have missed
+    the new version.
+    """
+    return {
+        FieldPath("changeFeed", "pendingDocuments", document_id).to_api_repr(): (
+            firestore.DELETE_FIELD
+        )
+        for document_id, mark in marks.items()
+        if change_feed.pendingDocuments.get(document_id) == mark
+    }
+
+
+def clear_pending(db: Database, library_ref: LibraryRef, marks: dict[str, str]) -> None:
+    """Marks documents as reloaded.
+
+    Parameters:
+        marks: The marks of the reloaded documents, as returned by poll_changes or mark_pending.
+    """
+    if len(marks) == 0:
+        return
+    update_transactional(
+        db,
+        library_ref,
+        lambda library: get_cleared_fields(library.changeFeed, marks),
+    )
+
+
+def get_lease_path(document_id: str) -> str:
+    return FieldPath("changeFeed", "reloadLeases", document_id).to_api_repr()
+
+
+def get_lease_fields(change_feed: ChangeFeed, document_id: str, now: datetime) -> dict:
+    """Returns the fields which lease a document for reloading, or an empty dict if another worker holds the lease."""
+    expires_at = change_feed.reloadLeases.get(document_id)
+    if expires_at != None and expires_at > now:
+        return {}
+    return {get_lease_path(document_id): now + RELOAD_LEASE}
+
+
+def acquire_reload_lease(
+    db: Database, library_ref: LibraryRef, document_id: str
+) -> bool:
+    """Leases a document for reloading, so other workers don't reload it at the same time.
+
+    Returns:
+        True if the lease was acquired, or False if another worker is already reloading the document.
+    """
+    now = datetime.now(timezone.utc)
+    update = update_transactional(
+        db,
+        library_ref,
+        lambda library: get_lease_fields(library.changeFeed, document_id, now),
+    )
+    return len(update) > 0
+
+
+def release_reload_lease(library_ref: LibraryRef, document_id: str) -> None:
+    replace_fields(library_ref, {get_lease_path(document_id): firestore.DELETE_FIELD})
@@ -1,13 +1,16 @@
 """Serves as an abstraction layer for connecting with the Onshape API and the current flask request."""
 
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
 import enum
+import threading
+import time
 from typing import Any, TypeVar
 
 from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
 from uuid import uuid4
 import flask
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from requests_oauthlib import OAuth2Session
 from requests.adapters import HTTPAdapter
 from google.cloud import firestore
@@ -16,6 +19,7 @@ from backend.common.database import Database, LibraryRef
 from backend.common.models import Library
 import onshape_api
 from backend.common import backend_exceptions, env
+from onshape_api.endpoints import users
 from onshape_api.paths.instance_type import InstanceType
 from onshape_api.paths.user_path import UserPath
 
@@ -30,7 +34,10 @@ def get_deletion_time() -> datetime:
 
 class SessionData(BaseModel):
     token: dict | None = None
-    deletionTime: datetime = get_deletion_time()
+    # The Onshape user id of the session, resolved once after signing in
+    userId: str | None = None
+    # Expired sessions are removed by backend/scripts/sweep_sessions.py
+    deletionTime: datetime = Field(default_factory=get_deletion_time)
 
 
 def get_session_id() -> str:
@@ -41,20 +48,55 @@ def get_session_id() -> str:
     return session_id
 
 
-def get_session_token(db: Database) -> dict | None:
-    session_id = get_session_id()
+def get_session_data(db: Database, session_id: str | None = None) -> SessionData:
+    if session_id == None:
+        session_id = get_session_id()
     doc_ref = db.sessions.document(session_id)
     session_data_dict = doc_ref.get().to_dict()
-    session_data = SessionData.model_validate(
+    return SessionData.model_validate(
         {} if session_data_dict == None else session_data_dict
     )
-    return session_data.token
+
+
+def get_session_token(db: Database) -> dict | None:
+    return get_session_data(db).token
+
+
+def save_session_token(db: Database, session_id: str, token: dict) -> None:
+    doc_ref = db.sessions.document(document_id=session_id)
+    # Merge so the saved userId is preserved when tokens are refreshed
+    doc_ref.set(SessionData(token=token).model_dump(exclude_none=True), merge=True)
 
 
 def set_session_token(db: Database, token: dict) -> None:
     session_id = get_session_id()
-    doc_ref = db.sessions.document(document_id=session_id)
-    doc_ref.set(SessionData(token=token).model_dump())
+    save_session_token(db, session_id, token)
+    # Other workers can't be reached directly, so bump the generation in the cookie to invalidate their pooled sessions
+    flask.session[TOKEN_GENERATION_KEY] = str(uuid4())
+    # Force the next request in this session to pick up the new token
+    SESSION_POOL.remove(session_id)
+
+
+def save_session_user_id(db: Database, session_id: str, user_id: str) -> None:
+    db.sessions.document(document_id=session_id).set({"userId": user_id}, merge=True)
+
+
+def get_session_user_id() -> str:
+    """Returns the Onshape user id of the current session.
+
+    The id is verified using the session's token the first time it is needed and then saved with the session.
+    """
+    user_id = flask.session.get("user_id")
+    if user_id != None:
+        return user_id
+
+    user_id = get_session_data(DATABASE).userId
+    if user_id == None:
+        user_id = users.get_user_id(get_api())
+        save_session_user_id(DATABASE, get_session_id(), user_id)
+
+    flask.session["user_id"] = user_id
+    return user_id
 
 
 base_url = "https://oauth.onshape.com/oauth"
@@ -68,29 +110,137 @@ class OAuthType(enum.Enum):
     USE = enum.auto()
 
 
-def get_oauth_session(
-    db: Database, oauth_type: OAuthType = OAuthType.USE
-) -> OAuth2Session:
-    if oauth_type == OAuthType.SIGN_IN:
-        return OAuth2Session(env.CLIENT_ID)
-    elif oauth_type == OAuthType.REDIRECT:
-        return OAuth2Session(env.CLIENT_ID, state=flask.request.args["state"])
+# The key in flask.session of the generation of the session's token, which changes whenever the user signs in again
+TOKEN_GENERATION_KEY = "token_generation"
+
+# Refresh tokens slightly before they actually expire so in-flight requests don't fail
+TOKEN_EXPIRY_MARGIN = 60  # seconds
+
+
+def is_token_expired(token: dict | None) -> bool:
+    """Returns True if the given token is missing or its access token has (nearly) expired."""
+    if not token or "access_token" not in token:
+        return True
+    expires_at = token.get("expires_at")
+    if expires_at == None:
+        # Tokens without an expiry never expire
+        return False
+    return float(expires_at) - TOKEN_EXPIRY_MARGIN < time.time()
+
+
+class OAuthSessionPool:
+    """A thread-safe, size bounded LRU pool of authenticated OAuth2Sessions keyed by session id.
+
+    Reusing sessions avoids reading the session token from the database and re-mounting ADAPTER on every request.
+    Note each worker process has its own pool, so sessions are stored with the generation of their token;
+    a session whose generation doesn't match the one in the request was replaced by signing in on another worker.
+    """
+
+    def __init__(self, max_size: int = 1000) -> None:
+        self.max_size = max_size
+        self._sessions: OrderedDict[str, tuple[OAuth2Session, str | None]] = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def get(
+        self, session_id: str, generation: str | None = None
+    ) -> OAuth2Session | None:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry == None:
+                return None
+            oauth, saved_generation = entry
+            if saved_generation != generation:
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            return oauth
+
+    def put(
+        self, session_id: str, oauth: OAuth2Session, generation: str | None = None
+    ) -> None:
+        with self._lock:
+            self._sessions[session_id] = (oauth, generation)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_size:
+                self._sessions.popitem(last=False)
+
+    def remove(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+SESSION_POOL = OAuthSessionPool()
 
+ADAPTER = HTTPAdapter(pool_connections=100, pool_maxsize=100, pool_block=True)
+
+
+def make_oauth_session(db: Database, session_id: str) -> OAuth2Session:
+    """Constructs a new authenticated OAuth2Session for a given session using the token saved in the database."""
     refresh_kwargs = {
         "client_id": env.CLIENT_ID,
         "client_secret": env.CLIENT_SECRET,
     }
 
     def _save_token(token) -> None:
-        set_session_token(db, token)
+        # Bind the session id so refreshes work outside of the original request
+        save_session_token(db, session_id, token)
 
-    return OAuth2Session(
+    oauth = OAuth2Session(
         env.CLIENT_ID,
         token=get_session_token(db),
         auto_refresh_url=token_url,
         auto_refresh_kwargs=refresh_kwargs,
         token_updater=_save_token,
     )
+    oauth.mount("https://", ADAPTER)
+    oauth.mount("http://", ADAPTER)
+    return oauth
+
+
+def get_oauth_session(
+    db: Database, oauth_type: OAuthType = OAuthType.USE
+) -> OAuth2Session:
+    if oauth_type == OAuthType.SIGN_IN:
+        return OAuth2Session(env.CLIENT_ID)
+    elif oauth_type == OAuthType.REDIRECT:
+        return OAuth2Session(env.CLIENT_ID, state=flask.request.args["state"])
+
+    session_id = get_session_id()
+    generation = flask.session.get(TOKEN_GENERATION_KEY)
+    oauth = SESSION_POOL.get(session_id, generation)
+    # Expired tokens may have been refreshed by another worker, so re-read them from the database
+    if oauth == None or is_token_expired(oauth.token):
+        oauth = make_oauth_session(db, session_id)
+        SESSION_POOL.put(session_id, oauth, generation)
+    return oauth
+
+
+def is_authorized() -> bool:
+    """Returns True if the current session has a usable OAuth token.
+
+    Uses the cached token expiry rather than calling Onshape.
+    Expired tokens are refreshed once, which only requires a call to the OAuth server.
+    """
+    oauth = get_oauth_session(DATABASE)
+    if not oauth.authorized:
+        return False
+
+    if not is_token_expired(oauth.token):
+        return True
+
+    if not oauth.token.get("refresh_token"):
+        return False
+
+    try:
+        token = oauth.refresh_token(token_url)
+    except Exception:
+        return False
+
+    if oauth.token_updater:
+        oauth.token_updater(token)
+    return True
 
 
 def get_current_url() -> str:
@@ -143,17 +293,20 @@ def get_library_ref() -> LibraryRef:
     return DATABASE.get_library(get_route_library())
 
 
-ADAPTER = HTTPAdapter(pool_connections=100, pool_maxsize=100, pool_block=True)
-
-
 def get_api() -> onshape_api.OAuthApi:
-    # make oauth sessions per request so auth works correctly
-    oauth = get_oauth_session(DATABASE)
+    # oauth sessions are pooled per session so auth works correctly
+    return onshape_api.make_oauth_api(get_oauth_session(DATABASE))
 
-    oauth.mount("https://", ADAPTER)
-    oauth.mount("http://", ADAPTER)
 
-    return onshape_api.make_oauth_api(oauth)
+def get_service_api() -> onshape_api.KeyApi | None:
+    """Returns an Api authenticated with the app's API keys, for work done outside of a user's request.
+
+    Returns None if API keys aren't configured.
+    """
+    try:
+        return onshape_api.make_key_api(load_dotenv=False)
+    except KeyError:
+        return None
 
 
 def get_route_instance_path() -> onshape_api.InstancePath:
@@ -187,6 +340,24 @@ def get_body_element_path() -> onshape_api.ElementPath:
     )
 
 
+def parse_element_path(value: dict) -> onshape_api.ElementPath:
+    """Parses an ElementPath from an object in the request body.
+
+    Uses the same keys as get_body_element_path.
+    """
+    try:
+        return onshape_api.ElementPath(
+            value["documentId"],
+            value["instanceId"],
+            value["elementId"],
+            instance_type=value.get("instanceType", InstanceType.WORKSPACE),
+        )
+    except KeyError as e:
+        raise backend_exceptions.ClientException(
+            "Missing required element path key {}.".format(e.args[0])
+        )
+
+
 def get_route(route_param: str) -> Any:
     """Returns the value of a path parameter.
 
@@ -230,6 +401,24 @@ def str_to_bool(s: str) -> bool:
     return s.lower() == "true"
 
 
+def get_query_int(key: str, default: int | None = None) -> int:
+    """Returns an integer from the request query. Throws if an integer isn't found and default is None."""
+    value = flask.request.args.get(key)
+    if value == None:
+        if default == None:
+            raise backend_exceptions.ClientException(
+                "Missing required query parameter {}.".format(key)
+            )
+        return default
+
+    try:
+        return int(value)
+    except ValueError:
+        raise backend_exceptions.ClientException(
+            "Query parameter {} must be an integer.".format(key)
+        )
+
+
 def get_optional_query_param(key: str, default: Any | None = None) -> Any:
     """Returns a value from the request query, or default if it doesn't exist."""
     return flask.request.args.get(key, default)
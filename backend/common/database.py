@@ -1,18 +1,37 @@
 from __future__ import annotations
-from collections.abc import Iterable
+from collections.abc import Callable, Iterable
+from datetime import datetime, timezone
 from enum import StrEnum
-from typing import Generic, Protocol, Type, TypeVar, cast, override, runtime_checkable
+from typing import (
+    Any,
+    Generic,
+    Protocol,
+    Type,
+    TypeVar,
+    cast,
+    override,
+    runtime_checkable,
+)
 
 from google.cloud import firestore
 from google.cloud.firestore import (
     CollectionReference,
     DocumentReference,
     DocumentSnapshot,
+    FieldFilter,
+    Transaction,
+)
+from google.cloud.firestore_v1.bulk_writer import (
+    BulkWriteFailure,
+    BulkWriter,
+    BulkWriterOptions,
 )
 from pydantic import BaseModel, ValidationError
 
 from backend.common.backend_exceptions import ServerException
 from backend.common.models import (
+    AnalyticsShard,
+    CachedAccessLevel,
     ConfigurationParameters,
     Document,
     Element,
@@ -20,6 +39,8 @@ from backend.common.models import (
     Library,
     LibraryData,
     LibraryUserData,
+    ThumbnailJob,
+    ThumbnailManifest,
     UserData,
 )
 
@@ -33,6 +54,11 @@ class Collection(StrEnum):
     FAVORITES = "favorites"
     USER_DATA = "user-data"
     SESSIONS = "sessions"
+    ACCESS_LEVELS = "access-levels"
+    ANALYTICS = "analytics"
+    SHARDS = "shards"
+    THUMBNAIL_MANIFESTS = "thumbnail-manifests"
+    JOBS = "jobs"
 
 
 T = TypeVar("T", bound=BaseModel)
@@ -365,6 +391,35 @@ class Database:
             FirestoreDocument(self.libraries.document(library), LibraryData)
         )
 
+    def get_all(
+        self, documents: Iterable[BaseDocument[Any]]
+    ) -> list[FirestoreDocument[Any]]:
+        """Reads multiple documents in a single round trip.
+
+        Documents may be of different types.
+
+        Returns:
+            Copies of the given documents in the same order with their values already loaded.
+        """
+        firestore_documents = [to_firestore_document(doc) for doc in documents]
+        if len(firestore_documents) == 0:
+            return []
+
+        snapshots = {
+            snapshot.reference.path: snapshot
+            for snapshot in self.client.get_all(
+                [doc.document_ref for doc in firestore_documents]
+            )
+        }
+        return [
+            FirestoreDocument(
+                doc.document_ref,
+                doc.model,
+                snapshot=snapshots.get(doc.document_ref.path),
+            )
+            for doc in firestore_documents
+        ]
+
     @property
     def user_data(self) -> CollectionReference:
         return self.get_collection(Collection.USER_DATA)
@@ -376,6 +431,129 @@ class Database:
     def sessions(self) -> CollectionReference:
         return self.get_collection(Collection.SESSIONS)
 
+    @property
+    def access_levels(self) -> CollectionReference:
+        return self.get_collection(Collection.ACCESS_LEVELS)
+
+    def get_access_level(self, user_id: str) -> FirestoreDocument[CachedAccessLevel]:
+        return FirestoreDocument(
+            self.access_levels.document(user_id), CachedAccessLevel
+        )
+
+    @property
+    def analytics(self) -> CollectionReference:
+        return self.get_collection(Collection.ANALYTICS)
+
+    def get_analytics_shard(
+        self, day: str, shard: int
+    ) -> FirestoreDocument[AnalyticsShard]:
+        """
+        Parameters:
+            day: The day of the counters in YYYY-MM-DD format.
+        """
+        return FirestoreDocument(
+            self.analytics.document(day)
+            .collection(Collection.SHARDS)
+            .document(str(shard)),
+            AnalyticsShard,
+        )
+
+    @property
+    def thumbnail_manifests(self) -> CollectionReference:
+        return self.get_collection(Collection.THUMBNAIL_MANIFESTS)
+
+    def get_thumbnail_manifest(
+        self, document_id: str
+    ) -> FirestoreDocument[ThumbnailManifest]:
+        return FirestoreDocument(
+            self.thumbnail_manifests.document(document_id), ThumbnailManifest
+        )
+
+    @property
+    def jobs(self) -> CollectionReference:
+        return self.get_collection(Collection.JOBS)
+
+    def get_thumbnail_job(self, job_id: str) -> FirestoreDocument[ThumbnailJob]:
+        return FirestoreDocument(self.jobs.document(job_id), ThumbnailJob)
+
+
+def to_firestore_document(document: BaseDocument[T]) -> FirestoreDocument[T]:
+    """Returns the FirestoreDocument underlying a given document."""
+    while isinstance(document, BaseDocumentRef):
+        document = document.ref
+    if not isinstance(document, FirestoreDocument):
+        raise TypeError(f"Expected a FirestoreDocument, got {type(document).__name__}")
+    return document
+
+
+def replace_fields(document: BaseDocument[Any], partial: dict) -> None:
+    """Updates an existing document in a single write.
+
+    Unlike BaseDocument.update, each field is replaced entirely rather than merged with nested data,
+    so maps can be replaced without first deleting them.
+    """
+    to_firestore_document(document).document_ref.update(partial)
+
+
+def update_transactional(
+    db: Database, document: BaseDocument[T], get_update: Callable[[T], dict]
+) -> dict:
+    """Updates an existing document based on its current value in a transaction.
+
+    Like replace_fields, each field is replaced entirely, and nested fields may be given as field paths.
+    The transaction is retried if the document changes before it commits, so get_update may be called more than once.
+
+    Parameters:
+        get_update: Returns the fields to update given the current value of the document. Nothing is written if it's empty.
+
+    Returns:
+        The fields which were updated.
+    """
+    firestore_document = to_firestore_document(document)
+    document_ref = firestore_document.document_ref
+
+    @firestore.transactional
+    def run(transaction: Transaction) -> dict:
+        snapshot = document_ref.get(transaction=transaction)
+        current = FirestoreDocument(
+            document_ref, firestore_document.model, snapshot=snapshot
+        ).get()
+        update = get_update(current)
+        if len(update) > 0:
+            transaction.update(document_ref, update)
+        return update
+
+    return run(db.client.transaction())
+
+
+def update_batched(
+    db: Database,
+    updates: Iterable[tuple[BaseDocument[Any], dict]],
+    batch_size: int = 500,
+) -> int:
+    """Updates existing documents using batched writes.
+
+    Unlike BaseDocument.update, each field is replaced entirely rather than merged with nested data.
+
+    Parameters:
+        updates: Pairs of documents and the fields to replace in them.
+
+    Returns:
+        The number of updated documents.
+    """
+    batch = db.client.batch()
+    count = 0
+    for document, partial in updates:
+        batch.update(to_firestore_document(document).document_ref, partial)
+        count += 1
+        if count % batch_size == 0:
+            batch.commit()
+            batch = db.client.batch()
+
+    if count % batch_size != 0:
+        batch.commit()
+    return count
+
 
 def delete_collection(
     collection_ref: CollectionReference,
@@ -391,3 +569,85 @@ def delete_collection(
 
     if deleted >= batch_size:
         return delete_collection(collection_ref, batch_size)
+
+
+# The number of times deleting a session is attempted before it's counted as failed
+DELETE_ATTEMPTS = 5
+# The number of pages in a row with failed deletes after which a sweep stops
+MAX_FAILED_BATCHES = 3
+
+
+def delete_expired_sessions(
+    db: Database,
+    batch_size: int = 500,
+    max_ops_per_second: int = 50,
+    max_batches: int | None = None,
+    on_progress: Callable[[int], None] | None = None,
+) -> int:
+    """Deletes all sessions whose deletionTime has passed.
+
+    Expired sessions are queried in pages and deleted using a rate limited BulkWriter so sweeps don't compete with user traffic.
+    Sessions which fail to delete still match the query, so the sweep stops early if a page deletes nothing
+    or if several pages in a row have failures.
+
+    Parameters:
+        max_ops_per_second: The maximum number of deletes to issue per second.
+        max_batches: The maximum number of pages to delete. If None, sweeps until no expired sessions remain.
+        on_progress: Called with the total number of deleted sessions after each page.
+
+    Returns:
+        The number of deleted sessions.
+    """
+    now = datetime.now(timezone.utc)
+    query = (
+        db.sessions.where(filter=FieldFilter("deletionTime", "<", now))
+        .select([])
+        .limit(batch_size)
+    )
+    writer = db.client.bulk_writer(
+        BulkWriterOptions(
+            initial_ops_per_second=max_ops_per_second,
+            max_ops_per_second=max_ops_per_second,
+        )
+    )
+
+    failures: list[BulkWriteFailure] = []
+
+    def on_write_error(failure: BulkWriteFailure, _: BulkWriter) -> bool:
+        if failure.attempts < DELETE_ATTEMPTS:
+            return True
+        failures.append(failure)
+        return False
+
+    writer.on_write_error(on_write_error)
+
+    deleted = 0
+    batches = 0
+    failed_batches = 0
+    try:
+        while max_batches == None or batches < max_batches:
+            snapshots = cast(list[DocumentSnapshot], list(query.stream()))
+            failed = len(failures)
+            for snapshot in snapshots:
+                writer.delete(snapshot.reference)
+            # Deleted sessions no longer match the query, so the next page starts from the beginning again
+            writer.flush()
+            failed = len(failures) - failed
+
+            deleted += len(snapshots) - failed
+            batches += 1
+            if on_progress:
+                on_progress(deleted)
+
+            if len(snapshots) < batch_size:
+                break
+            if failed == len(snapshots):
+                # The next page would be the same sessions again
+                break
+            failed_batches = failed_batches + 1 if failed > 0 else 0
+            if failed_batches >= MAX_FAILED_BATCHES:
+                break
+    finally:
+        writer.close()
+
+    return deleted
@@ -1,4 +1,5 @@
 import os
+import tempfile
 import dotenv
 
 dotenv.load_dotenv(override=True)
@@ -13,3 +14,12 @@ VERBOSE_LOGGING = os.getenv("VERBOSE_LOGGING", "false").lower() == "true"
 
 ACCESS_LEVEL_OVERRIDE = None if IS_PRODUCTION else os.getenv("ACCESS_LEVEL_OVERRIDE")
 ADMIN_TEAM = os.getenv("ADMIN_TEAM")
+
+# The secret shared with Onshape when registering webhooks; webhooks are rejected if it isn't set
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+
+# Thumbnails fetched from Onshape by the /thumbnail route are cached on local disk
+THUMBNAIL_CACHE_DIR = os.getenv(
+    "THUMBNAIL_CACHE_DIR", os.path.join(tempfile.gettempdir(), "thumbnail-cache")
+)
+THUMBNAIL_CACHE_MAX_BYTES = int(os.getenv("THUMBNAIL_CACHE_MAX_BYTES", 256 * 1024**2))
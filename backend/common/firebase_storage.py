@@ -1,14 +1,32 @@
 """In a perfect world we would use google-cloud-storage, but it doesn't have a good dev emulator, so we use firebase-admin instead."""
 
 from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 from io import BytesIO
+import json
+import math
 
 import firebase_admin
 from firebase_admin import storage
 from google.cloud.storage import Bucket, Blob
-from google.cloud.exceptions import NotFound
 
-from backend.common.cache import MAX_AGE
+from backend.common.cache import cache_control_header
+from backend.common.database import Database
+from backend.common.image_formats import (
+    ImageFormat,
+    get_atlas_format,
+    get_storage_format,
+    pack_atlas,
+    transcode,
+)
+from backend.common.models import (
+    AtlasTile,
+    Library,
+    ThumbnailAtlas,
+    ThumbnailManifest,
+    UploadedThumbnail,
+)
 from onshape_api.api.api_base import Api
 from onshape_api.endpoints import thumbnails
 from onshape_api.endpoints.thumbnails import ThumbnailSize
@@ -17,6 +35,15 @@ from onshape_api.paths.doc_path import ElementPath
 
 BUCKET_NAME = "frc-design-app-data"
 
+# Currently only TINY and STANDARD are used
+THUMBNAIL_SIZES = [ThumbnailSize.TINY, ThumbnailSize.STANDARD]
+
+# The size packed into each document's thumbnail atlas
+ATLAS_SIZE = ThumbnailSize.TINY
+
+# Shared by all reloads so concurrent reloads can't overwhelm Onshape or storage
+THUMBNAIL_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="thumbnails")
+
 
 def _ensure_firebase():
     if not firebase_admin._apps:
@@ -44,44 +71,246 @@ def maybe_get_thumbnail(
 
 
 def upload_thumbnails(
-    api: Api, element_path: ElementPath, microversion_id: str
+    api: Api,
+    db: Database,
+    element_path: ElementPath,
+    microversion_id: str,
+    manifest: ThumbnailManifest | None = None,
+    force: bool = False,
 ) -> dict:
-    """Uploads thumbnails to Google Cloud Storage."""
-    bucket = get_bucket()
+    """Uploads thumbnails to Google Cloud Storage.
+
+    Thumbnails recorded in the document's thumbnail manifest at the same microversion are skipped without touching storage.
+    Any others are checked and uploaded concurrently.
+
+    Parameters:
+        manifest: The thumbnail manifest of the element's document. Read from the database if not passed.
+        force: Whether to refetch thumbnails even if the manifest is up to date. Unchanged images still aren't re-uploaded.
+    """
+    manifest_ref = db.get_thumbnail_manifest(element_path.document_id)
+    if manifest == None:
+        manifest = manifest_ref.get()
+
+    uploaded = manifest.elements.get(element_path.element_id, {})
 
     urls = {}
-    for size in [ThumbnailSize.TINY, ThumbnailSize.STANDARD]:
-        blob = bucket.blob(f"thumbnails/{size}/{element_path.element_id}")
+    missing_sizes = []
+    for size in THUMBNAIL_SIZES:
+        thumbnail = uploaded.get(size)
+        if (
+            not force
+            and thumbnail != None
+            and thumbnail.microversionId == microversion_id
+        ):
+            urls[size] = thumbnail.url
+        else:
+            missing_sizes.append(size)
 
-        if is_uploaded(blob, microversion_id):
-            urls[size] = blob.public_url + "?v=" + microversion_id
-            continue
+    if len(missing_sizes) == 0:
+        return urls
 
-        thumbnail = maybe_get_thumbnail(api, element_path, size)
+    bucket = get_bucket()
+    results = THUMBNAIL_POOL.map(
+        lambda size: upload_thumbnail(
+            api, bucket, element_path, microversion_id, size, uploaded.get(size)
+        ),
+        missing_sizes,
+    )
+
+    new_thumbnails = {}
+    for size, thumbnail in zip(missing_sizes, results):
         if thumbnail == None:
             continue
+        urls[size] = thumbnail.url
+        new_thumbnails[str(size)] = thumbnail.model_dump()
 
-        blob.cache_control = f"public, max-age={MAX_AGE}"
-        blob.metadata = {
-            "microversionId": microversion_id,
-        }
-        blob.upload_from_string(
-            thumbnail.getvalue(),
-            content_type="image/gif",
-        )
-        urls[size] = blob.public_url + "?v=" + microversion_id
+    if len(new_thumbnails) > 0:
+        # Merges with the other elements and sizes in the manifest
+        manifest_ref.update({"elements": {element_path.element_id: new_thumbnails}})
 
     return urls
 
 
-def is_uploaded(blob: Blob, microversion_id: str) -> bool:
-    """Checks if the given thumbnail has already been uploaded to GCP storage."""
-    try:
-        blob.reload()  # raises NotFound if it doesn't exist
-        if blob.metadata and blob.metadata.get("microversionId") == microversion_id:
-            # This microversion has already been uploaded
-            return True
-    except NotFound:
-        return False
-
-    return False
+def get_thumbnail_blob(
+    bucket: Bucket, content_hash: str, image_format: ImageFormat
+) -> Blob:
+    """Returns the blob of a thumbnail.
+
+    Thumbnails are named by the hash of the image returned by Onshape, so identical images are only stored once
+    and never change once uploaded.
+    Transcoded thumbnails have an extension so they don't collide with the original image.
+    """
+    name = f"thumbnails/{content_hash}"
+    if image_format != ImageFormat.GIF:
+        name += "." + image_format.split("/")[1]
+    return bucket.blob(name)
+
+
+def upload_thumbnail(
+    api: Api,
+    bucket: Bucket,
+    element_path: ElementPath,
+    microversion_id: str,
+    size: ThumbnailSize,
+    previous: UploadedThumbnail | None = None,
+) -> UploadedThumbnail | None:
+    """Uploads a single thumbnail if an identical image isn't already in storage.
+
+    Parameters:
+        previous: The last thumbnail uploaded for the element at this size, if any.
+
+    Returns:
+        The uploaded thumbnail, or None if the thumbnail couldn't be fetched from Onshape.
+    """
+    thumbnail = maybe_get_thumbnail(api, element_path, size)
+    if thumbnail == None:
+        return None
+
+    data = thumbnail.getvalue()
+    content_hash = hashlib.sha256(data).hexdigest()
+    image_format = get_storage_format()
+    blob = get_thumbnail_blob(bucket, content_hash, image_format)
+    uploaded = UploadedThumbnail(
+        microversionId=microversion_id, url=blob.public_url, hash=content_hash
+    )
+
+    if previous != None and previous.url == uploaded.url:
+        # The image didn't change
+        return uploaded
+
+    upload_thumbnail_blob(blob, data, image_format)
+    return uploaded
+
+
+def upload_thumbnail_blob(blob: Blob, data: bytes, image_format: ImageFormat) -> None:
+    """Transcodes and uploads a thumbnail returned by Onshape unless its blob already exists."""
+    if blob.exists():
+        return
+    blob.cache_control = cache_control_header()
+    blob.upload_from_string(transcode(data, image_format), content_type=image_format)
+
+
+def get_atlas_tiles(
+    bucket: Bucket, element_ids: list[str], manifest: ThumbnailManifest
+) -> dict[str, Blob]:
+    """Returns the blobs of the TINY thumbnails of the given elements which can be packed into an atlas.
+
+    Thumbnails uploaded before content addressing or in an older format are skipped until they're next uploaded.
+    """
+    tiles = {}
+    for element_id in element_ids:
+        thumbnail = manifest.elements.get(element_id, {}).get(ATLAS_SIZE)
+        if thumbnail == None or thumbnail.hash == None:
+            continue
+        blob = get_thumbnail_blob(bucket, thumbnail.hash, get_storage_format())
+        if blob.public_url == thumbnail.url:
+            tiles[element_id] = blob
+    return tiles
+
+
+def get_atlas_key(hashes: dict[str, str]) -> str:
+    """Returns the key of an atlas, a hash of the element ids and thumbnail hashes it contains in order.
+
+    Parameters:
+        hashes: A mapping of element ids to the hashes of their thumbnails, in order.
+    """
+    return hashlib.sha256(
+        "\n".join(
+            f"{element_id}:{content_hash}"
+            for element_id, content_hash in hashes.items()
+        ).encode()
+    ).hexdigest()
+
+
+def layout_atlas(
+    element_ids: list[str], tile_width: int, tile_height: int
+) -> tuple[dict[str, AtlasTile], int, int]:
+    """Lays out tiles in rows, in order, in a grid which is as close to square as possible.
+
+    Returns:
+        The tile of each element, and the width and height of the atlas.
+    """
+    columns = math.ceil(math.sqrt(len(element_ids)))
+    rows = math.ceil(len(element_ids) / columns)
+    tiles = {
+        element_id: AtlasTile(
+            x=(index % columns) * tile_width, y=(index // columns) * tile_height
+        )
+        for index, element_id in enumerate(element_ids)
+    }
+    return tiles, columns * tile_width, rows * tile_height
+
+
+def upload_thumbnail_atlas(
+    element_ids: list[str], manifest: ThumbnailManifest
+) -> ThumbnailAtlas | None:
+    """Packs the TINY thumbnails of a document's elements into a single image so the library can load them in one request.
+
+    Atlases are named by a hash of their contents, so an atlas is only rebuilt when one of its thumbnails changes.
+
+    Parameters:
+        element_ids: The ids of the elements to include, in order.
+        manifest: The up to date thumbnail manifest of the document.
+
+    Returns:
+        The atlas, or None if there are no thumbnails to pack.
+    """
+    image_format = get_atlas_format()
+    bucket = get_bucket()
+    tiles = get_atlas_tiles(bucket, element_ids, manifest)
+    if len(tiles) == 0:
+        return None
+
+    key = get_atlas_key(
+        {
+            element_id: manifest.elements[element_id][ATLAS_SIZE].hash or ""
+            for element_id in tiles
+        }
+    )
+
+    tile_width, tile_height = (int(value) for value in ATLAS_SIZE.split("x"))
+    offsets, width, height = layout_atlas(list(tiles), tile_width, tile_height)
+    blob = bucket.blob(f"thumbnails/atlases/{key}.{image_format.split('/')[1]}")
+    atlas = ThumbnailAtlas(
+        url=blob.public_url,
+        key=key,
+        width=width,
+        height=height,
+        tileWidth=tile_width,
+        tileHeight=tile_height,
+        tiles=offsets,
+    )
+    if blob.exists():
+        return atlas
+
+    images = THUMBNAIL_POOL.map(lambda tile: tile.download_as_bytes(), tiles.values())
+    data = pack_atlas(
+        [
+            (image, offset.x, offset.y)
+            for image, offset in zip(images, offsets.values())
+        ],
+        atlas.width,
+        atlas.height,
+        image_format,
+    )
+    blob.cache_control = cache_control_header()
+    blob.upload_from_string(data, content_type=image_format)
+    return atlas
+
+
+def upload_search_index(library: Library, search_index: dict) -> str:
+    """Uploads a search index to Google Cloud Storage.
+
+    Indexes are named by the hash of their contents, so they never change once uploaded and can be cached indefinitely.
+
+    Returns:
+        The public url of the search index.
+    """
+    data = json.dumps(search_index, separators=(",", ":")).encode()
+    content_hash = hashlib.sha256(data).hexdigest()
+
+    blob = get_bucket().blob(f"search-db/{library}/{content_hash}.json")
+    if not blob.exists():
+        blob.cache_control = cache_control_header()
+        blob.upload_from_string(data, content_type="application/json")
+    return blob.public_url
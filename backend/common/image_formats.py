@@ -0,0 +1,136 @@
+"""Transcodes thumbnails from Onshape into smaller image formats."""
+
+from __future__ import annotations
+from enum import StrEnum
+from io import BytesIO
+
+from PIL import Image, features
+
+
+class ImageFormat(StrEnum):
+    """Image formats, represented by their mime types."""
+
+    AVIF = "image/avif"
+    WEBP = "image/webp"
+    PNG = "image/png"
+    # The format thumbnails are returned from Onshape in
+    GIF = "image/gif"
+
+
+# Pillow format names and save options
+SAVE_OPTIONS: dict[ImageFormat, tuple[str, dict]] = {
+    ImageFormat.AVIF: ("AVIF", {"quality": 60}),
+    ImageFormat.WEBP: ("WEBP", {"quality": 80, "method": 6}),
+    ImageFormat.PNG: ("PNG", {"optimize": True}),
+}
+
+# The format used for thumbnails in storage, which are loaded directly by browsers without negotiation
+STORAGE_FORMAT = ImageFormat.WEBP
+
+
+def get_supported_formats() -> list[ImageFormat]:
+    """Returns the formats thumbnails can be transcoded to, most preferred first.
+
+    AVIF and WebP depend on how Pillow was built.
+    """
+    supported = []
+    if features.check("avif"):
+        supported.append(ImageFormat.AVIF)
+    if features.check("webp"):
+        supported.append(ImageFormat.WEBP)
+    supported.append(ImageFormat.PNG)
+    return supported
+
+
+SUPPORTED_FORMATS = get_supported_formats()
+
+
+def parse_accept(accept: str | None) -> dict[str, float]:
+    """Parses an Accept header into a mapping of mime types to quality values."""
+    if accept == None:
+        return {}
+
+    accepted = {}
+    for entry in accept.split(","):
+        mime_type, *params = [part.strip() for part in entry.split(";")]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        accepted[mime_type.lower()] = quality
+    return accepted
+
+
+# Formats which are smaller than the GIFs returned by Onshape, most preferred first
+NEGOTIATED_FORMATS = [ImageFormat.AVIF, ImageFormat.WEBP]
+
+
+def negotiate_format(accept: str | None) -> ImageFormat:
+    """Returns the most preferred format allowed by an Accept header which is smaller than the original GIF.
+
+    Formats must be explicitly listed since browsers send image/* for formats they may not support.
+    Other clients get the original GIF, since re-encoding it as a PNG usually makes it larger.
+    """
+    accepted = parse_accept(accept)
+    for image_format in NEGOTIATED_FORMATS:
+        if image_format in SUPPORTED_FORMATS and accepted.get(image_format, 0) > 0:
+            return image_format
+    return ImageFormat.GIF
+
+
+def transcode(data: bytes, image_format: ImageFormat) -> bytes:
+    """Converts an image to a given format, dropping any metadata.
+
+    Returns data unchanged if the format isn't supported.
+    """
+    if image_format not in SUPPORTED_FORMATS:
+        return data
+
+    with Image.open(BytesIO(data)) as image:
+        # Re-encoding from pixels drops metadata and GIF palettes
+        converted = image.convert("RGBA")
+
+    output = BytesIO()
+    pillow_format, options = SAVE_OPTIONS[image_format]
+    converted.save(output, format=pillow_format, **options)
+    return output.getvalue()
+
+
+def get_storage_format() -> ImageFormat:
+    """Returns the format thumbnails should be uploaded to storage in."""
+    if STORAGE_FORMAT in SUPPORTED_FORMATS:
+        return STORAGE_FORMAT
+    return ImageFormat.GIF
+
+
+def get_atlas_format() -> ImageFormat:
+    """Returns the format thumbnail atlases should be encoded in."""
+    if STORAGE_FORMAT in SUPPORTED_FORMATS:
+        return STORAGE_FORMAT
+    return ImageFormat.PNG
+
+
+def pack_atlas(
+    tiles: list[tuple[bytes, int, int]],
+    width: int,
+    height: int,
+    image_format: ImageFormat,
+) -> bytes:
+    """Packs images into a single image.
+
+    Parameters:
+        tiles: A list of images and the offsets to draw them at.
+    """
+    atlas = Image.new("RGBA", (width, height))
+    for data, x, y in tiles:
+        with Image.open(BytesIO(data)) as image:
+            atlas.paste(image.convert("RGBA"), (x, y))
+
+    output = BytesIO()
+    pillow_format, options = SAVE_OPTIONS[image_format]
+    atlas.save(output, format=pillow_format, **options)
+    return output.getvalue()
@@ -2,13 +2,15 @@ from __future__ import annotations
 
 from datetime import datetime
 from enum import IntEnum, StrEnum
+from functools import cached_property
 from typing import Annotated, Literal
 from pydantic import BaseModel, ConfigDict, Field
 
 from onshape_api.api.api_base import Api
 from onshape_api.endpoints import documents
-from onshape_api.endpoints.documents import ElementType
+from onshape_api.endpoints.documents import ElementType, PartType
 from onshape_api.endpoints.thumbnails import ThumbnailSize
+from onshape_api.endpoints.users import AccessLevel
 from onshape_api.paths.doc_path import InstancePath
 from onshape_api.paths.instance_type import InstanceType
 
@@ -21,8 +23,29 @@ class Library(StrEnum):
 
 class LibraryData(BaseModel):
     cacheVersion: int = 0
-    searchDb: str | None = None
+    # The url of the search index built by search_index.py
+    searchDbUrl: str | None = None
     documentOrder: list[str] = Field(default_factory=list)
+    # Maps element ids to decayed insert counts, computed when a new version of the library is pushed
+    popularity: dict[str, float] = Field(default_factory=dict)
+    # The ids of the most popular elements, most popular first
+    topElements: list[str] = Field(default_factory=list)
+    changeFeed: ChangeFeed = Field(default_factory=lambda: ChangeFeed())
+    # The ids of documents whose configuration previews haven't been rendered since they were reloaded
+    pendingPreviews: list[str] = Field(default_factory=list)
+
+
+class ChangeFeed(BaseModel):
+    """Tracks which documents in a library may have new versions, see change_feed.py."""
+
+    # When Onshape was last polled for modified documents
+    cursor: datetime | None = None
+    # Maps the ids of documents which have been modified but not yet reloaded to a unique id written each time they're marked
+    # Reloads only clear documents which weren't marked again while they ran
+    pendingDocuments: dict[str, str] = Field(default_factory=dict)
+    # Maps the ids of documents being reloaded after a webhook to when their lease expires
+    # Shared by every worker, so only one of them reloads a document at a time
+    reloadLeases: dict[str, datetime] = Field(default_factory=dict)
 
 
 class ParameterType(StrEnum):
@@ -38,9 +61,35 @@ def get_parameter_type_name(parameter_type: ParameterType) -> str:
 
 class ConfigurationParameters(BaseModel):
     parameters: list[ConfigurationParameter] = Field(default_factory=list)
+    # The version the configuration was loaded from
+    # Configurations saved before versions were recorded don't have one
+    instanceId: str | None = None
+    # Maps configurations to the urls of pre-rendered previews, see previews.py
+    previews: dict[str, str] = Field(default_factory=dict)
 
     model_config = ConfigDict(extra="forbid")
 
+    # Indexes are built on first use, so parameters shouldn't be modified afterwards
+    @cached_property
+    def _parameters_by_id(self) -> dict[str, ConfigurationParameter]:
+        return {parameter.id: parameter for parameter in self.parameters}
+
+    @cached_property
+    def _options_by_id(self) -> dict[tuple[str, str], EnumOption]:
+        return {
+            (parameter.id, option.id): option
+            for parameter in self.parameters
+            if parameter.type == ParameterType.ENUM
+            for option in parameter.options
+        }
+
+    def get_parameter(self, parameter_id: str) -> ConfigurationParameter | None:
+        return self._parameters_by_id.get(parameter_id)
+
+    def get_option(self, parameter_id: str, option_id: str) -> EnumOption | None:
+        """Returns an option of an enum parameter."""
+        return self._options_by_id.get((parameter_id, option_id))
+
 
 class BaseConfigurationParameter(BaseModel):
     condition: VisibilityCondition | None = None
@@ -237,9 +286,11 @@ class DocumentSchema(IntEnum):
     """
 
     V1 = 1
+    # Adds insert plans to elements
+    V2 = 2
 
 
-LATEST_DOCUMENT_SCHEMA = DocumentSchema.V1
+LATEST_DOCUMENT_SCHEMA = DocumentSchema.V2
 
 
 class ElementSchema(IntEnum):
@@ -271,6 +322,35 @@ class Element(BaseModel):
     configurationId: str | None = None
     # Currently only TINY and STANDARD are populated
     thumbnailUrls: dict[ThumbnailSize, str] = Field(default_factory=dict)
+    insertPlan: InsertPlan | None = None
+
+
+class DerivedParameter(BaseModel):
+    """A configuration parameter of a Derived feature which is missing only its value."""
+
+    parameterId: str
+    # The key the configured value is stored under, either value or expression
+    valueKey: str
+    default: str
+    template: dict
+
+
+class InsertPlan(BaseModel):
+    """Data needed to insert an element which is precomputed when the element is reloaded.
+
+    Inserts only need to substitute the inserted instance path and configuration values.
+    """
+
+    # The version the plan was built against
+    instanceId: str
+    versionInfo: VersionInfo
+    partTypes: list[PartType]
+    defaultConfiguration: dict[str, str] | None = None
+    # If the element supports fasten, the mate connector query relative to the inserted instance
+    fastenQuery: dict | None = None
+    # The namespace and configuration of a Derived feature which inserts the element
+    namespace: str
+    derivedConfiguration: list[DerivedParameter] = Field(default_factory=list)
 
 
 class MateLocation(StrEnum):
@@ -296,6 +376,11 @@ class Document(BaseModel):
     sortAlphabetically: bool
     thumbnailUrls: dict[ThumbnailSize, str] = Field(default_factory=dict)
     versionInfo: VersionInfo
+    thumbnailAtlas: ThumbnailAtlas | None = None
+    # The owner of the document in Onshape, used to list modified documents in bulk
+    # Documents saved before owners were recorded don't have one
+    ownerId: str | None = None
+    ownerType: int | None = None
 
 
 class VersionInfo(BaseModel):
@@ -342,3 +427,90 @@ class LibraryUserData(BaseModel):
 
     favoriteOrder: list[str] = Field(default_factory=list)
     # settings: LibrarySettings
+
+
+class CachedAccessLevel(BaseModel):
+    """A user's access level, cached so it can be shared across sessions and workers."""
+
+    accessLevel: AccessLevel
+    expiresAt: datetime
+
+
+class AnalyticsShard(BaseModel):
+    """One shard of the usage counters for a single day.
+
+    Counters are spread across several shards to avoid write contention on a single document.
+    """
+
+    appOpens: int = 0
+    # Maps libraries to the number of inserts
+    libraries: dict[str, int] = Field(default_factory=dict)
+    # Maps libraries to element ids to the number of inserts
+    elements: dict[str, dict[str, int]] = Field(default_factory=dict)
+    # Maps element ids to encoded configurations to the number of inserts
+    # Keys are unbounded, so elements and configurations are exempt from indexing (see firestore.indexes.json)
+    configurations: dict[str, dict[str, int]] = Field(default_factory=dict)
+
+
+class UploadedThumbnail(BaseModel):
+    # The microversion of the element the thumbnail was rendered from
+    microversionId: str
+    url: str
+    # The sha256 hash of the thumbnail returned by Onshape, which is also the name of its blob
+    # Thumbnails uploaded before content addressing don't have a hash
+    hash: str | None = None
+
+
+class AtlasTile(BaseModel):
+    # The offset of the tile from the top left of the atlas, in pixels
+    x: int
+    y: int
+
+
+class ThumbnailAtlas(BaseModel):
+    """A single image containing the TINY thumbnails of the elements of a document."""
+
+    url: str
+    # The sha256 hash of the element ids and thumbnail hashes packed into the atlas
+    key: str
+    width: int
+    height: int
+    tileWidth: int
+    tileHeight: int
+    # Maps element ids to tiles; elements without an up to date thumbnail are omitted
+    tiles: dict[str, AtlasTile] = Field(default_factory=dict)
+
+
+class ThumbnailManifest(BaseModel):
+    """The thumbnails uploaded to storage for the elements of a document.
+
+    Used to check whether thumbnails are up to date without reading each blob from storage.
+    """
+
+    # Maps element ids to thumbnail sizes to uploaded thumbnails
+    elements: dict[str, dict[ThumbnailSize, UploadedThumbnail]] = Field(
+        default_factory=dict
+    )
+
+
+class JobStatus(StrEnum):
+    RUNNING = "running"
+    DONE = "done"
+
+
+class ThumbnailJob(BaseModel):
+    """The progress of a bulk thumbnail refresh of a library."""
+
+    library: Library
+    status: JobStatus = JobStatus.RUNNING
+    # Whether thumbnails are refetched even if their manifest is up to date
+    force: bool = False
+    # The number of documents and elements to refresh
+    total: int = 0
+    completed: int = 0
+    # The number of documents and elements whose thumbnails changed
+    updated: int = 0
+    # The ids of documents and elements which failed to refresh
+    failed: list[str] = Field(default_factory=list)
+    createdAt: datetime
+    finishedAt: datetime | None = None
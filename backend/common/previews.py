@@ -0,0 +1,276 @@
+"""Pre-renders thumbnails of commonly used configurations so the insert menu can show them without waiting on Onshape."""
+
+from __future__ import annotations
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+import hashlib
+import threading
+
+from google.cloud import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from backend.common.analytics import (
+    POPULARITY_DAYS,
+    decode_configuration,
+    get_days,
+    read_totals,
+    top_n,
+)
+from backend.common import connect
+from backend.common.app_logging import APP_LOGGER
+from backend.common.database import (
+    BaseDocument,
+    Database,
+    DocumentRef,
+    LibraryRef,
+    update_transactional,
+)
+from backend.common.firebase_storage import (
+    get_bucket,
+    get_thumbnail_blob,
+    upload_thumbnail_blob,
+)
+from backend.common.image_formats import get_storage_format
+from backend.common.models import AnalyticsShard, ConfigurationParameters, Library
+from backend.common.thumbnail_waiter import THUMBNAIL_WAITER
+from onshape_api.api.api_base import Api
+from onshape_api.endpoints import thumbnails
+from onshape_api.endpoints.thumbnails import ThumbnailSize
+from onshape_api.paths.doc_path import ElementPath
+from onshape_api.paths.instance_type import InstanceType
+
+# The number of most inserted configurations of each element to pre-render, in addition to the default
+TOP_CONFIGURATIONS = 5
+# Matches the size of the preview in the insert menu
+PREVIEW_SIZE = ThumbnailSize.SMALL
+# The number of previews rendered at once across every library
+RENDER_CONCURRENCY = 4
+
+RENDER_POOL = ThreadPoolExecutor(
+    max_workers=RENDER_CONCURRENCY, thread_name_prefix="previews"
+)
+
+
+def get_preview_key(configuration: dict[str, str]) -> str:
+    """Returns the key of a configuration in ConfigurationParameters.previews.
+
+    The key is also a valid Onshape configuration string. Matches getPreviewKey in the frontend.
+    """
+    return ";".join(f"{id}={value}" for id, value in sorted(configuration.items()))
+
+
+def get_common_configurations(
+    parameters: ConfigurationParameters, counts: dict[str, int], n: int
+) -> list[dict[str, str]]:
+    """Returns the default configuration followed by the n most inserted configurations.
+
+    Parameters:
+        counts: A mapping of encoded configurations to insert counts.
+    """
+    default = {parameter.id: parameter.default for parameter in parameters.parameters}
+    configurations = [default]
+    for key, _ in top_n(counts, n):
+        # Ignore parameters which have since been removed
+        configuration = default | {
+            id: value
+            for id, value in decode_configuration(key).items()
+            if id in default
+        }
+        if configuration not in configurations:
+            configurations.append(configuration)
+    return configurations
+
+
+def render_preview(api: Api, element_path: ElementPath, preview_key: str) -> str:
+    """Renders a configuration of an element and uploads it to storage.
+
+    Returns:
+        The url of the preview.
+    """
+    thumbnail_id = thumbnails.get_thumbnail_id(api, element_path, preview_key)
+    data = THUMBNAIL_WAITER.wait(
+        lambda: thumbnails.get_thumbnail_from_id(
+            api, thumbnail_id, PREVIEW_SIZE
+        ).getvalue(),
+        thumbnail_id,
+        PREVIEW_SIZE,
+    )
+
+    image_format = get_storage_format()
+    blob = get_thumbnail_blob(
+        get_bucket(), hashlib.sha256(data).hexdigest(), image_format
+    )
+    upload_thumbnail_blob(blob, data, image_format)
+    return blob.public_url
+
+
+def get_preview_fields(
+    configuration: ConfigurationParameters,
+    instance_id: str | None,
+    preview_key: str,
+    url: str,
+) -> dict:
+    """Returns the fields which save a preview to a configuration, or an empty dict if the preview is outdated.
+
+    Parameters:
+        instance_id: The version of the configuration the preview was rendered from.
+    """
+    if configuration.instanceId != instance_id:
+        # The element was reloaded at another version while the preview was rendering
+        return {}
+    return {FieldPath("previews", preview_key).to_api_repr(): url}
+
+
+def prerender_document_previews(
+    api: Api, db: Database, document_ref: DocumentRef, totals: AnalyticsShard
+) -> int:
+    """Renders the default and most inserted configurations of each configured element in a document.
+
+    Previews are saved to the configuration of each element, which is replaced whenever the element is reloaded,
+    so previews that already exist are up to date and are skipped.
+    Previews are only saved if the configuration is still at the version they were rendered from.
+    Renders are run on RENDER_POOL so a slow thumbnail doesn't hold up the rest.
+
+    Returns:
+        The number of previews rendered.
+    """
+    renders: list[
+        tuple[BaseDocument[ConfigurationParameters], str | None, str, Future[str]]
+    ] = []
+    for element_ref in document_ref.elements.list():
+        element = element_ref.get()
+        if element.configurationId == None:
+            continue
+
+        configuration_ref = document_ref.configurations.configuration(
+            element.configurationId
+        )
+        parameters = configuration_ref.get()
+        element_path = ElementPath(
+            element.documentId,
+            # Configurations saved before versions were recorded use the element's version
+            parameters.instanceId or element.instanceId,
+            element_ref.id,
+            instance_type=InstanceType.VERSION,
+        )
+
+        configurations = get_common_configurations(
+            parameters,
+            totals.configurations.get(element_ref.id, {}),
+            TOP_CONFIGURATIONS,
+        )
+        for configuration in configurations:
+            preview_key = get_preview_key(configuration)
+            if preview_key in parameters.previews:
+                continue
+            future = RENDER_POOL.submit(render_preview, api, element_path, preview_key)
+            renders.append(
+                (configuration_ref, parameters.instanceId, preview_key, future)
+            )
+
+    count = 0
+    for configuration_ref, instance_id, preview_key, future in renders:
+        try:
+            url = future.result()
+        except Exception:
+            APP_LOGGER.exception(
+                f"Failed to render preview of {configuration_ref.id} ({preview_key})"
+            )
+            continue
+        saved = update_transactional(
+            db,
+            configuration_ref,
+            lambda configuration: get_preview_fields(
+                configuration, instance_id, preview_key, url
+            ),
+        )
+        if len(saved) > 0:
+            count += 1
+    return count
+
+
+def prerender_previews(
+    api: Api, db: Database, library_ref: LibraryRef, document_ids: list[str]
+) -> int:
+    """Renders the previews of the given documents in a library.
+
+    Each document is removed from LibraryData.pendingPreviews once its previews are rendered,
+    so documents interrupted by a restart are picked up by the next run.
+
+    Returns:
+        The number of previews rendered.
+    """
+    today = datetime.now(timezone.utc).date()
+    totals = read_totals(db, get_days(today, POPULARITY_DAYS))
+
+    count = 0
+    for document_id in document_ids:
+        document_ref = library_ref.documents.document(document_id)
+        if document_ref.maybe_get() != None:
+            count += prerender_document_previews(api, db, document_ref, totals)
+        library_ref.update({"pendingPreviews": firestore.ArrayRemove([document_id])})
+    return count
+
+
+class PreviewRunner:
+    """Renders the pending previews of each library in the background, one run per library at a time.
+
+    Starting a library which is already running makes it run again once it finishes, so documents queued
+    mid-run aren't missed.
+    """
+
+    def __init__(self) -> None:
+        self._running: set[Library] = set()
+        self._rerun: set[Library] = set()
+        self._lock = threading.Lock()
+
+    def start(self, db: Database, library: Library) -> None:
+        with self._lock:
+            if library in self._running:
+                self._rerun.add(library)
+                return
+            self._running.add(library)
+
+        threading.Thread(
+            target=self._run, args=(db, library), name="previews", daemon=True
+        ).start()
+
+    def _run(self, db: Database, library: Library) -> None:
+        while True:
+            try:
+                self._render_pending(db, library)
+            except Exception:
+                APP_LOGGER.exception(f"Failed to pre-render previews in {library}")
+
+            with self._lock:
+                if library not in self._rerun:
+                    self._running.remove(library)
+                    return
+                self._rerun.remove(library)
+
+    def _render_pending(self, db: Database, library: Library) -> None:
+        # Previews outlive the request which queued them, so they can't use the user's session
+        api = connect.get_service_api()
+        if api == None:
+            APP_LOGGER.info("Skipped pre-rendering previews since API keys aren't set")
+            return
+
+        library_ref = db.get_library(library)
+        document_ids = library_ref.get().pendingPreviews
+        if len(document_ids) == 0:
+            return
+        count = prerender_previews(api, db, library_ref, document_ids)
+        APP_LOGGER.info(f"Pre-rendered {count} previews in {library}")
+
+
+PREVIEW_RUNNER = PreviewRunner()
+
+
+def queue_previews(db: Database, library: Library, document_ids: list[str]) -> None:
+    """Marks documents as needing previews and starts rendering them in the background."""
+    if len(document_ids) == 0:
+        return
+    db.get_library(library).update(
+        {"pendingPreviews": firestore.ArrayUnion(document_ids)}
+    )
+    PREVIEW_RUNNER.start(db, library)
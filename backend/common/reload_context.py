@@ -35,6 +35,8 @@ class SavedDocument(BaseModel):
     documentSchema: DocumentSchema | None = None
     sortAlphabetically: bool = True
     instanceId: str | None = None
+    ownerId: str | None = None
+    ownerType: int | None = None
 
     @field_validator("sortAlphabetically", mode="before")
     def default_sort_alphabetically(cls, v):
@@ -46,18 +48,33 @@ class ReloadContext:
 
     Used to preserve data which is specified by admins rather than being loaded from Onshape directly.
     Also includes data that is needed for caching purposes, e.g., the last saved microversion id.
+
+    Saved data is validated the first time it's looked up, since most of it is never needed.
     """
 
     def __init__(self, reload_all: bool = False) -> None:
+        self._saved_elements: dict[str, dict] = {}
+        self._saved_documents: dict[str, dict] = {}
         self._preserved_elements: dict[str, SavedElement] = {}
         self._preserved_documents: dict[str, SavedDocument] = {}
         self.reload_all = reload_all
 
     def save_element(self, element_id: str, old_element: dict) -> None:
-        self._preserved_elements[element_id] = SavedElement.model_validate(old_element)
+        self._saved_elements[element_id] = old_element
+        self._preserved_elements.pop(element_id, None)
+
+    def get_raw_element(self, element_id: str) -> dict:
+        """Returns the saved data of an element, or an empty dict if it wasn't saved."""
+        return self._saved_elements.get(element_id, {})
 
     def get_element(self, element_id: str) -> SavedElement:
-        return self._preserved_elements.get(element_id, SavedElement())
+        preserved_element = self._preserved_elements.get(element_id)
+        if preserved_element == None:
+            preserved_element = SavedElement.model_validate(
+                self._saved_elements.get(element_id, {})
+            )
+            self._preserved_elements[element_id] = preserved_element
+        return preserved_element
 
     def should_reload_element(self, element_id: str, microversion_id: str) -> bool:
         """Returns True if the given element should be reloaded from Onshape."""
@@ -81,22 +98,32 @@ class ReloadContext:
         if self.reload_all:
             return True
 
-        preserved_document = self.get_document(latest_version_path.document_id)
-        if (
-            preserved_document.documentSchema == None
-            or preserved_document.documentSchema < LATEST_DOCUMENT_SCHEMA
-        ):
+        if self.is_document_outdated(latest_version_path.document_id):
             return True
 
+        preserved_document = self.get_document(latest_version_path.document_id)
         if preserved_document.instanceId == latest_version_path.instance_id:
             return False
 
         return True
 
-    def save_document(self, document_id: str, old_document: dict) -> None:
-        self._preserved_documents[document_id] = SavedDocument.model_validate(
-            old_document
+    def is_document_outdated(self, document_id: str) -> bool:
+        """Returns True if a document was saved with an older schema, or hasn't been saved at all."""
+        preserved_document = self.get_document(document_id)
+        return (
+            preserved_document.documentSchema == None
+            or preserved_document.documentSchema < LATEST_DOCUMENT_SCHEMA
         )
 
+    def save_document(self, document_id: str, old_document: dict) -> None:
+        self._saved_documents[document_id] = old_document
+        self._preserved_documents.pop(document_id, None)
+
     def get_document(self, document_id: str) -> SavedDocument:
-        return self._preserved_documents.get(document_id, SavedDocument())
+        preserved_document = self._preserved_documents.get(document_id)
+        if preserved_document == None:
+            preserved_document = SavedDocument.model_validate(
+                self._saved_documents.get(document_id, {})
+            )
+            self._preserved_documents[document_id] = preserved_document
+        return preserved_document
@@ -0,0 +1,406 @@
+"""Builds the search index used by the frontend.
+
+The index is serialized in the same format as MiniSearch.toJSON() so the frontend can load it directly with MiniSearch.loadJSON().
+Tokenization must match tokenize and processTerm in frontend/src/search/search.ts, since search queries are processed by the frontend.
+"""
+
+from __future__ import annotations
+import bisect
+from collections import OrderedDict
+import math
+import re
+import threading
+
+from pydantic import BaseModel
+
+from backend.common.database import LibraryRef
+from backend.common.firebase_storage import upload_search_index
+from backend.common.models import Library, Vendor
+
+# The version of the MiniSearch serialization format
+SERIALIZATION_VERSION = 2
+
+# Fields which are indexed, in the same order as SEARCH_OPTIONS.fields
+SEARCH_FIELDS = ["name", "documentName"]
+# Matches SEARCH_OPTIONS.searchOptions.boost
+FIELD_BOOSTS = [1.0, 0.5]
+# Only matches in the name are highlighted by the frontend
+NAME_FIELD_ID = SEARCH_FIELDS.index("name")
+
+# BM25+ parameters, the same as the MiniSearch defaults
+BM25_K = 1.2
+BM25_B = 0.7
+BM25_D = 0.5
+# Weights of prefix and fuzzy matches relative to exact matches, the same as the MiniSearch defaults
+PREFIX_WEIGHT = 0.375
+FUZZY_WEIGHT = 0.45
+# The maximum edit distance of a fuzzy match as a fraction of the length of the query term
+FUZZY_RATIO = 0.2
+MAX_EDIT_DISTANCE = 2
+
+TOKEN_SEPARATOR = re.compile(r"""[-()"'#&\s^]+""")
+CAMEL_SPLIT = re.compile(r"([a-z])([A-Z])")
+PASCAL_SPLIT = re.compile(r"([A-Z])([A-Z][a-z])")
+DELIMINATOR = "^"
+
+
+class SearchDocument(BaseModel):
+    id: str
+    documentId: str
+    isVisible: bool
+    vendors: list[Vendor]
+    name: str
+    documentName: str
+
+
+def tokenize(text: str) -> list[str]:
+    """Splits text on special characters and whitespace without changing its case."""
+    return [token for token in TOKEN_SEPARATOR.split(text) if token != ""]
+
+
+def process_term(term: str) -> list[str]:
+    """Returns the lowercase terms to index for a token, including camelCase and PascalCase splits."""
+    camel_split = CAMEL_SPLIT.sub(rf"\1{DELIMINATOR}\2", term).split(DELIMINATOR)
+    pascal_split = PASCAL_SPLIT.sub(rf"\1{DELIMINATOR}\2", term).split(DELIMINATOR)
+
+    terms = [t.lower() for t in [*camel_split, *pascal_split, term]]
+    # Deduplicate while preserving order
+    return list(dict.fromkeys(terms))
+
+
+def build_search_index(search_documents: list[SearchDocument]) -> dict:
+    """Builds a MiniSearch index of the given documents."""
+    return SearchIndex(search_documents).to_json()
+
+
+def get_search_documents(library_ref: LibraryRef) -> list[SearchDocument]:
+    """Returns a SearchDocument for every element in a library, including hidden elements."""
+    search_documents = []
+    for document_ref in library_ref.documents.list():
+        document = document_ref.get()
+        for element_ref in document_ref.elements.list():
+            element = element_ref.get()
+            search_documents.append(
+                SearchDocument(
+                    id=element_ref.id,
+                    documentId=document_ref.id,
+                    isVisible=element.isVisible,
+                    vendors=element.vendors,
+                    name=element.name,
+                    documentName=document.name,
+                )
+            )
+    return search_documents
+
+
+def update_search_index(library: Library, library_ref: LibraryRef) -> str:
+    """Rebuilds the search index of a library and saves its url to the library.
+
+    Returns:
+        The url of the new search index.
+    """
+    search_index = build_search_index(get_search_documents(library_ref))
+    url = upload_search_index(library, search_index)
+    library_ref.update({"searchDbUrl": url})
+    return url
+
+
+class Position(BaseModel):
+    start: int
+    length: int
+
+
+class SearchHit(BaseModel):
+    id: str
+    positions: list[Position]
+
+
+class FilterResult(BaseModel):
+    # The number of hits filtered out by vendor filters
+    byVendor: int = 0
+    # The number of hits filtered out by being in another document, not including hits also filtered out by vendors
+    byDocument: int = 0
+
+
+class SearchFacets(BaseModel):
+    # The number of visible hits with each vendor, ignoring filters
+    vendors: dict[Vendor, int]
+    # The number of visible hits in each document, ignoring filters
+    documents: dict[str, int]
+
+
+class SearchResult(BaseModel):
+    hits: list[SearchHit]
+    filtered: FilterResult
+    facets: SearchFacets
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Returns the Levenshtein distance between a and b, or max_distance + 1 if it exceeds max_distance."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+
+    previous = list(range(len(b) + 1))
+    for i, a_char in enumerate(a, 1):
+        current = [i]
+        for j, b_char in enumerate(b, 1):
+            current.append(
+                min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (a_char != b_char),
+                )
+            )
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+class SearchIndex:
+    """An in-memory inverted index over element and document names.
+
+    Scoring follows MiniSearch so results are similar to searching the index in the frontend.
+    """
+
+    def __init__(self, search_documents: list[SearchDocument]) -> None:
+        self.documents = search_documents
+        # Maps terms to field ids to document indices to term frequencies
+        self.index: dict[str, list[dict[int, int]]] = {}
+        self.field_lengths: list[list[int]] = []
+        self.average_field_lengths = [0.0] * len(SEARCH_FIELDS)
+
+        for doc_index, search_document in enumerate(search_documents):
+            lengths = []
+            for field_id, field in enumerate(SEARCH_FIELDS):
+                tokens = tokenize(getattr(search_document, field))
+                lengths.append(len(set(tokens)))
+                for token in tokens:
+                    for term in process_term(token):
+                        fields = self.index.setdefault(
+                            term, [{} for _ in SEARCH_FIELDS]
+                        )
+                        fields[field_id][doc_index] = (
+                            fields[field_id].get(doc_index, 0) + 1
+                        )
+            self.field_lengths.append(lengths)
+
+        if len(search_documents) > 0:
+            for field_id in range(len(SEARCH_FIELDS)):
+                self.average_field_lengths[field_id] = sum(
+                    lengths[field_id] for lengths in self.field_lengths
+                ) / len(search_documents)
+
+        self.terms = sorted(self.index.keys())
+
+    def to_json(self) -> dict:
+        """Serializes the index in the same format as MiniSearch.toJSON()."""
+        return {
+            "documentCount": len(self.documents),
+            "nextId": len(self.documents),
+            "documentIds": {
+                str(doc_index): search_document.id
+                for doc_index, search_document in enumerate(self.documents)
+            },
+            "fieldIds": {
+                field: field_id for field_id, field in enumerate(SEARCH_FIELDS)
+            },
+            "fieldLength": {
+                str(doc_index): lengths
+                for doc_index, lengths in enumerate(self.field_lengths)
+            },
+            "averageFieldLength": self.average_field_lengths,
+            "storedFields": {
+                str(doc_index): search_document.model_dump(mode="json")
+                for doc_index, search_document in enumerate(self.documents)
+            },
+            "dirtCount": 0,
+            "index": [
+                [
+                    term,
+                    {
+                        str(field_id): {
+                            str(doc_index): frequency
+                            for doc_index, frequency in frequencies.items()
+                        }
+                        for field_id, frequencies in enumerate(fields)
+                        if len(frequencies) > 0
+                    },
+                ]
+                for term, fields in self.index.items()
+            ],
+            "serializationVersion": SERIALIZATION_VERSION,
+        }
+
+    def _expand(self, query_term: str, fuzzy: bool) -> dict[str, float]:
+        """Returns the indexed terms matching a query term and the weight of each match."""
+        matches: dict[str, float] = {}
+
+        start = bisect.bisect_left(self.terms, query_term)
+        for term in self.terms[start:]:
+            if not term.startswith(query_term):
+                break
+            distance = len(term) - len(query_term)
+            weight = 1.0
+            if distance > 0:
+                weight = PREFIX_WEIGHT * len(term) / (len(term) + 0.3 * distance)
+            matches[term] = weight
+
+        max_distance = min(MAX_EDIT_DISTANCE, round(len(query_term) * FUZZY_RATIO))
+        if fuzzy and max_distance > 0:
+            for term in self.terms:
+                if term in matches:
+                    continue
+                distance = edit_distance(query_term, term, max_distance)
+                if distance <= max_distance:
+                    matches[term] = FUZZY_WEIGHT * len(term) / (len(term) + distance)
+
+        return matches
+
+    def _score(self, term: str, weight: float) -> dict[int, float]:
+        """Returns the BM25+ score of each document containing an indexed term."""
+        scores: dict[int, float] = {}
+        for field_id, frequencies in enumerate(self.index[term]):
+            if len(frequencies) == 0:
+                continue
+            inverse_frequency = math.log(
+                1
+                + (len(self.documents) - len(frequencies) + 0.5)
+                / (len(frequencies) + 0.5)
+            )
+            for doc_index, frequency in frequencies.items():
+                normalized_length = (
+                    self.field_lengths[doc_index][field_id]
+                    / self.average_field_lengths[field_id]
+                )
+                score = inverse_frequency * (
+                    BM25_D
+                    + frequency
+                    * (BM25_K + 1)
+                    / (frequency + BM25_K * (1 - BM25_B + BM25_B * normalized_length))
+                )
+                scores[doc_index] = (
+                    scores.get(doc_index, 0) + score * weight * FIELD_BOOSTS[field_id]
+                )
+        return scores
+
+    def search(
+        self,
+        query: str,
+        document_id: str | None = None,
+        vendors: list[Vendor] | None = None,
+        fuzzy: bool = True,
+        limit: int = 50,
+    ) -> SearchResult:
+        """Searches the index.
+
+        Hidden elements are never returned. Hits filtered out by document_id or vendors are counted in the result
+        the same way as the frontend so it can offer to clear filters.
+        """
+        query_terms = [
+            term for token in tokenize(query) for term in process_term(token)
+        ]
+
+        # Maps document indices to scores, matched query terms, and indexed terms matched in the name
+        results: dict[int, tuple[float, set[str], set[str]]] = {}
+        for query_term in query_terms:
+            for term, weight in self._expand(query_term, fuzzy).items():
+                for doc_index, score in self._score(term, weight).items():
+                    total, matched_query_terms, matched_terms = results.get(
+                        doc_index, (0.0, set(), set())
+                    )
+                    matched_query_terms.add(query_term)
+                    if doc_index in self.index[term][NAME_FIELD_ID]:
+                        matched_terms.add(term)
+                    results[doc_index] = (
+                        total + score,
+                        matched_query_terms,
+                        matched_terms,
+                    )
+
+        filtered = FilterResult()
+        facets = SearchFacets(vendors={}, documents={})
+        ranked: list[tuple[float, int]] = []
+        for doc_index, (score, matched_query_terms, _) in results.items():
+            search_document = self.documents[doc_index]
+            if not search_document.isVisible:
+                continue
+
+            for vendor in search_document.vendors:
+                facets.vendors[vendor] = facets.vendors.get(vendor, 0) + 1
+            facets.documents[search_document.documentId] = (
+                facets.documents.get(search_document.documentId, 0) + 1
+            )
+
+            filtered_by_document = (
+                document_id != None and search_document.documentId != document_id
+            )
+            filtered_by_vendor = vendors != None and not any(
+                vendor in search_document.vendors for vendor in vendors
+            )
+            if filtered_by_vendor and filtered_by_document:
+                # Neither filter would show it on its own, so don't count it
+                continue
+            elif filtered_by_document:
+                filtered.byDocument += 1
+                continue
+            elif filtered_by_vendor:
+                filtered.byVendor += 1
+                continue
+
+            # Like MiniSearch, reward documents matching more query terms
+            ranked.append((score * len(matched_query_terms), doc_index))
+
+        ranked.sort(key=lambda result: result[0], reverse=True)
+        hits = [
+            SearchHit(
+                id=self.documents[doc_index].id,
+                positions=get_highlight_positions(
+                    self.documents[doc_index].name, results[doc_index][2]
+                ),
+            )
+            for _, doc_index in ranked[:limit]
+        ]
+        return SearchResult(hits=hits, filtered=filtered, facets=facets)
+
+
+def get_highlight_positions(name: str, terms: set[str]) -> list[Position]:
+    """Returns the positions of every occurrence of the matched terms in a name, in order."""
+    lower_name = name.lower()
+    positions = []
+    for term in terms:
+        start = lower_name.find(term)
+        while start != -1:
+            positions.append(Position(start=start, length=len(term)))
+            start = lower_name.find(term, start + len(term))
+    return sorted(positions, key=lambda position: position.start)
+
+
+class SearchIndexCache:
+    """Caches a SearchIndex of each library for its current cache version."""
+
+    def __init__(self, max_size: int = 8) -> None:
+        self.max_size = max_size
+        self._indexes: OrderedDict[tuple[Library, int], SearchIndex] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(
+        self, library: Library, library_ref: LibraryRef, cache_version: int
+    ) -> SearchIndex:
+        key = (library, cache_version)
+        with self._lock:
+            search_index = self._indexes.get(key)
+            if search_index != None:
+                self._indexes.move_to_end(key)
+                return search_index
+
+        # Build outside the lock so other libraries aren't blocked
+        search_index = SearchIndex(get_search_documents(library_ref))
+        with self._lock:
+            self._indexes[key] = search_index
+            while len(self._indexes) > self.max_size:
+                self._indexes.popitem(last=False)
+        return search_index
+
+
+SEARCH_INDEX_CACHE = SearchIndexCache()
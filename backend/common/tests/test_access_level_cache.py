@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from backend.common import app_access
+from backend.common.app_access import AccessLevelCache
+from backend.common.models import CachedAccessLevel
+from backend.common.tests.mock_database import MockCollection
+from onshape_api.endpoints.users import AccessLevel
+
+
+class FakeDatabase:
+    def __init__(self) -> None:
+        self.access_levels = MockCollection(CachedAccessLevel)
+        self.reads = 0
+
+    def get_access_level(self, user_id: str):
+        self.reads += 1
+        return self.access_levels.document(user_id)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(
+        app_access,
+        "delete_collection",
+        lambda collection: collection._store.clear(),
+    )
+    return FakeDatabase()
+
+
+def test_access_level_cache_local_ttl(db):
+    cache = AccessLevelCache(db, local_ttl=timedelta(minutes=1))  # type: ignore
+    cache.set("user", AccessLevel.ADMIN)
+    reads = db.reads
+
+    assert cache.get("user") == AccessLevel.ADMIN
+    # Served in-process without reading Firestore
+    assert db.reads == reads
+
+    cache = AccessLevelCache(db, local_ttl=timedelta(0))  # type: ignore
+    cache.set("user", AccessLevel.MEMBER)
+    reads = db.reads
+    assert cache.get("user") == AccessLevel.MEMBER
+    assert db.reads == reads + 1
+
+
+def test_access_level_cache_firestore_ttl(db):
+    # Another worker cached an access level which has since expired
+    db.access_levels.set(
+        "user",
+        CachedAccessLevel(
+            accessLevel=AccessLevel.ADMIN,
+            expiresAt=datetime.now(timezone.utc) - timedelta(seconds=1),
+        ),
+    )
+    cache = AccessLevelCache(db)  # type: ignore
+    assert cache.get("user") == None
+
+    db.access_levels.set(
+        "user",
+        CachedAccessLevel(
+            accessLevel=AccessLevel.MEMBER,
+            expiresAt=datetime.now(timezone.utc) + timedelta(minutes=1),
+        ),
+    )
+    assert cache.get("user") == AccessLevel.MEMBER
+
+
+def test_access_level_cache_invalidate(db):
+    cache = AccessLevelCache(db)  # type: ignore
+    cache.set("user", AccessLevel.ADMIN)
+    cache.set("other-user", AccessLevel.MEMBER)
+
+    cache.invalidate("user")
+    assert cache.get("user") == None
+    assert cache.get("other-user") == AccessLevel.MEMBER
+
+    cache.invalidate()
+    assert cache.get("other-user") == None
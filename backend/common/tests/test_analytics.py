@@ -0,0 +1,126 @@
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+from backend.common.analytics import (
+    DayCounts,
+    UsageAnalytics,
+    compute_popularity,
+    decode_configuration,
+    encode_configuration,
+)
+from backend.common.models import AnalyticsShard, Library
+
+
+def test_configuration_encoding():
+    configuration = {"size": "1.5 in", "type": "a&b=c"}
+    key = encode_configuration(configuration)
+    assert key == encode_configuration(dict(reversed(configuration.items())))
+    assert decode_configuration(key) == configuration
+
+
+def test_day_counts_increments():
+    counts = DayCounts()
+    assert counts.to_increments() == {}
+
+    counts.libraries["frc-design-lib"] += 2
+    counts.elements["frc-design-lib"]["element-id"] += 2
+    increments = counts.to_increments()
+    assert set(increments.keys()) == {"libraries", "elements"}
+    assert increments["elements"]["frc-design-lib"]["element-id"].value == 2
+
+
+class FakeShard:
+    def __init__(self, db: "FakeAnalyticsDatabase") -> None:
+        self.db = db
+
+    def update(self, partial: dict) -> None:
+        if self.db.failing:
+            raise Exception("Deadline exceeded")
+        self.db.writes.append(partial)
+
+
+class FakeAnalyticsDatabase:
+    def __init__(self) -> None:
+        self.failing = False
+        self.writes: list[dict] = []
+
+    def get_analytics_shard(self, day: str, shard: int) -> FakeShard:
+        return FakeShard(self)
+
+
+def test_flush_interval():
+    db = FakeAnalyticsDatabase()
+    analytics = UsageAnalytics(flush_interval=60)
+    analytics.record_app_opened()
+
+    analytics.flush(db)  # type: ignore
+    assert db.writes == []
+
+    analytics.flush(db, force=True)  # type: ignore
+    assert len(db.writes) == 1
+    assert db.writes[0]["appOpens"].value == 1
+
+    # Nothing is left to write
+    analytics.flush(db, force=True)  # type: ignore
+    assert len(db.writes) == 1
+
+
+def test_flush_keeps_unwritten_counts():
+    db = FakeAnalyticsDatabase()
+    analytics = UsageAnalytics(flush_interval=0)
+    analytics.record_part_inserted(Library.FRC_DESIGN_LIB, "element-id")
+
+    db.failing = True
+    with pytest.raises(Exception):
+        analytics.flush(db)  # type: ignore
+
+    # Counts recorded after the failure are added to the unwritten counts
+    analytics.record_part_inserted(Library.FRC_DESIGN_LIB, "element-id")
+    db.failing = False
+    analytics.flush(db)  # type: ignore
+
+    assert len(db.writes) == 1
+    elements = db.writes[0]["elements"][Library.FRC_DESIGN_LIB]
+    assert elements["element-id"].value == 2
+
+
+class FakeShardDatabase:
+    """Serves fixed shards, keyed by day and shard number."""
+
+    def __init__(self, shards: dict[tuple[str, int], AnalyticsShard]) -> None:
+        self.shards = shards
+
+    def get_analytics_shard(self, day: str, shard: int) -> tuple[str, int]:
+        return (day, shard)
+
+    def get_all(self, keys):
+        return [
+            SimpleNamespace(maybe_get=lambda key=key: self.shards.get(key))
+            for key in keys
+        ]
+
+
+def make_shard(library: Library, counts: dict[str, int]) -> AnalyticsShard:
+    return AnalyticsShard(elements={library: counts})
+
+
+def test_compute_popularity():
+    library = Library.FRC_DESIGN_LIB
+    db = FakeShardDatabase(
+        {
+            # Counts for a day are summed across shards
+            ("2025-03-15", 0): make_shard(library, {"new": 1}),
+            ("2025-03-15", 7): make_shard(library, {"new": 1, "old": 1}),
+            # One half life ago
+            ("2025-03-01", 3): make_shard(library, {"old": 4}),
+            # Other libraries don't count
+            ("2025-03-14", 0): make_shard(Library.FTC_DESIGN_LIB, {"new": 10}),
+            # Outside of the window
+            ("2025-01-01", 0): make_shard(library, {"old": 100}),
+        }
+    )
+
+    scores = compute_popularity(db, library, date(2025, 3, 15), num_days=30, half_life=14)  # type: ignore
+    assert scores == {"new": 2, "old": 3}
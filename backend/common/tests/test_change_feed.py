@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from google.cloud import firestore
+
+from backend.common.change_feed import (
+    RELOAD_LEASE,
+    get_cleared_fields,
+    get_lease_fields,
+    list_modified_documents,
+    poll_changes,
+)
+from backend.common.models import ChangeFeed
+from backend.common.reload_context import ReloadContext
+
+
+class ListingApi:
+    """Serves a fixed list of documents, newest first, in pages."""
+
+    def __init__(self, modified_at: list[str]) -> None:
+        self.items = [
+            {"id": f"document-{i}", "modifiedAt": date}
+            for i, date in enumerate(modified_at)
+        ]
+        self.requests = 0
+
+    def get(self, path: str, query: dict):
+        self.requests += 1
+        offset, limit = query["offset"], query["limit"]
+        page = self.items[offset : offset + limit]
+        has_next = offset + limit < len(self.items)
+        return {"items": page, "next": "next-page" if has_next else None}
+
+
+def test_list_modified_documents():
+    api = ListingApi(
+        [
+            "2025-03-04T00:00:00.000Z",
+            "2025-03-03T00:00:00.000Z",
+            "2025-03-01T00:00:00.000Z",
+        ]
+    )
+    since = datetime(2025, 3, 2, tzinfo=timezone.utc)
+    modified = list_modified_documents(api, "owner", 1, since)  # type: ignore
+    assert modified == {"document-0", "document-1"}
+
+
+def test_list_modified_documents_pages(monkeypatch):
+    monkeypatch.setattr("backend.common.change_feed.PAGE_SIZE", 2)
+    api = ListingApi([f"2025-03-0{day}T00:00:00Z" for day in range(9, 0, -1)])
+    since = datetime(2025, 3, 4, tzinfo=timezone.utc)
+    modified = list_modified_documents(api, "owner", 1, since)  # type: ignore
+    assert len(modified) == 6
+    # Stops at the first page with an older document
+    assert api.requests == 4
+
+
+class FakeLibraryRef:
+    def __init__(self, change_feed: ChangeFeed) -> None:
+        self.change_feed = change_feed
+        self.updates: list[dict] = []
+
+    def get(self):
+        return SimpleNamespace(changeFeed=self.change_feed)
+
+    def update(self, partial: dict) -> None:
+        self.updates.append(partial)
+
+
+def test_poll_changes_uses_saved_owners():
+    api = ListingApi(["2025-03-04T00:00:00.000Z", "2025-03-01T00:00:00.000Z"])
+    library_ref = FakeLibraryRef(
+        ChangeFeed(
+            cursor=datetime(2025, 3, 2, tzinfo=timezone.utc),
+            pendingDocuments={"document-1": "old-mark"},
+        )
+    )
+    reload_context = ReloadContext()
+    for document_id in ("document-0", "document-1"):
+        reload_context.save_document(document_id, {"ownerId": "owner", "ownerType": 1})
+    # Saved before owners were recorded
+    reload_context.save_document("document-2", {})
+
+    document_ids = ["document-0", "document-1", "document-2"]
+    pending = poll_changes(api, library_ref, document_ids, reload_context)  # type: ignore
+
+    # One listing for the single owner, without reading any documents
+    assert api.requests == 1
+    assert pending.keys() == {"document-0", "document-1", "document-2"}
+    assert pending["document-1"] == "old-mark"
+    marks = library_ref.updates[0]["changeFeed"]["pendingDocuments"]
+    assert marks.keys() == {"document-0", "document-2"}
+
+
+def test_get_cleared_fields_keeps_marked_documents():
+    # document-1 was marked again while it was being reloaded
+    change_feed = ChangeFeed(
+        pendingDocuments={"document-0": "mark-0", "document-1": "new-mark"}
+    )
+    cleared = get_cleared_fields(
+        change_feed, {"document-0": "mark-0", "document-1": "mark-1"}
+    )
+    assert cleared == {
+        "changeFeed.pendingDocuments.`document-0`": firestore.DELETE_FIELD
+    }
+
+
+def test_get_lease_fields():
+    now = datetime(2025, 3, 4, tzinfo=timezone.utc)
+    change_feed = ChangeFeed(
+        reloadLeases={
+            "held": now + timedelta(minutes=1),
+            "expired": now - timedelta(minutes=1),
+        }
+    )
+    assert get_lease_fields(change_feed, "held", now) == {}
+    assert get_lease_fields(change_feed, "expired", now) == {
+        "changeFeed.reloadLeases.expired": now + RELOAD_LEASE
+    }
+    assert get_lease_fields(change_feed, "document", now) == {
+        "changeFeed.reloadLeases.document": now + RELOAD_LEASE
+    }
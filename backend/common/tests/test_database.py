@@ -0,0 +1,116 @@
+from types import SimpleNamespace
+
+from backend.common.database import (
+    DELETE_ATTEMPTS,
+    MAX_FAILED_BATCHES,
+    delete_expired_sessions,
+)
+
+
+class FakeSessionQuery:
+    """Serves the expired sessions which haven't been deleted yet, a page at a time."""
+
+    def __init__(self, session_ids: list[str]) -> None:
+        self.session_ids = session_ids
+        self.page_size = 0
+        self.pages = 0
+
+    def where(self, filter):
+        return self
+
+    def select(self, fields):
+        return self
+
+    def limit(self, page_size: int):
+        self.page_size = page_size
+        return self
+
+    def stream(self):
+        self.pages += 1
+        return [
+            SimpleNamespace(reference=session_id)
+            for session_id in self.session_ids[: self.page_size]
+        ]
+
+
+class FakeBulkWriter:
+    def __init__(self, query: FakeSessionQuery, failing: set[str]) -> None:
+        self.query = query
+        self.failing = failing
+        self.queued: list[str] = []
+        self.attempts = 0
+        self.closed = False
+
+    def on_write_error(self, callback) -> None:
+        self.callback = callback
+
+    def delete(self, session_id: str) -> None:
+        self.queued.append(session_id)
+
+    def flush(self) -> None:
+        for session_id in self.queued:
+            if session_id not in self.failing:
+                self.query.session_ids.remove(session_id)
+                continue
+
+            operation = SimpleNamespace(attempts=0)
+            retry = True
+            while retry:
+                operation.attempts += 1
+                self.attempts += 1
+                failure = SimpleNamespace(
+                    operation=operation, attempts=operation.attempts
+                )
+                retry = self.callback(failure, self)
+        self.queued = []
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def make_db(session_count: int, failing: set[str] = set()):
+    query = FakeSessionQuery([f"session-{i}" for i in range(session_count)])
+    writer = FakeBulkWriter(query, failing)
+    db = SimpleNamespace(
+        sessions=query,
+        client=SimpleNamespace(bulk_writer=lambda options: writer),
+    )
+    return db, query, writer
+
+
+def test_delete_expired_sessions_pages():
+    db, query, writer = make_db(5)
+    progress = []
+    deleted = delete_expired_sessions(db, batch_size=2, on_progress=progress.append)  # type: ignore
+
+    assert deleted == 5
+    assert query.session_ids == []
+    assert progress == [2, 4, 5]
+    assert writer.closed
+
+
+def test_delete_expired_sessions_max_batches():
+    db, query, _ = make_db(5)
+    deleted = delete_expired_sessions(db, batch_size=2, max_batches=2)  # type: ignore
+
+    assert deleted == 4
+    assert query.session_ids == ["session-4"]
+
+
+def test_delete_expired_sessions_stops_when_nothing_is_deleted():
+    db, query, writer = make_db(5, failing={"session-0", "session-1"})
+    deleted = delete_expired_sessions(db, batch_size=2)  # type: ignore
+
+    # The first page fails entirely, so the same sessions would be served forever
+    assert deleted == 0
+    assert query.pages == 1
+    assert writer.attempts == 2 * DELETE_ATTEMPTS
+
+
+def test_delete_expired_sessions_stops_after_repeated_failures():
+    # The first session of every page fails
+    db, query, _ = make_db(20, failing={"session-0"})
+    deleted = delete_expired_sessions(db, batch_size=2)  # type: ignore
+
+    assert query.pages == MAX_FAILED_BATCHES
+    assert deleted == MAX_FAILED_BATCHES
@@ -0,0 +1,47 @@
+from io import BytesIO
+
+from PIL import Image
+
+from backend.common.image_formats import (
+    SUPPORTED_FORMATS,
+    ImageFormat,
+    negotiate_format,
+    parse_accept,
+    transcode,
+)
+
+
+def make_gif() -> bytes:
+    output = BytesIO()
+    Image.new("RGB", (32, 16), "orange").save(output, format="GIF")
+    return output.getvalue()
+
+
+def test_parse_accept():
+    accepted = parse_accept("image/avif,image/webp;q=0.9, image/*;q=0.8, */*;q=bad")
+    assert accepted == {
+        "image/avif": 1.0,
+        "image/webp": 0.9,
+        "image/*": 0.8,
+        "*/*": 0,
+    }
+    assert parse_accept(None) == {}
+
+
+def test_negotiate_format():
+    # Wildcards don't imply support for newer formats, and PNGs are larger than the original GIFs
+    assert negotiate_format("image/*") == ImageFormat.GIF
+    assert negotiate_format("image/png,image/*") == ImageFormat.GIF
+    assert negotiate_format("image/webp;q=0") == ImageFormat.GIF
+    assert negotiate_format(None) == ImageFormat.GIF
+    assert negotiate_format("image/avif,image/webp") == SUPPORTED_FORMATS[0]
+    assert negotiate_format("image/webp,image/*") == ImageFormat.WEBP
+
+
+def test_transcode():
+    data = make_gif()
+    with Image.open(BytesIO(transcode(data, ImageFormat.WEBP))) as image:
+        assert image.format == "WEBP"
+        assert image.size == (32, 16)
+    # GIFs are returned as is
+    assert transcode(data, ImageFormat.GIF) == data
@@ -1,7 +1,15 @@
 from pydantic import ValidationError
 import pytest
 
-from backend.common.models import LibraryUserData, Theme, UserData
+from backend.common.models import (
+    ConfigurationParameters,
+    EnumConfigurationParameter,
+    EnumOption,
+    LibraryUserData,
+    StringConfigurationParameter,
+    Theme,
+    UserData,
+)
 
 
 def test_cannot_default():
@@ -19,3 +27,26 @@ def test_defaultable():
     LibraryUserData.model_validate({})
     user_data = UserData.model_validate({})
     assert user_data.settings.theme == Theme.SYSTEM
+
+
+def test_configuration_parameter_lookup():
+    parameters = ConfigurationParameters(
+        parameters=[
+            EnumConfigurationParameter(
+                name="Size",
+                id="size",
+                default="small",
+                options=[EnumOption(id="small", name="Small")],
+            ),
+            StringConfigurationParameter(name="Label", id="label", default=""),
+        ]
+    )
+    parameter = parameters.get_parameter("label")
+    assert parameter != None and parameter.name == "Label"
+    assert parameters.get_parameter("missing") == None
+    option = parameters.get_option("size", "small")
+    assert option != None and option.name == "Small"
+    assert parameters.get_option("size", "large") == None
+    assert parameters.get_option("label", "small") == None
+    # Cached indexes must not leak into saved data
+    assert "_parameters_by_id" not in parameters.model_dump()
@@ -0,0 +1,93 @@
+import threading
+import time
+
+from backend.common.analytics import encode_configuration
+from backend.common.models import (
+    BooleanConfigurationParameter,
+    ConfigurationParameters,
+    EnumConfigurationParameter,
+    EnumOption,
+    Library,
+)
+from backend.common.previews import (
+    PreviewRunner,
+    get_common_configurations,
+    get_preview_fields,
+    get_preview_key,
+)
+
+PARAMETERS = ConfigurationParameters(
+    parameters=[
+        EnumConfigurationParameter(
+            name="Size",
+            id="size",
+            default="small",
+            options=[
+                EnumOption(id="small", name="Small"),
+                EnumOption(id="large", name="Large"),
+            ],
+        ),
+        BooleanConfigurationParameter(name="Flip", id="flip", default="false"),
+    ]
+)
+
+
+def test_get_common_configurations():
+    counts = {
+        encode_configuration({"size": "large", "flip": "true"}): 5,
+        # Same as the default
+        encode_configuration({"size": "small", "flip": "false"}): 3,
+        # Partial configurations are filled in with defaults
+        encode_configuration({"size": "large", "removed": "1"}): 2,
+    }
+    assert get_common_configurations(PARAMETERS, counts, 5) == [
+        {"size": "small", "flip": "false"},
+        {"size": "large", "flip": "true"},
+        {"size": "large", "flip": "false"},
+    ]
+    assert get_common_configurations(PARAMETERS, counts, 1) == [
+        {"size": "small", "flip": "false"},
+        {"size": "large", "flip": "true"},
+    ]
+
+
+def test_get_preview_key():
+    key = get_preview_key({"size": "large", "flip": "true"})
+    assert key == "flip=true;size=large"
+
+
+def test_get_preview_fields():
+    configuration = PARAMETERS.model_copy(update={"instanceId": "version"})
+    assert get_preview_fields(configuration, "version", "size=large", "url") == {
+        "previews.`size=large`": "url"
+    }
+    # Reloaded at a new version while the preview was rendering
+    assert get_preview_fields(configuration, "old-version", "size=large", "url") == {}
+
+
+def test_preview_runner_single_flight(monkeypatch):
+    runner = PreviewRunner()
+    started = threading.Event()
+    release = threading.Event()
+    finished = threading.Event()
+    runs = []
+
+    def render_pending(db, library) -> None:
+        runs.append(library)
+        started.set()
+        release.wait(1)
+        if len(runs) == 2:
+            finished.set()
+
+    monkeypatch.setattr(runner, "_render_pending", render_pending)
+    runner.start(None, Library.FRC_DESIGN_LIB)  # type: ignore
+    assert started.wait(1)
+
+    # Starts while running are combined into a single rerun
+    runner.start(None, Library.FRC_DESIGN_LIB)  # type: ignore
+    runner.start(None, Library.FRC_DESIGN_LIB)  # type: ignore
+    release.set()
+
+    assert finished.wait(1)
+    time.sleep(0.05)
+    assert runs == [Library.FRC_DESIGN_LIB, Library.FRC_DESIGN_LIB]
@@ -0,0 +1,21 @@
+from backend.common.models import LATEST_ELEMENT_SCHEMA
+from backend.common.reload_context import ReloadContext, SavedElement
+
+
+def test_reload_context_validates_lazily():
+    reload_context = ReloadContext()
+    reload_context.save_element(
+        "element",
+        {
+            "elementSchema": LATEST_ELEMENT_SCHEMA,
+            "isVisible": None,
+            "microversionId": "microversion",
+        },
+    )
+    # Malformed data only fails if it's looked up
+    reload_context.save_element("malformed", {"isVisible": "not a bool"})
+
+    assert not reload_context.get_element("element").isVisible
+    assert not reload_context.should_reload_element("element", "microversion")
+    assert reload_context.should_reload_element("element", "new-microversion")
+    assert reload_context.get_element("missing") == SavedElement()
@@ -0,0 +1,125 @@
+from backend.common.models import Vendor
+from backend.common.search_index import (
+    FilterResult,
+    Position,
+    SearchDocument,
+    SearchIndex,
+    build_search_index,
+    process_term,
+    tokenize,
+)
+
+
+def test_tokenize():
+    """Expected values match tokenize in frontend/src/search/search.ts."""
+    assert tokenize("SDS MK4i Swerve-Module (L2)") == [
+        "SDS",
+        "MK4i",
+        "Swerve",
+        "Module",
+        "L2",
+    ]
+    assert tokenize("WCP #25 Chain  & Sprocket") == ["WCP", "25", "Chain", "Sprocket"]
+    assert tokenize("") == []
+
+
+def test_process_term():
+    """Expected values match processTerm in frontend/src/search/search.ts."""
+    assert process_term("NEOVortex") == ["neovortex", "neo", "vortex"]
+    assert process_term("camelCase") == ["camel", "case", "camelcase"]
+    assert process_term("MK4i") == ["mk4i"]
+
+
+def test_build_search_index():
+    search_index = build_search_index(
+        [
+            SearchDocument(
+                id="element-1",
+                documentId="document-1",
+                isVisible=True,
+                vendors=[Vendor.WCP],
+                name="Chain Chain",
+                documentName="Motion",
+            ),
+            SearchDocument(
+                id="element-2",
+                documentId="document-1",
+                isVisible=False,
+                vendors=[],
+                name="NEOVortex",
+                documentName="Motion",
+            ),
+        ]
+    )
+
+    assert search_index["documentIds"] == {"0": "element-1", "1": "element-2"}
+    assert search_index["fieldLength"] == {"0": [1, 1], "1": [1, 1]}
+    assert search_index["storedFields"]["0"]["vendors"] == ["WCP"]
+
+    index = dict(search_index["index"])
+    assert index["chain"] == {"0": {"0": 2}}
+    assert index["motion"] == {"1": {"0": 1, "1": 1}}
+    assert index["vortex"] == {"0": {"1": 1}}
+
+
+def test_search():
+    def make_document(
+        id: str, name: str, document_id: str, vendors: list[Vendor], visible=True
+    ):
+        return SearchDocument(
+            id=id,
+            documentId=document_id,
+            isVisible=visible,
+            vendors=vendors,
+            name=name,
+            documentName="Motors",
+        )
+
+    search_index = SearchIndex(
+        [
+            make_document("vortex", "NEO Vortex", "rev", [Vendor.REV]),
+            make_document("neo", "NEO 550", "rev", [Vendor.REV]),
+            make_document("kraken", "Kraken X60", "wcp", [Vendor.WCP]),
+            make_document("hidden", "NEO Hidden", "rev", [Vendor.REV], False),
+        ]
+    )
+
+    result = search_index.search("neo vort")
+    assert [hit.id for hit in result.hits] == ["vortex", "neo"]
+    assert result.hits[0].positions == [
+        Position(start=0, length=3),
+        Position(start=4, length=6),
+    ]
+    assert result.facets.documents == {"rev": 2}
+
+    # Fuzzy matching
+    assert [hit.id for hit in search_index.search("krakn").hits] == ["kraken"]
+    assert search_index.search("krakn", fuzzy=False).hits == []
+
+    result = search_index.search("motors", vendors=[Vendor.WCP])
+    assert [hit.id for hit in result.hits] == ["kraken"]
+    assert result.filtered == FilterResult(byVendor=2)
+    assert result.facets.vendors == {Vendor.REV: 2, Vendor.WCP: 1}
+
+
+def test_search_highlights_name_matches():
+    search_index = SearchIndex(
+        [
+            SearchDocument(
+                id="adapter",
+                documentId="gears",
+                isVisible=True,
+                vendors=[],
+                name="Hexgears Adapter",
+                documentName="Gears",
+            )
+        ]
+    )
+
+    # Terms matched only in the document name aren't highlighted in the element name
+    result = search_index.search("gears")
+    assert [hit.id for hit in result.hits] == ["adapter"]
+    assert result.hits[0].positions == []
+
+    result = search_index.search("adapter")
+    assert result.hits[0].positions == [Position(start=9, length=7)]
@@ -0,0 +1,27 @@
+from requests_oauthlib import OAuth2Session
+
+from backend.common.connect import OAuthSessionPool
+
+
+def test_session_pool_evicts_stale_generations():
+    pool = OAuthSessionPool()
+    oauth = OAuth2Session("client")
+    pool.put("session", oauth, "generation-1")
+
+    assert pool.get("session", "generation-1") is oauth
+    # Signing in again on another worker changes the generation
+    assert pool.get("session", "generation-2") == None
+    assert pool.get("session", "generation-1") == None
+
+
+def test_session_pool_lru():
+    pool = OAuthSessionPool(max_size=2)
+    sessions = {id: OAuth2Session("client") for id in ("a", "b", "c")}
+    pool.put("a", sessions["a"])
+    pool.put("b", sessions["b"])
+    pool.get("a")
+    pool.put("c", sessions["c"])
+
+    assert pool.get("a") is sessions["a"]
+    assert pool.get("b") == None
+    assert pool.get("c") is sessions["c"]
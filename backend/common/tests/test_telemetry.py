@@ -0,0 +1,45 @@
+import threading
+
+from backend.common import app_logging
+from backend.common.app_logging import TelemetryPipeline
+
+
+def test_telemetry_runs_tasks():
+    pipeline = TelemetryPipeline(wait_timeout=0.01)
+    results = []
+    flushes = []
+    pipeline.add_flush_hook(flushes.append)
+
+    for index in range(5):
+        assert pipeline.submit(lambda index=index: results.append(index))
+    pipeline.flush()
+
+    assert results == list(range(5))
+    # Flushing always runs the hooks with force
+    assert flushes[-1] == True
+
+
+def test_telemetry_drops_tasks_when_full(monkeypatch):
+    warnings = []
+    monkeypatch.setattr(app_logging.APP_LOGGER, "warning", warnings.append)
+    pipeline = TelemetryPipeline(max_size=1, wait_timeout=0.01)
+    started = threading.Event()
+    release = threading.Event()
+
+    def block() -> None:
+        started.set()
+        release.wait(1)
+
+    assert pipeline.submit(block)
+    assert started.wait(1)
+    # Fills the queue while the first task runs
+    assert pipeline.submit(lambda: None)
+
+    for _ in range(app_logging.DROP_LOG_INTERVAL + 1):
+        assert not pipeline.submit(lambda: None)
+    release.set()
+    pipeline.flush()
+
+    assert pipeline.dropped == app_logging.DROP_LOG_INTERVAL + 1
+    # Only the first drop and every interval after it are logged
+    assert len(warnings) == 2
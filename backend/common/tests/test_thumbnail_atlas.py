@@ -0,0 +1,123 @@
+from io import BytesIO
+
+from PIL import Image
+import pytest
+
+from backend.common import firebase_storage
+from backend.common.firebase_storage import (
+    ATLAS_SIZE,
+    get_atlas_key,
+    get_thumbnail_blob,
+    layout_atlas,
+    upload_thumbnail_atlas,
+)
+from backend.common.image_formats import get_storage_format
+from backend.common.models import AtlasTile, ThumbnailManifest, UploadedThumbnail
+
+
+class FakeBlob:
+    def __init__(self, bucket: "FakeBucket", name: str) -> None:
+        self.bucket = bucket
+        self.name = name
+        self.public_url = f"https://storage/{name}"
+        self.cache_control = None
+
+    def exists(self) -> bool:
+        return self.name in self.bucket.files
+
+    def download_as_bytes(self) -> bytes:
+        return self.bucket.files[self.name]
+
+    def upload_from_string(self, data: bytes, content_type: str) -> None:
+        self.bucket.files[self.name] = data
+        self.bucket.uploads.append(self.name)
+
+
+class FakeBucket:
+    def __init__(self) -> None:
+        self.files: dict[str, bytes] = {}
+        self.uploads: list[str] = []
+
+    def blob(self, name: str) -> FakeBlob:
+        return FakeBlob(self, name)
+
+
+@pytest.fixture
+def bucket(monkeypatch):
+    bucket = FakeBucket()
+    monkeypatch.setattr(firebase_storage, "get_bucket", lambda: bucket)
+    return bucket
+
+
+def add_thumbnail(
+    bucket: FakeBucket, manifest: ThumbnailManifest, element_id: str, color: str
+) -> None:
+    """Stores a TINY thumbnail of an element the way upload_thumbnail does."""
+    output = BytesIO()
+    Image.new("RGB", (70, 40), color).save(output, format="WEBP")
+    content_hash = f"{element_id}-{color}"
+    blob = get_thumbnail_blob(bucket, content_hash, get_storage_format())  # type: ignore
+    assert blob.name != None
+    bucket.files[blob.name] = output.getvalue()
+    manifest.elements[element_id] = {
+        ATLAS_SIZE: UploadedThumbnail(
+            microversionId="microversion", url=blob.public_url, hash=content_hash
+        )
+    }
+
+
+def test_layout_atlas():
+    tiles, width, height = layout_atlas(["a", "b", "c", "d", "e"], 70, 40)
+    # Three columns and two rows, filled row by row
+    assert (width, height) == (210, 80)
+    assert tiles["a"] == AtlasTile(x=0, y=0)
+    assert tiles["c"] == AtlasTile(x=140, y=0)
+    assert tiles["d"] == AtlasTile(x=0, y=40)
+
+    tiles, width, height = layout_atlas(["a"], 70, 40)
+    assert (width, height) == (70, 40)
+
+
+def test_get_atlas_key():
+    key = get_atlas_key({"a": "hash-a", "b": "hash-b"})
+    assert key == get_atlas_key({"a": "hash-a", "b": "hash-b"})
+    assert key != get_atlas_key({"b": "hash-b", "a": "hash-a"})
+    assert key != get_atlas_key({"a": "hash-a", "b": "hash-c"})
+
+
+def test_upload_thumbnail_atlas(bucket: FakeBucket):
+    manifest = ThumbnailManifest()
+    add_thumbnail(bucket, manifest, "a", "red")
+    add_thumbnail(bucket, manifest, "b", "blue")
+
+    atlas = upload_thumbnail_atlas(["a", "b", "missing"], manifest)
+    assert atlas != None
+    assert list(atlas.tiles) == ["a", "b"]
+    assert (atlas.width, atlas.height) == (140, 40)
+    assert len(bucket.uploads) == 1
+
+    with Image.open(BytesIO(bucket.files[bucket.uploads[0]])) as image:
+        assert image.size == (140, 40)
+        pixel = image.convert("RGB").getpixel((105, 20))
+        assert isinstance(pixel, tuple) and pixel[2] > 200
+
+    # Unchanged thumbnails reuse the existing atlas
+    assert upload_thumbnail_atlas(["a", "b"], manifest) == atlas
+    assert len(bucket.uploads) == 1
+
+    # A changed thumbnail builds a new atlas
+    add_thumbnail(bucket, manifest, "b", "green")
+    new_atlas = upload_thumbnail_atlas(["a", "b"], manifest)
+    assert new_atlas != None and new_atlas.key != atlas.key
+    assert len(bucket.uploads) == 2
+
+
+def test_upload_thumbnail_atlas_skips_outdated_thumbnails(bucket: FakeBucket):
+    manifest = ThumbnailManifest()
+    manifest.elements["old"] = {
+        ATLAS_SIZE: UploadedThumbnail(
+            microversionId="microversion", url="https://storage/thumbnails/old"
+        )
+    }
+    assert upload_thumbnail_atlas(["old"], manifest) == None
+    assert bucket.uploads == []
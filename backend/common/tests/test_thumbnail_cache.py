@@ -0,0 +1,41 @@
+from backend.common.thumbnail_cache import ThumbnailDiskCache, stream_map
+
+
+def read(cache: ThumbnailDiskCache, *key: str) -> bytes | None:
+    cached = cache.get(*key)
+    if cached == None:
+        return None
+    return b"".join(stream_map(cached))
+
+
+def test_thumbnail_disk_cache(tmp_path):
+    cache = ThumbnailDiskCache(tmp_path, max_bytes=10)
+    cache.put(b"aaaa", "a", "70x40")
+    cache.put(b"bbbb", "b", "70x40")
+    assert read(cache, "a", "70x40") == b"aaaa"
+    assert read(cache, "a", "300x300") == None
+
+    # b is least recently used, so it's evicted
+    cache.put(b"cccc", "c", "70x40")
+    assert read(cache, "b", "70x40") == None
+    assert read(cache, "c", "70x40") == b"cccc"
+
+    # A new worker adopts the existing files
+    reloaded = ThumbnailDiskCache(tmp_path, max_bytes=10)
+    assert read(reloaded, "a", "70x40") == b"aaaa"
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+def test_thumbnail_disk_cache_shared_directory(tmp_path):
+    first = ThumbnailDiskCache(tmp_path, max_bytes=10)
+    second = ThumbnailDiskCache(tmp_path, max_bytes=10)
+
+    # Files written by another worker are hits
+    first.put(b"aaaa", "a", "70x40")
+    assert read(second, "a", "70x40") == b"aaaa"
+
+    # and count towards this worker's usage
+    second.put(b"bbbb", "b", "70x40")
+    second.put(b"cccc", "c", "70x40")
+    assert read(second, "a", "70x40") == None
+    assert len(list(tmp_path.iterdir())) == 2
@@ -0,0 +1,132 @@
+import hashlib
+from io import BytesIO
+
+from PIL import Image
+import pytest
+
+from backend.common import firebase_storage
+from backend.common.firebase_storage import (
+    THUMBNAIL_SIZES,
+    upload_thumbnail,
+    upload_thumbnails,
+)
+from backend.common.models import ThumbnailManifest
+from backend.common.tests.test_thumbnail_atlas import FakeBucket, bucket
+from onshape_api.endpoints.thumbnails import ThumbnailSize
+from onshape_api.paths.doc_path import ElementPath
+from onshape_api.paths.instance_type import InstanceType
+
+ELEMENT_PATH = ElementPath(
+    "0" * 24, "1" * 24, "2" * 24, instance_type=InstanceType.VERSION
+)
+
+
+def make_thumbnail(color: str) -> bytes:
+    output = BytesIO()
+    Image.new("RGB", (70, 40), color).save(output, format="PNG")
+    return output.getvalue()
+
+
+class FakeManifestRef:
+    def __init__(self) -> None:
+        self.updates: list[dict] = []
+
+    def get(self) -> ThumbnailManifest:
+        return ThumbnailManifest()
+
+    def update(self, partial: dict) -> None:
+        self.updates.append(partial)
+
+
+class FakeDatabase:
+    def __init__(self) -> None:
+        self.manifest_ref = FakeManifestRef()
+
+    def get_thumbnail_manifest(self, document_id: str) -> FakeManifestRef:
+        return self.manifest_ref
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    """Serves thumbnails from Onshape, recording the elements they were fetched for."""
+    fetches = []
+
+    def maybe_get_thumbnail(api, element_path: ElementPath, size) -> BytesIO:
+        fetches.append((element_path.element_id, size))
+        return BytesIO(make_thumbnail("red"))
+
+    monkeypatch.setattr(firebase_storage, "maybe_get_thumbnail", maybe_get_thumbnail)
+    return fetches
+
+
+def upload(
+    db: FakeDatabase,
+    manifest: ThumbnailManifest,
+    microversion_id: str,
+    force: bool = False,
+) -> dict:
+    return upload_thumbnails(None, db, ELEMENT_PATH, microversion_id, manifest, force=force)  # type: ignore
+
+
+def save_manifest(db: FakeDatabase, manifest: ThumbnailManifest) -> ThumbnailManifest:
+    """Applies the manifest updates written by upload_thumbnails."""
+    for update in db.manifest_ref.updates:
+        written = ThumbnailManifest.model_validate(update)
+        for element_id, thumbnails in written.elements.items():
+            manifest.elements.setdefault(element_id, {}).update(thumbnails)
+    db.manifest_ref.updates = []
+    return manifest
+
+
+def test_upload_thumbnails_manifest_miss(bucket: FakeBucket, fetches):
+    db = FakeDatabase()
+    urls = upload(db, ThumbnailManifest(), "microversion")
+
+    assert len(fetches) == len(THUMBNAIL_SIZES)
+    assert len(urls) == len(THUMBNAIL_SIZES)
+    assert len(db.manifest_ref.updates) == 1
+
+
+def test_upload_thumbnails_manifest_hit(bucket: FakeBucket, fetches):
+    db = FakeDatabase()
+    manifest = ThumbnailManifest()
+    urls = upload(db, manifest, "microversion")
+    manifest = save_manifest(db, manifest)
+    fetches.clear()
+
+    # Up to date thumbnails are served from the manifest without touching Onshape or storage
+    assert upload(db, manifest, "microversion") == urls
+    assert fetches == []
+    assert db.manifest_ref.updates == []
+
+    # A new microversion is checked again
+    upload(db, manifest, "new-microversion")
+    assert len(fetches) == len(THUMBNAIL_SIZES)
+
+
+def test_upload_thumbnails_force(bucket: FakeBucket, fetches):
+    db = FakeDatabase()
+    manifest = ThumbnailManifest()
+    urls = upload(db, manifest, "microversion")
+    manifest = save_manifest(db, manifest)
+    fetches.clear()
+    uploads = len(bucket.uploads)
+
+    assert upload(db, manifest, "microversion", force=True) == urls
+    assert len(fetches) == len(THUMBNAIL_SIZES)
+    # Unchanged images aren't uploaded again
+    assert len(bucket.uploads) == uploads
+
+
+def test_identical_thumbnails_share_a_blob(bucket: FakeBucket, fetches):
+    other_path = ElementPath.from_path(ELEMENT_PATH, "3" * 24)
+    first = upload_thumbnail(None, bucket, ELEMENT_PATH, "microversion", ThumbnailSize.TINY)  # type: ignore
+    second = upload_thumbnail(None, bucket, other_path, "microversion", ThumbnailSize.TINY)  # type: ignore
+
+    content_hash = hashlib.sha256(make_thumbnail("red")).hexdigest()
+    assert first != None and second != None
+    assert first.hash == second.hash == content_hash
+    assert first.url == second.url
+    # The second element reuses the blob uploaded for the first
+    assert len(bucket.uploads) == 1
+    assert bucket.uploads[0].startswith(f"thumbnails/{content_hash}")
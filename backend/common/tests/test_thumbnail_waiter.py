@@ -0,0 +1,59 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+import pytest
+
+from backend.common.thumbnail_waiter import ThumbnailWaiter
+from onshape_api.exceptions import OnshapeException
+
+
+def test_thumbnail_waiter_retries():
+    waiter = ThumbnailWaiter(deadline=1, initial_delay=0.01, max_delay=0.02)
+    attempts = []
+
+    def fetch() -> bytes:
+        attempts.append(None)
+        if len(attempts) < 3:
+            raise OnshapeException("Thumbnail not ready")
+        return b"thumbnail"
+
+    assert waiter.wait(fetch, "id", "300x170") == b"thumbnail"
+    assert len(attempts) == 3
+
+
+def test_thumbnail_waiter_deadline():
+    waiter = ThumbnailWaiter(deadline=0.05, initial_delay=0.01, max_delay=0.02)
+
+    def fetch() -> bytes:
+        raise OnshapeException("Thumbnail not ready")
+
+    with pytest.raises(TimeoutError):
+        waiter.wait(fetch, "id", "300x170")
+
+
+def test_thumbnail_waiter_shares_polls():
+    waiter = ThumbnailWaiter(deadline=1, initial_delay=0.01, max_delay=0.02)
+    started = threading.Event()
+    release = threading.Event()
+    attempts = []
+
+    def fetch() -> bytes:
+        attempts.append(None)
+        started.set()
+        release.wait()
+        return b"thumbnail"
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        owner = executor.submit(waiter.wait, fetch, "id", "300x170")
+        started.wait()
+        waiters = [
+            executor.submit(waiter.wait, fetch, "id", "300x170") for _ in range(3)
+        ]
+        # Give the other requests time to start waiting on the first poll
+        time.sleep(0.1)
+        release.set()
+        results = [future.result() for future in [owner, *waiters]]
+
+    assert results == [b"thumbnail"] * 4
+    assert len(attempts) == 1
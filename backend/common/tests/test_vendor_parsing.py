@@ -12,6 +12,7 @@ def test_parse_vendor_name():
     assert parse_vendors("My Part (WCP) (Other)") == [Vendor.WCP]
     assert parse_vendors("ReDux part") == [Vendor.REDUX]
     assert parse_vendors("Thrifty part") == []
+    assert parse_vendors("AMP part_WCP") == []
 
 
 def test_parse_vendor_configurations():
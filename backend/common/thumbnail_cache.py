@@ -0,0 +1,131 @@
+"""A size-capped cache of thumbnails on local disk, so repeated requests for the same thumbnail skip Onshape."""
+
+from __future__ import annotations
+from collections import OrderedDict
+from collections.abc import Iterator
+import hashlib
+import mmap
+import os
+from pathlib import Path
+import tempfile
+import threading
+
+from backend.common import env
+
+# The number of bytes yielded at a time when streaming a cached thumbnail
+CHUNK_SIZE = 64 * 1024
+
+
+class ThumbnailDiskCache:
+    """A least recently used cache of thumbnails stored as files in a directory.
+
+    Entries are written atomically, so concurrent workers sharing the directory never read partial files.
+    Each worker tracks its own usage; a file written by another worker is adopted the first time it's read,
+    and a file evicted by another worker is treated as a miss.
+    """
+
+    def __init__(self, directory: str | Path, max_bytes: int) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        # Maps file names to sizes, least recently used first
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._load_entries()
+
+    def _load_entries(self) -> None:
+        """Adopts files left by previous workers, treating the least recently modified as least recently used."""
+        paths = [path for path in self.directory.iterdir() if path.suffix == ".bin"]
+        for path in sorted(paths, key=lambda path: path.stat().st_mtime):
+            size = path.stat().st_size
+            self._entries[path.name] = size
+            self._size += size
+        self._evict()
+
+    @staticmethod
+    def get_file_name(*key: str) -> str:
+        return hashlib.sha256("/".join(key).encode()).hexdigest() + ".bin"
+
+    def get(self, *key: str) -> mmap.mmap | None:
+        """Returns a read-only memory map of a cached thumbnail, or None if it isn't cached.
+
+        The caller is responsible for closing the map.
+        """
+        name = self.get_file_name(*key)
+        with self._lock:
+            if name in self._entries:
+                self._entries.move_to_end(name)
+            elif not self._adopt(name):
+                return None
+
+        try:
+            with open(self.directory / name, "rb") as file:
+                # The map stays valid after the file is closed or deleted
+                return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            # Evicted by another worker, or empty
+            self._remove(name)
+            return None
+
+    def put(self, data: bytes, *key: str) -> None:
+        """Adds a thumbnail to the cache, evicting the least recently used thumbnails if the cache is full."""
+        if len(data) == 0 or len(data) > self.max_bytes:
+            return
+
+        name = self.get_file_name(*key)
+        descriptor, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                file.write(data)
+            os.replace(temp_path, self.directory / name)
+        except OSError:
+            Path(temp_path).unlink(missing_ok=True)
+            return
+
+        with self._lock:
+            self._size -= self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+            self._size += len(data)
+            self._evict()
+
+    def _adopt(self, name: str) -> bool:
+        """Starts tracking a file written by another worker. Must be called with the lock held.
+
+        Returns:
+            True if the file exists.
+        """
+        try:
+            size = (self.directory / name).stat().st_size
+        except FileNotFoundError:
+            return False
+        self._entries[name] = size
+        self._size += size
+        self._evict()
+        return name in self._entries
+
+    def _remove(self, name: str) -> None:
+        with self._lock:
+            self._size -= self._entries.pop(name, 0)
+
+    def _evict(self) -> None:
+        """Deletes least recently used files until the cache fits. Must be called with the lock held."""
+        while self._size > self.max_bytes and len(self._entries) > 0:
+            name, size = self._entries.popitem(last=False)
+            self._size -= size
+            (self.directory / name).unlink(missing_ok=True)
+
+
+def stream_map(mapped: mmap.mmap) -> Iterator[bytes]:
+    """Yields the contents of a memory map in chunks, closing it once exhausted."""
+    try:
+        for start in range(0, len(mapped), CHUNK_SIZE):
+            yield mapped[start : start + CHUNK_SIZE]
+    finally:
+        mapped.close()
+
+
+THUMBNAIL_CACHE = ThumbnailDiskCache(
+    env.THUMBNAIL_CACHE_DIR, env.THUMBNAIL_CACHE_MAX_BYTES
+)
@@ -0,0 +1,81 @@
+"""Waits for Onshape to finish rendering thumbnails, sharing a single poll between concurrent requests."""
+
+from __future__ import annotations
+from collections.abc import Callable
+from concurrent.futures import Future
+import threading
+import time
+
+from onshape_api.exceptions import OnshapeException
+
+# The number of seconds to wait for a thumbnail before giving up
+DEADLINE = 20
+INITIAL_DELAY = 0.5
+MAX_DELAY = 4
+
+
+class ThumbnailWaiter:
+    """Polls Onshape for thumbnails with capped exponential backoff.
+
+    The first request for a thumbnail polls Onshape; concurrent requests for the same thumbnail wait on its result
+    instead of polling themselves.
+    """
+
+    def __init__(
+        self,
+        deadline: float = DEADLINE,
+        initial_delay: float = INITIAL_DELAY,
+        max_delay: float = MAX_DELAY,
+    ) -> None:
+        self.deadline = deadline
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self._pending: dict[tuple[str, ...], Future[bytes]] = {}
+        self._lock = threading.Lock()
+
+    def wait(self, fetch: Callable[[], bytes], *key: str) -> bytes:
+        """Returns the result of fetch once it stops failing.
+
+        Parameters:
+            fetch: Fetches the thumbnail. Raises an OnshapeException while the thumbnail isn't ready.
+            key: Identifies the thumbnail, e.g., its id and size.
+
+        Raises:
+            TimeoutError: If the thumbnail isn't ready before the deadline.
+        """
+        with self._lock:
+            future = self._pending.get(key)
+            is_owner = future == None
+            if future == None:
+                future = Future()
+                self._pending[key] = future
+
+        if not is_owner:
+            return future.result(timeout=self.deadline)
+
+        try:
+            data = self._poll(fetch)
+            future.set_result(data)
+            return data
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._pending[key]
+
+    def _poll(self, fetch: Callable[[], bytes]) -> bytes:
+        deadline = time.monotonic() + self.deadline
+        delay = self.initial_delay
+        while True:
+            try:
+                return fetch()
+            except OnshapeException:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("Timed out waiting for thumbnail")
+                time.sleep(min(delay, remaining))
+                delay = min(delay * 2, self.max_delay)
+
+
+THUMBNAIL_WAITER = ThumbnailWaiter()
@@ -1,3 +1,4 @@
+from collections.abc import Iterable
 import re
 from backend.common.models import (
     ConfigurationParameters,
@@ -7,21 +8,59 @@ from backend.common.models import (
 )
 
 
+class VendorClassifier:
+    """Finds vendors in element names and configuration options.
+
+    All vendor abbreviations are matched by a single regex which is compiled once.
+    """
+
+    def __init__(self) -> None:
+        abbreviations = sorted(
+            (vendor.value for vendor in Vendor), key=len, reverse=True
+        )
+        self.abbreviation_pattern = re.compile(
+            r"\b(" + "|".join(re.escape(a) for a in abbreviations) + r")\b",
+            re.IGNORECASE,
+        )
+        self.abbreviations = {vendor.upper(): vendor for vendor in Vendor}
+        self.full_names = {get_vendor_name(vendor).upper(): vendor for vendor in Vendor}
+
+    def find_abbreviation(self, name: str) -> Vendor | None:
+        """Returns the vendor of the first word in name which is a vendor abbreviation."""
+        match = self.abbreviation_pattern.search(name)
+        if match == None:
+            return None
+        return self.abbreviations[match.group(1).upper()]
+
+    def find_option_vendor(self, name: str) -> Vendor | None:
+        """Returns the vendor of a configuration option, which may be an abbreviation or a vendor's full name."""
+        vendor = self.find_abbreviation(name)
+        if vendor != None:
+            return vendor
+        return self.full_names.get(name.upper())
+
+    def find_option_vendors(self, names: Iterable[str]) -> set[Vendor]:
+        """Returns the vendors of many configuration options at once.
+
+        Each distinct name is only classified once.
+        """
+        vendors: set[Vendor] = set()
+        for name in set(names):
+            vendor = self.find_option_vendor(name)
+            if vendor != None:
+                vendors.add(vendor)
+        return vendors
+
+
+VENDOR_CLASSIFIER = VendorClassifier()
+
+
 def parse_name_vendor(name: str) -> Vendor | None:
     """Parse vendor information from element name.
 
-    Checks the name for vendor abbreviations or full names.
+    Checks the name for vendor abbreviations.
     """
-    # Search for all vendor matches in the name
-    # Look for vendors in parentheses or standalone
-    for match in re.finditer(r"\b(\w+)\b", name.upper()):
-        vendor_str = match.group(1)
-
-        # Check if it matches a vendor abbreviation
-        if vendor := next(
-            (vendor for vendor in Vendor if vendor.upper() == vendor_str), None
-        ):
-            return vendor
+    return VENDOR_CLASSIFIER.find_abbreviation(name)
 
 
 def parse_vendors(
@@ -30,38 +69,20 @@ def parse_vendors(
     """
     Parse vendor information from element name and/or configuration parameters.
 
-    First checks the name for vendor abbreviations or full names.
+    First checks the name for vendor abbreviations.
     If no vendors found in name, checks configuration enum parameters for vendor values.
     """
     name_vendor = parse_name_vendor(name)
     if name_vendor:
         return [name_vendor]
 
-    vendors: set[Vendor] = set()
     if not configuration:
         return []
 
-    for param in configuration.parameters:
-        if param.type != ParameterType.ENUM:
-            continue
-
-        # Check all option values against vendors
-        for option in param.options:
-            # Check if option matches vendor abbreviation
-            vendor = parse_name_vendor(option.name)
-            if vendor:
-                vendors.add(vendor)
-                continue
-
-            vendor = next(
-                (
-                    vendor
-                    for vendor in Vendor
-                    if get_vendor_name(vendor).upper() == option.name.upper()
-                ),
-                None,
-            )
-            if vendor:
-                vendors.add(vendor)
-
-    return list(vendors)
+    option_names = (
+        option.name
+        for param in configuration.parameters
+        if param.type == ParameterType.ENUM
+        for option in param.options
+    )
+    return list(VENDOR_CLASSIFIER.find_option_vendors(option_names))
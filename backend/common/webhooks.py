@@ -0,0 +1,81 @@
+"""Receives webhook notifications from Onshape so libraries pick up new versions without waiting for a reload."""
+
+from __future__ import annotations
+import base64
+from collections.abc import Callable
+from enum import StrEnum
+import hashlib
+import hmac
+import threading
+
+from pydantic import BaseModel
+
+# The number of seconds to wait after the last event for a document before reloading it
+# Creating a version often fires several events in quick succession, e.g., when a release is made
+DEBOUNCE_DELAY = 30
+
+
+class WebhookEventType(StrEnum):
+    VERSION_CREATED = "onshape.model.lifecycle.createversion"
+    # Sent by Onshape when a webhook is registered
+    PING = "webhook.ping"
+
+
+class WebhookEvent(BaseModel):
+    event: str
+    webhookId: str | None = None
+    messageId: str | None = None
+    documentId: str | None = None
+    versionId: str | None = None
+
+
+def get_signature(body: bytes, secret: str) -> str:
+    """Returns the signature Onshape sends with a notification, a base64 encoded HMAC-SHA256 of its body."""
+    digest = hmac.new(secret.encode(), body, hashlib.sha256).digest()
+    return base64.b64encode(digest).decode()
+
+
+def verify_signature(body: bytes, signature: str | None, secret: str) -> bool:
+    """Returns True if a notification was signed with the shared secret."""
+    if signature == None:
+        return False
+    return hmac.compare_digest(get_signature(body, secret), signature)
+
+
+class DebouncedQueue:
+    """Runs a callback for each key once no more events have been enqueued for it for a delay.
+
+    Each key is run on its own daemon thread, so callbacks should handle their own errors.
+    """
+
+    def __init__(
+        self, callback: Callable[..., None], delay: float = DEBOUNCE_DELAY
+    ) -> None:
+        self.callback = callback
+        self.delay = delay
+        self._timers: dict[tuple[str, ...], threading.Timer] = {}
+        self._lock = threading.Lock()
+
+    def enqueue(self, *key: str) -> None:
+        """Schedules the callback for a key, replacing any run which hasn't started yet."""
+        with self._lock:
+            timer = self._timers.get(key)
+            if timer != None:
+                timer.cancel()
+
+            timer = threading.Timer(self.delay, self._run, key)
+            timer.daemon = True
+            self._timers[key] = timer
+            timer.start()
+
+    def _run(self, *key: str) -> None:
+        with self._lock:
+            # A newer event may have replaced this timer after it fired
+            if self._timers.get(key) is threading.current_thread():
+                del self._timers[key]
+        self.callback(*key)
+
+    def pending(self) -> list[tuple[str, ...]]:
+        """Returns the keys which are waiting to run."""
+        with self._lock:
+            return list(self._timers.keys())
@@ -1,28 +1,180 @@
 """Routes for inserting elements into documents."""
 
+from __future__ import annotations
+import asyncio
 from enum import StrEnum
 import flask
 
 from backend.common import connect
 from backend.common.app_access import require_access_level
-from backend.common.app_logging import log_part_inserted
-from backend.common.backend_exceptions import HandledException
-from backend.common.database import ConfigurationParameters
-from backend.common.models import FastenInfo, MateLocation, ParameterType
+from backend.common.app_logging import APP_LOGGER, log_part_inserted
+from backend.common.backend_exceptions import ClientException, HandledException
+from backend.common.database import ConfigurationParameters, DocumentRef
+from backend.common.models import (
+    DerivedParameter,
+    Element,
+    FastenInfo,
+    InsertPlan,
+    MateLocation,
+    ParameterType,
+    VersionInfo,
+)
 from onshape_api.api.api_base import Api
 from onshape_api.endpoints import part_studios, assemblies
 from onshape_api.endpoints.documents import ElementType, PartType
+from onshape_api.exceptions import OnshapeException
 from onshape_api.model.assembly_features import (
     FastenMateBuilder,
     feature_occurrence_query,
     part_studio_mate_connector_query,
 )
-from onshape_api.paths.doc_path import ElementPath, path_to_namespace
+from onshape_api.paths.doc_path import ElementPath, InstancePath, path_to_namespace
+from onshape_api.paths.instance_type import InstanceType
 
 
 router = flask.Blueprint("add-part", __name__)
 
 
+def get_part_types(element: Element) -> list[PartType]:
+    """Returns the types of parts to include when inserting an element into an assembly."""
+    if element.insertPlan != None:
+        return element.insertPlan.partTypes
+    if element.isOpenComposite:
+        return [PartType.COMPOSITE_PARTS]
+    return [PartType.PARTS, PartType.COMPOSITE_PARTS]
+
+
+def get_default_configuration(parameters: ConfigurationParameters) -> dict[str, str]:
+    return {parameter.id: parameter.default for parameter in parameters.parameters}
+
+
+def check_supports_fasten(element: Element) -> FastenInfo:
+    if element.fastenInfo == None:
+        raise HandledException(
+            f"Failed to create Fasten feature: {element.name} does not support fastening."
+        )
+    return element.fastenInfo
+
+
+def build_fasten_query(element_type: ElementType, fasten_info: FastenInfo) -> dict:
+    """Builds the mate connector query used to fasten an element.
+
+    The path of the query is relative to the inserted instance.
+    """
+    if element_type == ElementType.PART_STUDIO:
+        return part_studio_mate_connector_query(feature_id=fasten_info.mateConnectorId)
+    elif fasten_info.mateLocation == MateLocation.PART:
+        return part_studio_mate_connector_query(
+            feature_id=fasten_info.mateConnectorId,
+            path=fasten_info.path,
+        )
+    # MateLocation.FEATURE or MateLocation.SUBASSEMBLY
+    return feature_occurrence_query(
+        feature_id=fasten_info.mateConnectorId,
+        path=fasten_info.path,
+    )
+
+
+def build_fasten_mate(element: Element, instance_path: list[str]) -> dict:
+    """Builds a fasten mate which fastens an inserted instance of element to the origin of an assembly.
+
+    Parameters:
+        instance_path: The occurrence path of the inserted instance.
+    """
+    fasten_info = check_supports_fasten(element)
+
+    if element.insertPlan != None and element.insertPlan.fastenQuery != None:
+        query = element.insertPlan.fastenQuery.copy()
+    else:
+        query = build_fasten_query(element.elementType, fasten_info)
+    query["path"] = instance_path + query["path"]
+
+    return FastenMateBuilder(element.name).add_query(query).build()
+
+
+def build_insert_plan(
+    element: Element,
+    element_path: ElementPath,
+    version_info: VersionInfo,
+    parameters: ConfigurationParameters | None,
+) -> InsertPlan:
+    """Precomputes the data needed to insert an element.
+
+    Parameters:
+        element_path: The path to the element in the version it was loaded from.
+    """
+    namespace = path_to_namespace(element_path, element.microversionId)
+
+    part_types = [PartType.PARTS, PartType.COMPOSITE_PARTS]
+    if element.isOpenComposite:
+        part_types = [PartType.COMPOSITE_PARTS]
+
+    fasten_query = None
+    if element.fastenInfo != None:
+        fasten_query = build_fasten_query(element.elementType, element.fastenInfo)
+
+    return InsertPlan(
+        instanceId=element_path.instance_id,
+        versionInfo=version_info,
+        partTypes=part_types,
+        defaultConfiguration=(
+            get_default_configuration(parameters) if parameters != None else None
+        ),
+        fastenQuery=fasten_query,
+        namespace=namespace,
+        derivedConfiguration=(
+            build_derived_configuration(parameters, namespace)
+            if parameters != None
+            else []
+        ),
+    )
+
+
+def get_insert_plan(element: Element, path_to_add: ElementPath) -> InsertPlan | None:
+    """Returns the insert plan of an element if it was built for the version being inserted."""
+    plan = element.insertPlan
+    if plan == None or plan.instanceId != path_to_add.instance_id:
+        return None
+    return plan
+
+
+def update_insert_plan(
+    document_ref: DocumentRef,
+    element_id: str,
+    element: Element,
+    version_path: InstancePath | None = None,
+    version_info: VersionInfo | None = None,
+) -> Element:
+    """Rebuilds the insert plan of an element using data saved in the database.
+
+    Parameters:
+        version_path, version_info: The version of the element. If omitted, the version of the saved document is used.
+    """
+    if version_path == None or version_info == None:
+        document = document_ref.get()
+        version_path = InstancePath(
+            document_ref.id, document.instanceId, InstanceType.VERSION
+        )
+        version_info = document.versionInfo
+
+    parameters = None
+    if element.configurationId != None:
+        parameters = document_ref.configurations.configuration(element_id).get()
+
+    element.insertPlan = build_insert_plan(
+        element,
+        ElementPath.from_path(version_path, element_id),
+        version_info,
+        parameters,
+    )
+    return element
+
+
+def get_instance_path(result: dict, index: int = 0) -> list[str]:
+    """Returns the occurrence path of an instance inserted using the transformedinstances endpoint."""
+    return result["insertInstanceResponses"][index]["occurrences"][0]["path"]
+
+
 @router.post(
     "/add-to-assembly" + connect.library_route() + connect.element_path_route()
 )
@@ -45,22 +197,18 @@ def add_to_assembly(**kwargs):
     document_ref = library_ref.documents.document(path_to_add.document_id)
 
     element = document_ref.elements.element(path_to_add.element_id).get()
+    plan = get_insert_plan(element, path_to_add)
 
-    part_types = [PartType.PARTS, PartType.COMPOSITE_PARTS]
-    if element.isOpenComposite:
-        part_types = [PartType.COMPOSITE_PARTS]
+    if plan != None and configuration == None:
+        configuration = plan.defaultConfiguration
 
-    # Get the configuration parameters for logging purposes (not needed for the actual insert)
+    # Logging reads the configuration parameters itself if they aren't needed here
     parameters = None
-    if element.configurationId != None:
+    if element.configurationId != None and configuration == None:
         parameters = document_ref.configurations.configuration(
             path_to_add.element_id
         ).get()
-
-        if configuration == None:
-            configuration = {
-                parameter.id: parameter.default for parameter in parameters.parameters
-            }
+        configuration = get_default_configuration(parameters)
 
     result = assemblies.add_element_to_assembly(
         api,
@@ -68,54 +216,16 @@ def add_to_assembly(**kwargs):
         path_to_add,
         element.elementType,
         configuration=configuration,
-        part_types=part_types,
+        part_types=get_part_types(element),
         use_transform=fasten,
     )
 
     feature_id = None
     if fasten:
-        fasten_info = element.fastenInfo
-        if fasten_info == None:
-            raise HandledException(
-                f"Failed to create Fasten feature: {element.name} does not support fastening."
-            )
-
-        instance_path = result["insertInstanceResponses"][0]["occurrences"][0]["path"]
-
-        fasten_mate = FastenMateBuilder(element.name)
-        if element.elementType == ElementType.PART_STUDIO:
-            fasten_mate.add_query(
-                part_studio_mate_connector_query(
-                    feature_id=fasten_info.mateConnectorId,
-                    path=instance_path,
-                )
-            )
-        else:
-            if fasten_info.mateLocation == MateLocation.PART:
-                fasten_mate.add_query(
-                    part_studio_mate_connector_query(
-                        feature_id=fasten_info.mateConnectorId,
-                        path=instance_path + fasten_info.path,
-                    )
-                )
-            elif (
-                fasten_info.mateLocation == MateLocation.FEATURE
-                or fasten_info.mateLocation == MateLocation.SUBASSEMBLY
-            ):
-                fasten_mate.add_query(
-                    feature_occurrence_query(
-                        feature_id=fasten_info.mateConnectorId,
-                        path=instance_path + fasten_info.path,
-                    )
-                )
-
-        fasten_mate_result = assemblies.add_feature(
-            api, target_path, fasten_mate.build()
-        )
+        fasten_mate = build_fasten_mate(element, get_instance_path(result))
+        fasten_mate_result = assemblies.add_feature(api, target_path, fasten_mate)
         feature_id = fasten_mate_result["feature"]["featureId"]
 
-    document = document_ref.get()
-
     log_part_inserted(
         path_to_add.element_id,
         element.name,
@@ -124,7 +234,9 @@ def add_to_assembly(**kwargs):
         is_favorite=is_favorite,
         is_quick_insert=is_quick_insert,
         library=library,
-        document=document,
+        document_ref=document_ref,
+        version_id=path_to_add.instance_id,
+        version_info=plan.versionInfo if plan != None else None,
         configuration=configuration,
         configuration_parameters=parameters,
         supports_fasten=element.fastenInfo != None,
@@ -133,6 +245,150 @@ def add_to_assembly(**kwargs):
     return {"success": True, "featureId": feature_id}
 
 
+def add_fasten_mates(
+    api: Api, target_path: ElementPath, elements: list[Element], result: dict
+) -> tuple[list[str | None], list[int]]:
+    """Fastens each instance inserted by add_instances_to_assembly.
+
+    Features are added one at a time, in order, since concurrent writes to the same workspace race.
+    A failed feature doesn't stop the rest from being added.
+
+    Returns:
+        The id of the fasten feature of each element, or None if it failed, and the indices of the elements which failed.
+    """
+    feature_ids: list[str | None] = []
+    failed: list[int] = []
+    for index, element in enumerate(elements):
+        try:
+            fasten_mate_result = assemblies.add_feature(
+                api,
+                target_path,
+                build_fasten_mate(element, get_instance_path(result, index)),
+            )
+        except OnshapeException:
+            APP_LOGGER.exception(f"Failed to fasten {element.name}")
+            feature_ids.append(None)
+            failed.append(index)
+            continue
+        feature_ids.append(fasten_mate_result["feature"]["featureId"])
+    return feature_ids, failed
+
+
+@router.post(
+    "/add-to-assembly-batch" + connect.library_route() + connect.element_path_route()
+)
+async def add_to_assembly_batch(**kwargs):
+    """Adds the contents of multiple elements to the current assembly at once.
+
+    Body parameters:
+        elements: A list of objects with the element path (documentId, instanceId, and elementId) of each element to add, plus an optional configuration.
+        fasten: Whether to fasten every inserted instance.
+
+    Returns:
+        featureIds: The id of the fasten feature created for each element, or None if fasten is False or fastening it failed.
+        failedFasten: The indices of the elements which were inserted but couldn't be fastened.
+    """
+    api = connect.get_api()
+    db = connect.get_db()
+    library = connect.get_route_library()
+    library_ref = connect.get_library_ref()
+    target_path = connect.get_route_element_path()
+
+    elements_to_add: list[dict] = connect.get_body_arg("elements")
+    fasten = connect.get_optional_body_arg("fasten", False)
+
+    # Logging information
+    user_id = connect.get_body_arg("userId")
+    is_favorite = connect.get_body_arg("isFavorite")
+    is_quick_insert = connect.get_body_arg("isQuickInsert")
+
+    if len(elements_to_add) == 0:
+        raise ClientException("At least one element must be added.")
+
+    paths_to_add = [connect.parse_element_path(value) for value in elements_to_add]
+
+    # Prefetch every element and configuration in a single read
+    element_docs = []
+    configuration_docs = []
+    for path in paths_to_add:
+        document_ref = library_ref.documents.document(path.document_id)
+        element_docs.append(document_ref.elements.element(path.element_id))
+        # Configurations re-use the element id, so missing configurations are simply not found
+        configuration_docs.append(
+            document_ref.configurations.configuration(path.element_id)
+        )
+
+    results = db.get_all([*element_docs, *configuration_docs])
+    count = len(paths_to_add)
+    elements: list[Element] = [doc.get() for doc in results[:count]]
+    all_parameters: list[ConfigurationParameters | None] = [
+        doc.get() if element.configurationId != None else None
+        for element, doc in zip(elements, results[count:])
+    ]
+
+    # Validate everything before modifying the assembly
+    if fasten:
+        for element in elements:
+            check_supports_fasten(element)
+
+    configurations: list[dict | None] = []
+    instances = []
+    for value, path, element, parameters in zip(
+        elements_to_add, paths_to_add, elements, all_parameters
+    ):
+        configuration = value.get("configuration")
+        if configuration == None and parameters != None:
+            configuration = get_default_configuration(parameters)
+        configurations.append(configuration)
+
+        instances.append(
+            assemblies.make_insert_instance(
+                path,
+                element.elementType,
+                configuration=configuration,
+                part_types=get_part_types(element),
+            )
+        )
+
+    result = await asyncio.to_thread(
+        assemblies.add_instances_to_assembly, api, target_path, instances
+    )
+
+    feature_ids: list[str | None] = [None] * count
+    failed_fasten: list[int] = []
+    if fasten:
+        feature_ids, failed_fasten = await asyncio.to_thread(
+            add_fasten_mates, api, target_path, elements, result
+        )
+
+    for path, element, configuration, parameters in zip(
+        paths_to_add, elements, configurations, all_parameters
+    ):
+        plan = get_insert_plan(element, path)
+        log_part_inserted(
+            path.element_id,
+            element.name,
+            target_element_type=ElementType.ASSEMBLY,
+            user_id=user_id,
+            is_favorite=is_favorite,
+            is_quick_insert=is_quick_insert,
+            library=library,
+            document_ref=library_ref.documents.document(path.document_id),
+            version_id=path.instance_id,
+            version_info=plan.versionInfo if plan != None else None,
+            configuration=configuration,
+            configuration_parameters=parameters,
+            supports_fasten=element.fastenInfo != None,
+            fasten=fasten,
+        )
+
+    return {
+        "success": True,
+        "featureIds": feature_ids,
+        "failedFasten": failed_fasten,
+    }
+
+
 @router.post(
     "/add-to-part-studio" + connect.library_route() + connect.element_path_route()
 )
@@ -158,20 +414,31 @@ def add_to_part_studio(**kwargs):
 
     document_ref = library_ref.documents.document(path_to_add.document_id)
 
+    element = document_ref.elements.element(path_to_add.element_id).get()
+    plan = get_insert_plan(element, path_to_add)
+
     parameters = None
-    if configuration != None:
-        parameters = document_ref.configurations.configuration(
-            path_to_add.element_id
-        ).get()
+    if plan != None and element.microversionId == microversion_id:
+        derived_feature = DerivedFeature.from_plan(
+            name=part_name,
+            plan=plan,
+            use_mate_connector=use_mate_connector,
+            configuration=configuration,
+        )
+    else:
+        if configuration != None:
+            parameters = document_ref.configurations.configuration(
+                path_to_add.element_id
+            ).get()
+        derived_feature = DerivedFeature.from_parameters(
+            name=part_name,
+            part_studio_to_add=path_to_add,
+            microversion_id=microversion_id,
+            use_mate_connector=use_mate_connector,
+            configuration=configuration,
+            parameters=parameters,
+        )
 
-    derived_feature = DerivedFeature(
-        name=part_name,
-        part_studio_to_add=path_to_add,
-        microversion_id=microversion_id,
-        use_mate_connector=use_mate_connector,
-        configuration=configuration,
-        parameters=parameters,
-    )
     response = part_studios.add_feature(
         api, part_studio_path, derived_feature.get_feature()
     )
@@ -184,7 +451,9 @@ def add_to_part_studio(**kwargs):
         is_favorite=is_favorite,
         is_quick_insert=is_quick_insert,
         library=library,
-        document=document_ref.get(),
+        document_ref=document_ref,
+        version_id=path_to_add.instance_id,
+        version_info=plan.versionInfo if plan != None else None,
         configuration=configuration,
         configuration_parameters=parameters,
     )
@@ -223,55 +492,107 @@ def escape_feature_name(name: str) -> str:
     return name.replace("#", "##")
 
 
+def build_derived_configuration(
+    parameters: ConfigurationParameters, namespace: str
+) -> list[DerivedParameter]:
+    """Builds the configuration of a Derived feature without any configured values.
+
+    Parameters:
+        namespace: The namespace of the part studio being derived.
+    """
+    derived_configuration = []
+    for parameter in parameters.parameters:
+        config_type: ParameterType = parameter.type
+        template = {
+            "btType": str(config_type_to_part_studio_parameter_type(config_type)),
+            "parameterId": parameter.id,
+        }
+        value_key = "value"
+        if config_type == ParameterType.ENUM:
+            template["namespace"] = namespace
+            template["enumName"] = parameter.id + "_conf"
+        elif config_type == ParameterType.QUANTITY:
+            value_key = "expression"
+
+        derived_configuration.append(
+            DerivedParameter(
+                parameterId=parameter.id,
+                valueKey=value_key,
+                default=parameter.default,
+                template=template,
+            )
+        )
+    return derived_configuration
+
+
+def fill_derived_configuration(
+    derived_configuration: list[DerivedParameter], configuration: dict
+) -> list[dict]:
+    """Substitutes configured values into a configuration built by build_derived_configuration."""
+    part_configuration = []
+    for parameter in derived_configuration:
+        result = parameter.template.copy()
+        result[parameter.valueKey] = configuration.get(
+            parameter.parameterId, parameter.default
+        )
+        part_configuration.append(result)
+    return part_configuration
+
+
 class DerivedFeature:
     def __init__(
         self,
         name: str,
-        part_studio_to_add: ElementPath,
-        microversion_id: str,
+        namespace: str,
         use_mate_connector: bool = False,
-        configuration: dict | None = None,
-        parameters: ConfigurationParameters | None = None,
+        part_configuration: list[dict] | None = None,
     ):
         """
 
         Parameters:
+            namespace: The namespace of the part studio to derive.
             use_mate_connector: Whether to include mate connectors when deriving the part studio.
         """
         self.name = escape_feature_name(name)
-        self.namespace = path_to_namespace(part_studio_to_add, microversion_id)
+        self.namespace = namespace
         self.use_mate_connector = use_mate_connector
+        self.part_configuration = part_configuration
 
+    @classmethod
+    def from_parameters(
+        cls,
+        name: str,
+        part_studio_to_add: ElementPath,
+        microversion_id: str,
+        use_mate_connector: bool = False,
+        configuration: dict | None = None,
+        parameters: ConfigurationParameters | None = None,
+    ) -> DerivedFeature:
+        namespace = path_to_namespace(part_studio_to_add, microversion_id)
+
+        part_configuration = None
         if configuration != None and parameters != None:
-            self.part_configuration = self.build_part_configuration(
-                configuration, parameters
+            part_configuration = fill_derived_configuration(
+                build_derived_configuration(parameters, namespace), configuration
             )
-        else:
-            self.part_configuration = None
-
-    def build_part_configuration(
-        self, configuration: dict, parameters: ConfigurationParameters
-    ) -> list[dict]:
-        part_configuration = []
-        for parameter in parameters.parameters:
-            config_type: ParameterType = parameter.type
-            str_value = configuration.get(parameter.id, parameter.default)
-            result = {
-                "btType": str(config_type_to_part_studio_parameter_type(config_type)),
-                "parameterId": parameter.id,
-            }
-            if config_type == ParameterType.ENUM:
-                result["value"] = str_value
-                result["namespace"] = self.namespace
-                result["enumName"] = parameter.id + "_conf"
-            elif config_type == ParameterType.QUANTITY:
-                result["expression"] = str_value
-            else:
-                result["value"] = str_value
-
-            part_configuration.append(result)
-
-        return part_configuration
+
+        return cls(name, namespace, use_mate_connector, part_configuration)
+
+    @classmethod
+    def from_plan(
+        cls,
+        name: str,
+        plan: InsertPlan,
+        use_mate_connector: bool = False,
+        configuration: dict | None = None,
+    ) -> DerivedFeature:
+        part_configuration = None
+        if configuration != None and len(plan.derivedConfiguration) > 0:
+            part_configuration = fill_derived_configuration(
+                plan.derivedConfiguration, configuration
+            )
+
+        return cls(name, plan.namespace, use_mate_connector, part_configuration)
 
     def get_feature(self) -> dict:
         part_studio_parameter = {
@@ -327,14 +648,13 @@ def set_element_open_composite(**kwargs):
     element_id = connect.get_body_arg("elementId")
     is_open_composite = connect.get_body_arg("isOpenComposite")
 
-    element_ref = library_ref.documents.document(document_id).elements.element(
-        element_id
-    )
+    document_ref = library_ref.documents.document(document_id)
+    element_ref = document_ref.elements.element(element_id)
     element = element_ref.get()
     if element.elementType != ElementType.PART_STUDIO:
         raise HandledException("Only Part Studios can be marked as open composites.")
     element.isOpenComposite = is_open_composite
-    element_ref.set(element)
+    element_ref.set(update_insert_plan(document_ref, element_id, element))
 
     return {"success": True}
 
@@ -349,18 +669,17 @@ def set_element_supports_fasten(**kwargs):
     element_path = connect.get_route_element_path()
     supports_fasten = connect.get_body_arg("supportsFasten")
 
-    element_ref = library_ref.documents.document(
-        element_path.document_id
-    ).elements.element(element_path.element_id)
+    document_ref = library_ref.documents.document(element_path.document_id)
+    element_ref = document_ref.elements.element(element_path.element_id)
 
+    element = element_ref.get()
     if supports_fasten:
-        element = element_ref.get()
         element.fastenInfo = ParseFastenInfo().get_fasten_info(
             api, element_path, element.elementType
         )
-        element_ref.set(element)
     else:
-        element_ref.update({"fastenInfo": None})
+        element.fastenInfo = None
+    element_ref.set(update_insert_plan(document_ref, element_path.element_id, element))
 
     return {"success": True}
 
@@ -0,0 +1,84 @@
+"""Routes for querying usage analytics."""
+
+from __future__ import annotations
+from datetime import datetime, timezone
+
+import flask
+from pydantic import BaseModel
+
+from backend.common import connect
+from backend.common.analytics import (
+    decode_configuration,
+    get_days,
+    read_totals,
+    top_n,
+)
+from backend.common.app_access import require_access_level
+from backend.common.backend_exceptions import ClientException
+from onshape_api.endpoints.users import AccessLevel
+
+router = flask.Blueprint("analytics", __name__)
+
+MAX_DAYS = 90
+
+
+class ConfigurationCountOut(BaseModel):
+    configuration: dict[str, str]
+    count: int
+
+
+class ElementCountOut(BaseModel):
+    elementId: str
+    count: int
+    configurations: list[ConfigurationCountOut]
+
+
+class AnalyticsOut(BaseModel):
+    days: list[str]
+    appOpens: int
+    # The number of inserts from each library
+    libraries: dict[str, int]
+    elements: list[ElementCountOut]
+
+
+@router.get("/analytics" + connect.library_route())
+@require_access_level(AccessLevel.ADMIN)
+def get_analytics(**kwargs):
+    """Returns the most inserted elements and configurations of a library.
+
+    Query parameters:
+        days: The number of days to include, ending today (UTC). Defaults to 7.
+        limit: The maximum number of elements and configurations per element to return. Defaults to 10.
+    """
+    db = connect.get_db()
+    library = connect.get_route_library()
+    num_days = connect.get_query_int("days", 7)
+    limit = connect.get_query_int("limit", 10)
+    if num_days < 1 or num_days > MAX_DAYS:
+        raise ClientException(f"days must be between 1 and {MAX_DAYS}.")
+
+    days = get_days(datetime.now(timezone.utc).date(), num_days)
+    totals = read_totals(db, days)
+
+    elements = []
+    for element_id, count in top_n(totals.elements.get(library, {}), limit):
+        configurations = [
+            ConfigurationCountOut(
+                configuration=decode_configuration(key), count=config_count
+            )
+            for key, config_count in top_n(
+                totals.configurations.get(element_id, {}), limit
+            )
+        ]
+        elements.append(
+            ElementCountOut(
+                elementId=element_id, count=count, configurations=configurations
+            )
+        )
+
+    return AnalyticsOut(
+        days=days,
+        appOpens=totals.appOpens,
+        libraries=totals.libraries,
+        elements=elements,
+    ).model_dump_json(exclude_none=True)
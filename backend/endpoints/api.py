@@ -3,11 +3,13 @@ import flask
 from backend.common import backend_exceptions
 from backend.endpoints import (
     add_part,
+    analytics,
     configurations,
     documents,
     library,
     thumbnails,
     user_data,
+    webhooks,
 )
 from onshape_api.exceptions import OnshapeException
 
@@ -35,3 +37,5 @@ router.register_blueprint(thumbnails.router)
 router.register_blueprint(add_part.router)
 router.register_blueprint(user_data.router)
 router.register_blueprint(library.router)
+router.register_blueprint(analytics.router)
+router.register_blueprint(webhooks.router)
@@ -8,29 +8,38 @@ import asyncio
 from enum import StrEnum
 from typing import Iterator
 import flask
+from pydantic import ValidationError
 
 from backend.common import connect
-from backend.common.backend_exceptions import HandledException
+from backend.common.backend_exceptions import ClientException, HandledException
 from backend.common.database import (
+    BaseDocument,
+    Database,
     DocumentRef,
     DocumentsRef,
     LibraryRef,
+    update_batched,
 )
 from backend.common.app_access import require_access_level
-from backend.common.firebase_storage import upload_thumbnails
+from backend.common.change_feed import clear_pending, poll_changes
+from backend.common.firebase_storage import upload_thumbnail_atlas, upload_thumbnails
 from backend.common.models import (
+    ConfigurationParameters,
     Element,
+    ThumbnailManifest,
     VersionInfo,
     parse_version,
 )
 from backend.common.models import Document
+from backend.common.previews import queue_previews
+from backend.common.search_index import update_search_index
 from backend.common.vendors import parse_vendors
-from backend.endpoints.add_part import ParseFastenInfo
+from backend.endpoints.add_part import ParseFastenInfo, build_insert_plan
 from backend.endpoints.configurations import parse_onshape_configuration
 from backend.common.reload_context import (
     ReloadContext,
 )
-from backend.endpoints.thumbnails import ReloadDocumentThumbnail
+from backend.endpoints.thumbnails import ReloadDocumentThumbnail, ThumbnailJobRunner
 from onshape_api.api.api_base import Api
 from onshape_api.endpoints import documents
 from onshape_api.endpoints.configurations import get_configuration
@@ -41,20 +50,25 @@ from onshape_api.paths.doc_path import (
     ElementPath,
     InstancePath,
 )
+from onshape_api.paths.instance_type import InstanceType
 
 router = flask.Blueprint("documents", __name__)
 
 
 def save_element(
     api: Api,
+    db: Database,
     document_ref: DocumentRef,
     version_path: InstancePath,
+    version_info: VersionInfo,
     onshape_element: dict,
     reload_context: ReloadContext,
+    thumbnail_manifest: ThumbnailManifest,
 ) -> str:
     """
     Parameters:
         element: A part studio or assembly returned by the /elements endpoint.
+        thumbnail_manifest: The thumbnail manifest of the document, read once per document.
     """
 
     element_type: ElementType = onshape_element["elementType"]
@@ -64,16 +78,12 @@ def save_element(
 
     element_path = ElementPath.from_path(version_path, element_id)
 
-    onshape_configuration = get_configuration(api, element_path)
-    configuration_id = None
-    configuration = None
-    if len(onshape_configuration["configurationParameters"]) > 0:
-        configuration = parse_onshape_configuration(onshape_configuration)
-        # Re-use element db id since configurations can't be shared
-        document_ref.configurations.configuration(element_id).set(configuration)
-        configuration_id = element_id
+    configuration = save_configuration(api, document_ref, element_path)
+    configuration_id = element_id if configuration != None else None
 
-    thumbnail_urls = upload_thumbnails(api, element_path, microversion_id)
+    thumbnail_urls = upload_thumbnails(
+        api, db, element_path, microversion_id, thumbnail_manifest
+    )
 
     preserved_element = reload_context.get_element(element_id)
 
@@ -81,24 +91,211 @@ def save_element(
     if preserved_element.fastenInfo != None:
         fasten_info = ParseFastenInfo().get_fasten_info(api, element_path, element_type)
 
-    document_ref.elements.element(element_id).set(
-        Element(
-            name=element_name,
-            vendors=parse_vendors(element_name, configuration),
-            elementType=element_type,
-            documentId=version_path.document_id,
-            instanceId=version_path.instance_id,
-            microversionId=microversion_id,
-            configurationId=configuration_id,
-            isVisible=preserved_element.isVisible,
-            isOpenComposite=preserved_element.isOpenComposite,
-            fastenInfo=fasten_info,
-            thumbnailUrls=thumbnail_urls,
-        ),
+    element = Element(
+        name=element_name,
+        vendors=[],
+        elementType=element_type,
+        documentId=version_path.document_id,
+        instanceId=version_path.instance_id,
+        microversionId=microversion_id,
+        configurationId=configuration_id,
+        isVisible=preserved_element.isVisible,
+        isOpenComposite=preserved_element.isOpenComposite,
+        fastenInfo=fasten_info,
+        thumbnailUrls=thumbnail_urls,
     )
+    apply_derived_fields(element, element_path, version_info, configuration)
+    document_ref.elements.element(element_id).set(element)
     return element_id
 
 
+def derive_fields(
+    element: Element,
+    element_path: ElementPath,
+    version_info: VersionInfo,
+    configuration: ConfigurationParameters | None,
+) -> dict:
+    """Returns the fields of an element which are computed from its other saved data.
+
+    Derived fields are recomputed by /rederive without calling Onshape, so new derived fields should be added here.
+    Derivations must not depend on other derived fields.
+    """
+    return {
+        "vendors": parse_vendors(element.name, configuration),
+        "insertPlan": build_insert_plan(
+            element, element_path, version_info, configuration
+        ),
+    }
+
+
+def apply_derived_fields(
+    element: Element,
+    element_path: ElementPath,
+    version_info: VersionInfo,
+    configuration: ConfigurationParameters | None,
+) -> dict:
+    """Sets the derived fields of an element.
+
+    Returns:
+        The derived fields which changed.
+    """
+    changed = {}
+    derived = derive_fields(element, element_path, version_info, configuration)
+    for key, value in derived.items():
+        if getattr(element, key) != value:
+            setattr(element, key, value)
+            changed[key] = value
+    return changed
+
+
+def save_configuration(
+    api: Api,
+    document_ref: DocumentRef,
+    element_path: ElementPath,
+    preserve_previews: bool = False,
+) -> ConfigurationParameters | None:
+    """Loads the configuration of an element into the database.
+
+    Parameters:
+        preserve_previews: Whether to keep the rendered previews of the existing configuration.
+            Only valid when the element is reloaded at the same version. An unchanged configuration isn't rewritten.
+
+    Returns:
+        The configuration, or None if the element isn't configured.
+    """
+    onshape_configuration = get_configuration(api, element_path)
+    if len(onshape_configuration["configurationParameters"]) == 0:
+        return None
+
+    configuration = parse_onshape_configuration(onshape_configuration)
+    configuration.instanceId = element_path.instance_id
+    # Re-use element db id since configurations can't be shared
+    configuration_ref = document_ref.configurations.configuration(
+        element_path.element_id
+    )
+    if preserve_previews:
+        existing = configuration_ref.maybe_get()
+        if existing != None:
+            configuration.previews = existing.previews
+            if configuration == existing:
+                return configuration
+    configuration_ref.set(configuration)
+    return configuration
+
+
+class ReloadScope(StrEnum):
+    """The stages of a reload to run.
+
+    Scopes other than ALL reload documents at the version already saved in the database.
+    """
+
+    ALL = "all"
+    # Configurations, and the vendors and insert plans derived from them
+    CONFIGURATIONS = "configurations"
+    # Thumbnails of documents and elements
+    THUMBNAILS = "thumbnails"
+    # Fasten info of elements which support fasten
+    FASTEN = "fasten"
+    # Names of documents and elements, and the vendors derived from them
+    METADATA = "metadata"
+
+
+def reload_element_scope(
+    api: Api,
+    document_ref: DocumentRef,
+    version_path: InstancePath,
+    version_info: VersionInfo,
+    element_id: str,
+    scope: ReloadScope,
+    name: str | None = None,
+) -> bool:
+    """Reloads a single stage of a saved element.
+
+    Parameters:
+        name: The name of the element's tab. Required for the METADATA scope.
+
+    Returns:
+        True if the element was updated.
+    """
+    element_ref = document_ref.elements.element(element_id)
+    element = element_ref.get()
+    original = element.model_copy(deep=True)
+    element_path = ElementPath.from_path(version_path, element_id)
+
+    configuration = None
+    if scope == ReloadScope.CONFIGURATIONS:
+        # The version is unchanged, so previews rendered from it are still accurate
+        configuration = save_configuration(
+            api, document_ref, element_path, preserve_previews=True
+        )
+        if configuration == None and element.configurationId != None:
+            document_ref.configurations.configuration(element_id).delete()
+        element.configurationId = element_id if configuration != None else None
+    elif element.configurationId != None:
+        configuration = document_ref.configurations.configuration(element_id).get()
+
+    if scope == ReloadScope.FASTEN:
+        if element.fastenInfo == None:
+            return False
+        element.fastenInfo = ParseFastenInfo().get_fasten_info(
+            api, element_path, element.elementType
+        )
+    elif scope == ReloadScope.METADATA and name != None:
+        element.name = name
+
+    apply_derived_fields(element, element_path, version_info, configuration)
+    if element == original:
+        return False
+
+    element_ref.set(element)
+    return True
+
+
+async def reload_document_scope(
+    api: Api, document_ref: DocumentRef, scope: ReloadScope
+) -> int:
+    """Reloads a single stage of every element in a saved document.
+
+    Returns:
+        The number of elements updated.
+    """
+    document = document_ref.get()
+    version_path = InstancePath(
+        document_ref.id, document.instanceId, InstanceType.VERSION
+    )
+    element_ids = document_ref.elements.keys()
+
+    names: dict[str, str] = {}
+    if scope == ReloadScope.METADATA:
+        onshape_document, contents = await asyncio.gather(
+            asyncio.to_thread(get_document, api, version_path),
+            asyncio.to_thread(documents.get_contents, api, version_path),
+        )
+        names = {
+            onshape_element["id"]: onshape_element["name"]
+            for onshape_element in get_valid_elements(contents)
+        }
+        if onshape_document["name"] != document.name:
+            document_ref.update({"name": onshape_document["name"]})
+
+    results = await asyncio.gather(
+        *(
+            asyncio.to_thread(
+                reload_element_scope,
+                api,
+                document_ref,
+                version_path,
+                document.versionInfo,
+                element_id,
+                scope,
+                names.get(element_id),
+            )
+            for element_id in element_ids
+        )
+    )
+    return sum(results)
+
+
 class EntryType(StrEnum):
     GROUP = "BTElementGroup-1458"
     ELEMENT = "BTDocumentElementReference-2484"
@@ -160,12 +357,14 @@ async def save_document(
     This shouldn't generally matter since documentOrder is generally the source of truth in the library.
     """
     document_id = version_path.document_id
+    db = connect.get_db()
 
     onshape_document = documents.get_document(api, version_path)
     contents = documents.get_contents(api, version_path)
 
+    thumbnail_manifest = db.get_thumbnail_manifest(document_id).get()
     thumbnail_urls = ReloadDocumentThumbnail().upload_thumbnails(
-        api, onshape_document, contents, version_path
+        api, db, onshape_document, contents, version_path, thumbnail_manifest
     )
 
     valid_elements = list(get_valid_elements(contents))
@@ -180,16 +379,31 @@ async def save_document(
         asyncio.to_thread(
             save_element,
             api,
+            db,
             document_ref,
             version_path,
+            version_info,
             onshape_element,
             reload_context,
+            thumbnail_manifest,
         )
         for onshape_element in elements_to_reload
     ]
 
     await asyncio.gather(*save_element_operations)
 
+    reloaded_element_ids = {
+        onshape_element["id"] for onshape_element in elements_to_reload
+    }
+    update_stale_insert_plans(
+        db,
+        document_ref,
+        valid_element_ids - reloaded_element_ids,
+        version_path,
+        version_info,
+        reload_context,
+    )
+
     # Collect list of element ids in same order as the Onshape Tab manager
     ordered_ids = [
         element_id
@@ -203,6 +417,13 @@ async def save_document(
         document_ref.elements.element(element_id).delete()
         document_ref.configurations.configuration(element_id).delete()
 
+    # Re-read the manifest since saving elements may have uploaded new thumbnails
+    thumbnail_atlas = await asyncio.to_thread(
+        upload_thumbnail_atlas,
+        ordered_ids,
+        db.get_thumbnail_manifest(document_id).get(),
+    )
+
     # Document order is externally managed, so just set the document directly
     preserved_document = reload_context.get_document(document_id)
     document_ref.set(
@@ -213,23 +434,92 @@ async def save_document(
             elementOrder=ordered_ids,
             sortAlphabetically=preserved_document.sortAlphabetically,
             versionInfo=version_info,
+            thumbnailAtlas=thumbnail_atlas,
+            ownerId=onshape_document["owner"]["id"],
+            ownerType=onshape_document["owner"]["type"],
         ),
     )
     return len(elements_to_reload)
 
 
-def build_reload_context(library_ref: LibraryRef, reload_all: bool) -> ReloadContext:
-    reload_context = ReloadContext(reload_all=reload_all)
-    for document_ref in library_ref.documents.list():
-        reload_context.save_document(document_ref.id, document_ref.get_raw())
+def update_stale_insert_plans(
+    db: Database,
+    document_ref: DocumentRef,
+    element_ids: set[str],
+    version_path: InstancePath,
+    version_info: VersionInfo,
+    reload_context: ReloadContext,
+) -> int:
+    """Rebuilds the insert plans of elements which weren't reloaded using their saved data.
 
-        for element in document_ref.elements.list():
-            element_id = element.id
-            reload_context.save_element(element_id, element.get_raw())
+    Unchanged elements aren't reloaded when a document gets a new version, but their plans must be rebuilt against the
+    new version since plans for any other version are ignored when inserting.
 
+    Returns:
+        The number of elements updated.
+    """
+    stale: dict[str, Element] = {}
+    for element_id in element_ids:
+        try:
+            element = Element.model_validate(reload_context.get_raw_element(element_id))
+        except ValidationError:
+            continue
+        if (
+            element.insertPlan == None
+            or element.insertPlan.instanceId != version_path.instance_id
+        ):
+            stale[element_id] = element
+
+    configurations = {}
+    if any(element.configurationId != None for element in stale.values()):
+        configurations = {
+            configuration_ref.id: configuration_ref.get()
+            for configuration_ref in document_ref.configurations.list()
+        }
+
+    def get_updates() -> Iterator[tuple[BaseDocument[Element], dict]]:
+        for element_id, element in stale.items():
+            configuration = None
+            if element.configurationId != None:
+                configuration = configurations.get(element.configurationId)
+
+            plan = build_insert_plan(
+                element,
+                ElementPath.from_path(version_path, element_id),
+                version_info,
+                configuration,
+            )
+            yield document_ref.elements.element(element_id), {
+                "insertPlan": plan.model_dump()
+            }
+
+    return update_batched(db, get_updates())
+
+
+async def build_reload_context(
+    library_ref: LibraryRef, reload_all: bool
+) -> ReloadContext:
+    """Reads the saved data of every document in a library, reading documents concurrently."""
+    reload_context = ReloadContext(reload_all=reload_all)
+    await asyncio.gather(
+        *(
+            asyncio.to_thread(save_to_reload_context, reload_context, document_ref)
+            for document_ref in library_ref.documents.list()
+        )
+    )
     return reload_context
 
 
+def save_to_reload_context(
+    reload_context: ReloadContext, document_ref: DocumentRef
+) -> None:
+    reload_context.save_document(document_ref.id, document_ref.get_raw())
+
+    for element in document_ref.elements.list():
+        element_id = element.id
+        reload_context.save_element(element_id, element.get_raw())
+
+
 async def reload_document(
     api: Api,
     documents_ref: DocumentsRef,
@@ -260,20 +550,47 @@ async def reload_document(
 @router.post("/reload-documents" + connect.library_route())
 @require_access_level()
 async def reload_documents(**kwargs):
-    """Saves the contents of the latest versions of all documents managed by FRC Design Lib into the database."""
+    """Saves the contents of the latest versions of all documents managed by FRC Design Lib into the database.
+
+    Only documents which have been modified in Onshape since the last reload are checked for new versions.
+
+    Query parameters:
+        reloadAll: Whether to reload all documents and elements, including those which are already up to date.
+        scope: A ReloadScope. Scopes other than all only run one stage of the reload against the saved version of each document.
+    """
     api = connect.get_api()
     library_ref = connect.get_library_ref()
+    library = connect.get_route_library()
+
+    scope = get_reload_scope()
+    if scope != ReloadScope.ALL:
+        count = await reload_library_scope(api, library_ref, scope)
+        if scope in (ReloadScope.CONFIGURATIONS, ReloadScope.METADATA):
+            update_search_index(library, library_ref)
+        if scope == ReloadScope.CONFIGURATIONS:
+            # Render previews of new parameters and defaults
+            queue_previews(connect.get_db(), library, library_ref.documents.keys())
+        return {"savedElements": count}
 
     reload_all = connect.get_query_bool("reloadAll", False)
 
-    reload_context = build_reload_context(library_ref, reload_all)
-
-    count = 0
+    reload_context = await build_reload_context(library_ref, reload_all)
 
     documents_ref = library_ref.documents
+    document_ids = documents_ref.keys()
+    if reload_all:
+        pending = library_ref.get().changeFeed.pendingDocuments
+    else:
+        pending = poll_changes(api, library_ref, document_ids, reload_context)
+        document_ids = [
+            document_id
+            for document_id in document_ids
+            if document_id in pending
+            or reload_context.is_document_outdated(document_id)
+        ]
 
     operations = []
-    for document_id in documents_ref.keys():
+    for document_id in document_ids:
         document_path = DocumentPath(document_id)
         operations.append(
             reload_document(api, documents_ref, document_path, reload_context)
@@ -281,12 +598,114 @@ async def reload_documents(**kwargs):
 
     results = await asyncio.gather(*operations)
     count = sum(results)
+    clear_pending(
+        connect.get_db(),
+        library_ref,
+        {
+            document_id: pending[document_id]
+            for document_id in document_ids
+            if document_id in pending
+        },
+    )
 
     clean_favorites(library_ref)
+    update_search_index(library, library_ref)
+    queue_previews(
+        connect.get_db(),
+        library,
+        [
+            document_id
+            for document_id, document_count in zip(document_ids, results)
+            if document_count > 0
+        ],
+    )
+
+    return {"savedElements": count}
+
+
+def rederive_library(db: Database, library_ref: LibraryRef) -> int:
+    """Recomputes the derived fields of every element in a library from the database.
+
+    Returns:
+        The number of elements updated.
+    """
 
+    def get_updates() -> Iterator[tuple[BaseDocument[Element], dict]]:
+        for document_ref in library_ref.documents.list():
+            document = document_ref.get()
+            version_path = InstancePath(
+                document_ref.id, document.instanceId, InstanceType.VERSION
+            )
+            configurations = {
+                configuration_ref.id: configuration_ref.get()
+                for configuration_ref in document_ref.configurations.list()
+            }
+
+            for element_ref in document_ref.elements.list():
+                element = element_ref.get()
+                configuration = None
+                if element.configurationId != None:
+                    configuration = configurations.get(element.configurationId)
+
+                changed = apply_derived_fields(
+                    element,
+                    ElementPath.from_path(version_path, element_ref.id),
+                    document.versionInfo,
+                    configuration,
+                )
+                if len(changed) > 0:
+                    yield element_ref, element.model_dump(include=set(changed))
+
+    return update_batched(db, get_updates())
+
+
+@router.post("/rederive" + connect.library_route())
+@require_access_level()
+def rederive(**kwargs):
+    """Recomputes fields derived from saved data, e.g., vendors, without calling Onshape."""
+    library_ref = connect.get_library_ref()
+    count = rederive_library(connect.get_db(), library_ref)
+    if count > 0:
+        update_search_index(connect.get_route_library(), library_ref)
     return {"savedElements": count}
 
 
+def get_reload_scope() -> ReloadScope:
+    scope = connect.get_optional_query_param("scope", ReloadScope.ALL)
+    try:
+        return ReloadScope(scope)
+    except ValueError:
+        raise ClientException(f"Invalid reload scope {scope}.")
+
+
+async def reload_library_scope(
+    api: Api, library_ref: LibraryRef, scope: ReloadScope
+) -> int:
+    """Reloads a single stage of every document in a library.
+
+    Returns:
+        The number of documents and elements updated.
+    """
+    if scope == ReloadScope.THUMBNAILS:
+        runner = ThumbnailJobRunner(
+            api, connect.get_db(), library_ref, job_ref=None, force=True
+        )
+        await asyncio.to_thread(runner.run)
+        if len(runner.failed) > 0:
+            raise HandledException(
+                f"Failed to refresh the thumbnails of {len(runner.failed)} documents and elements."
+            )
+        return runner.updated
+
+    results = await asyncio.gather(
+        *(
+            reload_document_scope(api, document_ref, scope)
+            for document_ref in library_ref.documents.list()
+        )
+    )
+    return sum(results)
+
+
 def clean_favorites(library_ref: LibraryRef) -> None:
     """Removes any favorites in the library that are no longer valid."""
 
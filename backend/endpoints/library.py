@@ -1,13 +1,21 @@
+from datetime import datetime, timezone
 import flask
 from pydantic import BaseModel
 from google.cloud import firestore
 
 from backend.common import connect
+from backend.common.analytics import compute_popularity, top_n
 from backend.common.app_access import require_access_level
-from backend.common.database import DocumentsRef, LibraryRef
-from backend.common.models import Document, Favorite
-from backend.common.models import Document, Favorite, Vendor
+from backend.common.database import DocumentsRef, LibraryRef, replace_fields
+from backend.common.models import Document, Favorite, ThumbnailAtlas, Vendor
 from backend.common.cache import cacheable_route
+from backend.common.backend_exceptions import ClientException
+from backend.common.search_index import (
+    SEARCH_INDEX_CACHE,
+    SearchIndex,
+    get_search_documents,
+    update_search_index,
+)
 from onshape_api.endpoints.documents import ElementType
 from onshape_api.endpoints.thumbnails import ThumbnailSize
 from onshape_api.paths.instance_type import InstanceType
@@ -15,6 +23,10 @@ from onshape_api.paths.instance_type import InstanceType
 
 router = flask.Blueprint("library", __name__)
 
+# The number of most popular elements saved with each library version
+TOP_ELEMENTS = 50
+MAX_SEARCH_HITS = 50
+
 
 class InstancePathOut(BaseModel):
     documentId: str
@@ -53,6 +65,7 @@ class DocumentOut(BaseModel):
     sortAlphabetically: bool
     thumbnailUrls: dict[ThumbnailSize, str]
     elementOrder: list[str]
+    thumbnailAtlas: ThumbnailAtlas | None = None
 
 
 class LibraryOut(BaseModel):
@@ -61,6 +74,10 @@ class LibraryOut(BaseModel):
     documentOrder: list[str]
     documents: dict[str, DocumentOut]
     elements: dict[str, ElementOut]
+    # Maps element ids to popularity scores; elements which have never been inserted are omitted
+    popularity: dict[str, float]
+    # The most popular visible elements, most popular first
+    topElements: list[str]
 
 
 @cacheable_route(router, connect.library_route())
@@ -70,11 +87,22 @@ def get_library(**kwargs):
 
 
 def build_library_out(library_ref: LibraryRef) -> LibraryOut:
+    library = library_ref.get()
     documents, elements = build_documents_out(library_ref.documents)
     return LibraryOut(
-        documentOrder=library_ref.documents.keys(),
+        documentOrder=library.documentOrder,
         documents=documents,
         elements=elements,
+        popularity={
+            element_id: score
+            for element_id, score in library.popularity.items()
+            if element_id in elements
+        },
+        topElements=[
+            element_id
+            for element_id in library.topElements
+            if element_id in elements and elements[element_id].isVisible
+        ],
     )
 
 
@@ -98,6 +126,7 @@ def build_documents_out(
             sortAlphabetically=document.sortAlphabetically,
             thumbnailUrls=document.thumbnailUrls,
             elementOrder=document_ref.elements.keys(),
+            thumbnailAtlas=document.thumbnailAtlas,
         )
 
         for element_ref in document_ref.elements.list():
@@ -129,7 +158,46 @@ def build_documents_out(
 def get_search_db(**kwargs):
     library_ref = connect.get_library_ref()
     library = library_ref.get()
-    return {"searchDb": library.searchDb}
+    return {"searchDbUrl": library.searchDbUrl}
+
+
+@cacheable_route(router, "/search" + connect.library_route())
+def search(**kwargs):
+    """Searches the elements of a library.
+
+    Query parameters:
+        query: The search query.
+        documentId: If set, only returns elements in the given document.
+        vendors: A comma separated list of vendors. If set, only returns elements with at least one of the vendors.
+        fuzzy: Whether to match terms with small typos. Defaults to true.
+        limit: The maximum number of hits to return. Defaults to 50.
+    """
+    library = connect.get_route_library()
+    library_ref = connect.get_library_ref()
+    query = connect.get_query_param("query")
+    document_id = connect.get_optional_query_param("documentId")
+    vendors = connect.get_optional_query_param("vendors")
+    fuzzy = connect.get_query_bool("fuzzy", True)
+    limit = connect.get_query_int("limit", 50)
+    if limit < 1 or limit > MAX_SEARCH_HITS:
+        raise ClientException(f"limit must be between 1 and {MAX_SEARCH_HITS}.")
+
+    if vendors != None:
+        try:
+            vendors = [Vendor(vendor) for vendor in vendors.split(",") if vendor != ""]
+        except ValueError:
+            raise ClientException(f"Invalid vendors: {vendors}.")
+
+    if "/admin" in flask.request.path:
+        # Admins should see their changes immediately
+        search_index = SearchIndex(get_search_documents(library_ref))
+    else:
+        search_index = SEARCH_INDEX_CACHE.get(
+            library, library_ref, library_ref.get().cacheVersion
+        )
+    return search_index.search(
+        query, document_id=document_id, vendors=vendors, fuzzy=fuzzy, limit=limit
+    ).model_dump_json(exclude_none=True)
 
 
 class FavoriteOut(BaseModel):
@@ -224,11 +292,27 @@ def update_default_configuration(**kwargs):
 def push_library_version(**kwargs):
     """
     Invalidates all CDN caching by pushing a new version of a library.
+
+    Also rebuilds the search index, so admin changes such as hiding elements are searchable.
     """
+    db = connect.get_db()
+    library = connect.get_route_library()
     library_ref = connect.get_library_ref()
-    new_search_db = connect.get_body_arg("searchDb")
 
-    library_ref.update(
-        {"searchDb": new_search_db, "cacheVersion": firestore.Increment(1)}
+    update_search_index(library, library_ref)
+
+    popularity = compute_popularity(db, library, datetime.now(timezone.utc).date())
+    top_elements = [element_id for element_id, _ in top_n(popularity, TOP_ELEMENTS)]
+
+    # Replace the whole popularity map rather than merging with old scores
+    replace_fields(
+        library_ref,
+        {
+            "cacheVersion": firestore.Increment(1),
+            # Indexes used to be stored inline
+            "searchDb": firestore.DELETE_FIELD,
+            "popularity": popularity,
+            "topElements": top_elements,
+        },
     )
     return {"success": True}
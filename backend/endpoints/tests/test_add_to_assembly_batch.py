@@ -0,0 +1,64 @@
+import pytest
+
+from backend.common.models import Element, FastenInfo
+from backend.endpoints import add_part
+from backend.endpoints.add_part import add_fasten_mates
+from onshape_api.endpoints.documents import ElementType
+from onshape_api.exceptions import OnshapeException
+from onshape_api.paths.doc_path import ElementPath
+
+TARGET_PATH = ElementPath("0" * 24, "1" * 24, "2" * 24)
+
+
+def make_element(name: str) -> Element:
+    return Element(
+        name=name,
+        vendors=[],
+        elementType=ElementType.PART_STUDIO,
+        documentId="3" * 24,
+        instanceId="4" * 24,
+        microversionId="5" * 24,
+        fastenInfo=FastenInfo(mateConnectorId="mate-connector-id"),
+    )
+
+
+# The response of add_instances_to_assembly after inserting three instances
+INSERT_RESULT = {
+    "insertInstanceResponses": [
+        {"occurrences": [{"path": [f"instance-{index}"]}]} for index in range(3)
+    ]
+}
+
+
+@pytest.fixture
+def added_features(monkeypatch):
+    added_features = []
+
+    def add_feature(api, target_path, feature: dict) -> dict:
+        name = feature["name"]
+        if name == "Bad":
+            raise OnshapeException("Invalid mate connector")
+        added_features.append(name)
+        return {"feature": {"featureId": f"feature-{len(added_features)}"}}
+
+    monkeypatch.setattr(add_part.assemblies, "add_feature", add_feature)
+    return added_features
+
+
+def test_add_fasten_mates(added_features):
+    elements = [make_element(name) for name in ("First", "Second", "Third")]
+    feature_ids, failed = add_fasten_mates(None, TARGET_PATH, elements, INSERT_RESULT)  # type: ignore
+
+    assert added_features == ["First", "Second", "Third"]
+    assert feature_ids == ["feature-1", "feature-2", "feature-3"]
+    assert failed == []
+
+
+def test_add_fasten_mates_reports_failures(added_features):
+    elements = [make_element(name) for name in ("First", "Bad", "Third")]
+    feature_ids, failed = add_fasten_mates(None, TARGET_PATH, elements, INSERT_RESULT)  # type: ignore
+
+    # Later elements are still fastened
+    assert added_features == ["First", "Third"]
+    assert feature_ids == ["feature-1", None, "feature-2"]
+    assert failed == [1]
@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from backend.common.models import Element, Vendor, VersionInfo
+from backend.endpoints.documents import apply_derived_fields
+from onshape_api.endpoints.documents import ElementType
+from onshape_api.paths.doc_path import ElementPath
+from onshape_api.paths.instance_type import InstanceType
+
+ELEMENT_PATH = ElementPath(
+    "0" * 24, "1" * 24, "2" * 24, instance_type=InstanceType.VERSION
+)
+VERSION_INFO = VersionInfo(name="V1", createdAt=datetime(2025, 1, 1))
+
+
+def test_apply_derived_fields():
+    element = Element(
+        name="Shaft Collar (WCP)",
+        vendors=[],
+        elementType=ElementType.PART_STUDIO,
+        documentId=ELEMENT_PATH.document_id,
+        instanceId=ELEMENT_PATH.instance_id,
+        microversionId="3" * 24,
+    )
+
+    changed = apply_derived_fields(element, ELEMENT_PATH, VERSION_INFO, None)
+    assert set(changed) == {"vendors", "insertPlan"}
+    assert element.vendors == [Vendor.WCP]
+
+    # Derived fields which are already up to date aren't written again
+    assert apply_derived_fields(element, ELEMENT_PATH, VERSION_INFO, None) == {}
+
+    element.name = "Shaft Collar"
+    assert apply_derived_fields(element, ELEMENT_PATH, VERSION_INFO, None) == {
+        "vendors": []
+    }
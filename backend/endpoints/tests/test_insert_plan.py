@@ -0,0 +1,173 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+from backend.common.models import (
+    ConfigurationParameters,
+    Element,
+    EnumConfigurationParameter,
+    EnumOption,
+    FastenInfo,
+    InsertPlan,
+    MateLocation,
+    QuantityConfigurationParameter,
+    QuantityType,
+    Unit,
+    VersionInfo,
+)
+from backend.common.reload_context import ReloadContext
+from backend.endpoints.add_part import (
+    DerivedFeature,
+    build_fasten_mate,
+    build_insert_plan,
+)
+from backend.endpoints import documents
+from backend.endpoints.documents import update_stale_insert_plans
+from onshape_api.endpoints.documents import ElementType
+from onshape_api.paths.doc_path import ElementPath, InstancePath
+from onshape_api.paths.instance_type import InstanceType
+
+ELEMENT_PATH = ElementPath(
+    "0" * 24, "1" * 24, "2" * 24, instance_type=InstanceType.VERSION
+)
+MICROVERSION_ID = "3" * 24
+
+PARAMETERS = ConfigurationParameters(
+    parameters=[
+        EnumConfigurationParameter(
+            name="Size",
+            id="size",
+            default="small",
+            options=[
+                EnumOption(id="small", name="Small"),
+                EnumOption(id="large", name="Large"),
+            ],
+        ),
+        QuantityConfigurationParameter(
+            name="Length",
+            id="length",
+            default="1 in",
+            quantityType=QuantityType.LENGTH,
+            unit=Unit.INCH,
+            defaultValue=1,
+            min=0,
+            max=10,
+        ),
+    ]
+)
+
+
+def make_element(element_type: ElementType, fasten_info: FastenInfo | None) -> Element:
+    return Element(
+        name="Part",
+        vendors=[],
+        elementType=element_type,
+        documentId=ELEMENT_PATH.document_id,
+        instanceId=ELEMENT_PATH.instance_id,
+        microversionId=MICROVERSION_ID,
+        fastenInfo=fasten_info,
+    )
+
+
+def make_plan(element: Element):
+    plan = build_insert_plan(
+        element,
+        ELEMENT_PATH,
+        VersionInfo(name="V1", createdAt=datetime(2025, 1, 1)),
+        PARAMETERS,
+    )
+    # Plans must survive a round trip through the database
+    return plan.model_validate(plan.model_dump())
+
+
+def test_derived_feature_from_plan():
+    element = make_element(ElementType.PART_STUDIO, None)
+    plan = make_plan(element)
+    configuration = {"size": "large"}
+
+    expected = DerivedFeature.from_parameters(
+        "Part",
+        ELEMENT_PATH,
+        MICROVERSION_ID,
+        configuration=configuration,
+        parameters=PARAMETERS,
+    ).get_feature()
+    result = DerivedFeature.from_plan(
+        "Part", plan, configuration=configuration
+    ).get_feature()
+
+    assert result == expected
+    assert plan.defaultConfiguration == {"size": "small", "length": "1 in"}
+
+
+def test_fasten_mate_from_plan():
+    element = make_element(
+        ElementType.ASSEMBLY,
+        FastenInfo(
+            mateLocation=MateLocation.PART,
+            mateConnectorId="mate-connector-id",
+            path=["part-instance-id"],
+        ),
+    )
+    expected = build_fasten_mate(element, ["instance-id"])
+
+    element.insertPlan = make_plan(element)
+    result = build_fasten_mate(element, ["instance-id"])
+
+    assert result == expected
+    assert element.insertPlan.fastenQuery != None
+    assert element.insertPlan.fastenQuery["path"] == ["part-instance-id"]
+
+
+def test_update_stale_insert_plans(monkeypatch):
+    new_version_path = InstancePath(
+        ELEMENT_PATH.document_id, "4" * 24, InstanceType.VERSION
+    )
+    version_info = VersionInfo(name="V2", createdAt=datetime(2025, 2, 1))
+
+    reload_context = ReloadContext()
+    # Unchanged since the previous version, so its plan is for the old version
+    stale = make_element(ElementType.PART_STUDIO, None)
+    stale.configurationId = "stale"
+    stale.insertPlan = make_plan(stale)
+    reload_context.save_element("stale", stale.model_dump())
+    # Saved before insert plans existed
+    reload_context.save_element(
+        "missing", make_element(ElementType.PART_STUDIO, None).model_dump()
+    )
+    current = make_element(ElementType.PART_STUDIO, None)
+    current.insertPlan = build_insert_plan(
+        current,
+        ElementPath.from_path(new_version_path, "current"),
+        version_info,
+        None,
+    )
+    reload_context.save_element("current", current.model_dump())
+
+    document_ref = SimpleNamespace(
+        elements=SimpleNamespace(element=lambda element_id: element_id),
+        configurations=SimpleNamespace(
+            list=lambda: [SimpleNamespace(id="stale", get=lambda: PARAMETERS)]
+        ),
+    )
+    updates = {}
+
+    def update_batched(db, element_updates) -> int:
+        updates.update(element_updates)
+        return len(updates)
+
+    monkeypatch.setattr(documents, "update_batched", update_batched)
+    count = update_stale_insert_plans(
+        None,  # type: ignore
+        document_ref,  # type: ignore
+        {"stale", "missing", "current"},
+        new_version_path,
+        version_info,
+        reload_context,
+    )
+
+    assert count == 2
+    assert updates.keys() == {"stale", "missing"}
+    plan = InsertPlan.model_validate(updates["stale"]["insertPlan"])
+    assert plan.instanceId == new_version_path.instance_id
+    assert plan.versionInfo == version_info
+    assert plan.defaultConfiguration == {"size": "small", "length": "1 in"}
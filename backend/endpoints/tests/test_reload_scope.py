@@ -0,0 +1,198 @@
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Generic, TypeVar
+
+from pydantic import BaseModel
+import pytest
+
+from backend.common.models import (
+    ConfigurationParameters,
+    Element,
+    EnumConfigurationParameter,
+    EnumOption,
+    FastenInfo,
+    Vendor,
+    VersionInfo,
+)
+from backend.endpoints import documents
+from backend.endpoints.documents import (
+    ReloadScope,
+    apply_derived_fields,
+    reload_element_scope,
+)
+from onshape_api.endpoints.documents import ElementType
+from onshape_api.paths.doc_path import ElementPath, InstancePath
+from onshape_api.paths.instance_type import InstanceType
+
+VERSION_PATH = InstancePath("0" * 24, "1" * 24, InstanceType.VERSION)
+VERSION_INFO = VersionInfo(name="V1", createdAt=datetime(2025, 1, 1))
+
+
+def make_parameters(*option_ids: str) -> ConfigurationParameters:
+    return ConfigurationParameters(
+        parameters=[
+            EnumConfigurationParameter(
+                name="Size",
+                id="size",
+                default=option_ids[0],
+                options=[EnumOption(id=id, name=id.title()) for id in option_ids],
+            )
+        ],
+        instanceId=VERSION_PATH.instance_id,
+    )
+
+
+M = TypeVar("M", bound=BaseModel)
+
+
+class FakeRef(Generic[M]):
+    """A document which records writes."""
+
+    def __init__(self, value: M | None) -> None:
+        self.value = value
+        self.writes = 0
+
+    def get(self) -> M:
+        assert self.value != None
+        return self.value.model_copy(deep=True)
+
+    def maybe_get(self) -> M | None:
+        return self.value.model_copy(deep=True) if self.value != None else None
+
+    def set(self, value: M) -> None:
+        self.value = value
+        self.writes += 1
+
+    def delete(self) -> None:
+        self.value = None
+        self.writes += 1
+
+
+class FakeDocument:
+    def __init__(
+        self,
+        element: Element,
+        parameters: ConfigurationParameters | None = None,
+    ) -> None:
+        element_path = ElementPath.from_path(VERSION_PATH, "element")
+        if parameters != None:
+            element.configurationId = "element"
+        apply_derived_fields(element, element_path, VERSION_INFO, parameters)
+        self.element_ref = FakeRef(element)
+        self.configuration_ref = FakeRef(parameters)
+        self.ref = SimpleNamespace(
+            elements=SimpleNamespace(element=lambda id: self.element_ref),
+            configurations=SimpleNamespace(
+                configuration=lambda id: self.configuration_ref
+            ),
+        )
+
+    def reload(self, scope: ReloadScope, name: str | None = None) -> bool:
+        return reload_element_scope(
+            None,  # type: ignore
+            self.ref,  # type: ignore
+            VERSION_PATH,
+            VERSION_INFO,
+            "element",
+            scope,
+            name,
+        )
+
+
+def make_element(
+    name: str = "Shaft Collar", fasten_info: FastenInfo | None = None
+) -> Element:
+    return Element(
+        name=name,
+        vendors=[],
+        elementType=ElementType.PART_STUDIO,
+        documentId=VERSION_PATH.document_id,
+        instanceId=VERSION_PATH.instance_id,
+        microversionId="2" * 24,
+        fastenInfo=fasten_info,
+    )
+
+
+@pytest.fixture
+def onshape_parameters(monkeypatch):
+    """Sets the configuration returned by Onshape, or None for an unconfigured element."""
+    onshape = SimpleNamespace(parameters=None)
+
+    def get_configuration(api, element_path) -> dict:
+        if onshape.parameters == None:
+            return {"configurationParameters": []}
+        return {"configurationParameters": [{}]}
+
+    monkeypatch.setattr(documents, "get_configuration", get_configuration)
+    monkeypatch.setattr(
+        documents,
+        "parse_onshape_configuration",
+        lambda configuration: onshape.parameters.model_copy(deep=True),
+    )
+    return onshape
+
+
+def test_configurations_scope_skips_unchanged_elements(onshape_parameters):
+    document = FakeDocument(make_element())
+    assert not document.reload(ReloadScope.CONFIGURATIONS)
+    assert document.element_ref.writes == 0
+    assert document.configuration_ref.writes == 0
+
+    parameters = make_parameters("small", "large")
+    parameters.previews = {"size=small": "https://storage/preview"}
+    document = FakeDocument(make_element(), parameters)
+    onshape_parameters.parameters = make_parameters("small", "large")
+    assert not document.reload(ReloadScope.CONFIGURATIONS)
+    assert document.element_ref.writes == 0
+    assert document.configuration_ref.writes == 0
+
+
+def test_configurations_scope_updates_changed_configurations(onshape_parameters):
+    document = FakeDocument(make_element(), make_parameters("small", "large"))
+    # Onshape now has a new default, which changes the insert plan
+    onshape_parameters.parameters = make_parameters("large", "small")
+
+    assert document.reload(ReloadScope.CONFIGURATIONS)
+    assert document.element_ref.writes == 1
+    element = document.element_ref.get()
+    assert element.insertPlan != None
+    assert element.insertPlan.defaultConfiguration == {"size": "large"}
+
+    # An element which is no longer configured loses its configuration
+    onshape_parameters.parameters = None
+    assert document.reload(ReloadScope.CONFIGURATIONS)
+    assert document.configuration_ref.value == None
+    assert document.element_ref.get().configurationId == None
+
+
+def test_fasten_scope(monkeypatch):
+    fasten_info = FastenInfo(mateConnectorId="mate-connector-id")
+    monkeypatch.setattr(
+        documents.ParseFastenInfo,
+        "get_fasten_info",
+        lambda self, api, element_path, element_type: fasten_info,
+    )
+
+    # Elements which don't support fasten are skipped
+    document = FakeDocument(make_element())
+    assert not document.reload(ReloadScope.FASTEN)
+
+    document = FakeDocument(make_element(fasten_info=fasten_info))
+    assert not document.reload(ReloadScope.FASTEN)
+    assert document.element_ref.writes == 0
+
+    fasten_info = FastenInfo(mateConnectorId="new-mate-connector-id")
+    assert document.reload(ReloadScope.FASTEN)
+    assert document.element_ref.get().fastenInfo == fasten_info
+
+
+def test_metadata_scope():
+    document = FakeDocument(make_element())
+    assert not document.reload(ReloadScope.METADATA, "Shaft Collar")
+    assert document.element_ref.writes == 0
+
+    # Renames also update the vendors derived from the name
+    assert document.reload(ReloadScope.METADATA, "Shaft Collar (WCP)")
+    element = document.element_ref.get()
+    assert element.name == "Shaft Collar (WCP)"
+    assert element.vendors == [Vendor.WCP]
@@ -0,0 +1,165 @@
+import threading
+from types import SimpleNamespace
+
+from google.cloud import firestore
+import pytest
+
+from backend.common.models import JobStatus, ThumbnailManifest
+from backend.endpoints import thumbnails
+from backend.endpoints.thumbnails import ThumbnailJobRunner
+
+# Maps document ids to their element ids; the first element is each document's thumbnail tab
+DOCUMENTS = {
+    "document-a": ["a1", "a2"],
+    "document-b": ["b1", "b2", "b3"],
+}
+
+
+class FakeElementRef:
+    def __init__(self, document_id: str, element_id: str) -> None:
+        self.id = element_id
+        self.document_id = document_id
+
+    def get(self):
+        return SimpleNamespace(
+            documentId=self.document_id,
+            instanceId="version",
+            microversionId="microversion",
+            thumbnailUrls={},
+        )
+
+    def update(self, partial: dict) -> None:
+        pass
+
+
+class FakeDocumentRef:
+    def __init__(self, document_id: str, element_ids: list[str]) -> None:
+        self.id = document_id
+        self.document = SimpleNamespace(
+            name=document_id,
+            instanceId="version",
+            elementOrder=element_ids,
+            thumbnailUrls={},
+            thumbnailAtlas=None,
+        )
+        self.elements = SimpleNamespace(
+            element=lambda element_id: FakeElementRef(document_id, element_id)
+        )
+
+    def get(self):
+        return self.document
+
+    def update(self, partial: dict) -> None:
+        pass
+
+
+class FakeJobRef:
+    def __init__(self) -> None:
+        self.updates: list[dict] = []
+        self._lock = threading.Lock()
+
+    def update(self, progress: dict) -> None:
+        with self._lock:
+            self.updates.append(progress)
+
+
+class FakeDatabase:
+    def get_thumbnail_manifest(self, document_id: str):
+        return SimpleNamespace(get=ThumbnailManifest)
+
+
+@pytest.fixture
+def uploads(monkeypatch):
+    uploads = []
+    lock = threading.Lock()
+
+    def upload_thumbnails(
+        api, db, element_path, microversion_id, manifest=None, force=False
+    ) -> dict:
+        if element_path.element_id == "b3":
+            raise Exception("Failed to fetch thumbnail")
+        with lock:
+            uploads.append((element_path.element_id, force))
+        return {"300x300": f"https://storage/{element_path.element_id}"}
+
+    def get_contents(api, path) -> dict:
+        elements = DOCUMENTS[path.document_id]
+        return {
+            "elements": [
+                {"id": id, "microversionId": "microversion"} for id in elements
+            ]
+        }
+
+    monkeypatch.setattr(thumbnails, "upload_thumbnails", upload_thumbnails)
+    monkeypatch.setattr(
+        thumbnails.documents,
+        "get_document",
+        lambda api, path: {"name": path.document_id, "documentThumbnailElementId": ""},
+    )
+    monkeypatch.setattr(thumbnails.documents, "get_contents", get_contents)
+    monkeypatch.setattr(thumbnails, "update_thumbnail_atlas", lambda db, ref: None)
+    return uploads
+
+
+def make_library_ref():
+    return SimpleNamespace(
+        documents=SimpleNamespace(
+            list=lambda: [
+                FakeDocumentRef(document_id, element_ids)
+                for document_id, element_ids in DOCUMENTS.items()
+            ]
+        )
+    )
+
+
+def run_job(force: bool) -> FakeJobRef:
+    library_ref = make_library_ref()
+    job_ref = FakeJobRef()
+    ThumbnailJobRunner(None, FakeDatabase(), library_ref, job_ref, force).run()  # type: ignore
+    return job_ref
+
+
+def test_thumbnail_job_reports_progress_per_document(uploads):
+    job_ref = run_job(force=False)
+
+    # The total is reported once up front and progress once per document
+    assert len(job_ref.updates) == 4
+    assert job_ref.updates[0] == {"total": 7}
+    assert job_ref.updates[-1]["status"] == JobStatus.DONE
+
+    progress = job_ref.updates[1:-1]
+    completed = sum(update["completed"].value for update in progress)
+    updated = sum(update["updated"].value for update in progress)
+    failed = [
+        target_id
+        for update in progress
+        if "failed" in update
+        for target_id in update["failed"].values
+    ]
+    assert completed == 7
+    assert updated == 6
+    assert failed == ["b3"]
+    assert isinstance(progress[0]["completed"], firestore.Increment)
+
+
+def test_thumbnail_job_forces_thumbnail_elements_once(uploads):
+    run_job(force=True)
+
+    forced = sorted(element_id for element_id, force in uploads if force)
+    assert forced == ["a1", "a2", "b1", "b2"]
+
+
+def test_thumbnail_job_without_job_raises(uploads):
+    def list_documents():
+        raise Exception("Deadline exceeded")
+
+    library_ref = SimpleNamespace(documents=SimpleNamespace(list=list_documents))
+    runner = ThumbnailJobRunner(None, FakeDatabase(), library_ref, None, False)  # type: ignore
+    with pytest.raises(Exception):
+        runner.run()
+
+
+def test_thumbnail_job_records_failures(uploads):
+    runner = ThumbnailJobRunner(None, FakeDatabase(), make_library_ref(), None, False)  # type: ignore
+    runner.run()
+    assert runner.failed == ["b3"]
@@ -0,0 +1,132 @@
+import json
+import threading
+from types import SimpleNamespace
+
+import flask
+import pytest
+
+from backend.common import env
+from backend.common.webhooks import (
+    DebouncedQueue,
+    WebhookEvent,
+    WebhookEventType,
+    get_signature,
+    verify_signature,
+)
+from backend.endpoints import webhooks
+
+SECRET = "webhook-secret"
+
+# Recorded notifications, with ids replaced
+VERSION_CREATED = {
+    "timestamp": "2025-03-04T18:22:41.283+0000",
+    "event": "onshape.model.lifecycle.createversion",
+    "workspaceId": "1" * 24,
+    "versionId": "2" * 24,
+    "documentId": "0" * 24,
+    "webhookId": "3" * 24,
+    "data": "V3",
+    "messageId": "4" * 24,
+}
+PING = {
+    "timestamp": "2025-03-04T18:20:02.117+0000",
+    "event": "webhook.ping",
+    "webhookId": "3" * 24,
+    "messageId": "5" * 24,
+}
+
+
+def test_verify_signature():
+    body = json.dumps(VERSION_CREATED).encode()
+    signature = get_signature(body, SECRET)
+    assert verify_signature(body, signature, SECRET)
+    assert not verify_signature(body, signature, "other-secret")
+    assert not verify_signature(body + b" ", signature, SECRET)
+    assert not verify_signature(body, None, SECRET)
+
+
+def test_parse_event():
+    event = WebhookEvent.model_validate_json(json.dumps(VERSION_CREATED))
+    assert event.event == WebhookEventType.VERSION_CREATED
+    assert event.documentId == "0" * 24
+
+    event = WebhookEvent.model_validate_json(json.dumps(PING))
+    assert event.event == WebhookEventType.PING
+    assert event.documentId == None
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(env, "WEBHOOK_SECRET", SECRET)
+    app = flask.Flask(__name__)
+    app.register_blueprint(webhooks.router)
+    app.register_error_handler(
+        webhooks.BaseAppException, lambda e: (e.to_dict(), e.status_code)
+    )
+    return app.test_client()
+
+
+def post(client, payload: dict, secret: str = SECRET):
+    body = json.dumps(payload).encode()
+    return client.post(
+        "/webhook/library/frc-design-lib",
+        data=body,
+        headers={webhooks.SIGNATURE_HEADER: get_signature(body, secret)},
+    )
+
+
+def test_webhook_rejects_invalid_signature(client):
+    assert post(client, VERSION_CREATED, "other-secret").status_code == 401
+
+
+def test_webhook_rejects_malformed_body(client):
+    body = b'{"documentId": "0"}'
+    response = client.post(
+        "/webhook/library/frc-design-lib",
+        data=body,
+        headers={webhooks.SIGNATURE_HEADER: get_signature(body, SECRET)},
+    )
+    assert response.status_code == 400
+
+
+def test_webhook_ignores_ping(client):
+    response = post(client, PING)
+    assert response.status_code == 200
+    assert response.get_json() == {"queued": False}
+
+
+def test_webhook_queues_new_versions(client, monkeypatch):
+    document_id = VERSION_CREATED["documentId"]
+    library_ref = SimpleNamespace(documents=SimpleNamespace(keys=lambda: [document_id]))
+    marked = []
+    enqueued = []
+    monkeypatch.setattr(webhooks.connect, "get_library_ref", lambda: library_ref)
+    monkeypatch.setattr(
+        webhooks, "mark_pending", lambda ref, ids: marked.append((ref, ids))
+    )
+    monkeypatch.setattr(
+        webhooks.RELOAD_QUEUE, "enqueue", lambda *key: enqueued.append(key)
+    )
+
+    response = post(client, VERSION_CREATED)
+    assert response.status_code == 200
+    assert response.get_json() == {"queued": True}
+    assert marked == [(library_ref, [document_id])]
+    assert enqueued == [("frc-design-lib", document_id)]
+
+
+def test_debounced_queue():
+    calls = []
+    done = threading.Event()
+
+    def callback(*key: str) -> None:
+        calls.append(key)
+        done.set()
+
+    queue = DebouncedQueue(callback, delay=0.05)
+    for _ in range(3):
+        queue.enqueue("library", "document")
+
+    assert done.wait(1)
+    assert calls == [("library", "document")]
+    assert queue.pending() == []
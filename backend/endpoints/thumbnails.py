@@ -1,11 +1,35 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from http import HTTPStatus
+from io import BytesIO
+import threading
+import uuid
 import flask
+from google.cloud import firestore
 
 from backend.common import connect
 from backend.common.app_access import require_access_level
-from backend.common.backend_exceptions import HandledException
-from backend.common.firebase_storage import upload_thumbnails
+from backend.common.app_logging import APP_LOGGER
+from backend.common.backend_exceptions import ClientException, HandledException
+from backend.common.firebase_storage import upload_thumbnail_atlas, upload_thumbnails
 from backend.common.cache import cacheable_route
+from backend.common.database import (
+    BaseDocument,
+    Database,
+    DocumentRef,
+    FirestoreDocument,
+    LibraryRef,
+    replace_fields,
+)
+from backend.common.image_formats import negotiate_format, transcode
+from backend.common.models import (
+    Element,
+    JobStatus,
+    ThumbnailJob,
+    ThumbnailManifest,
+)
+from backend.common.thumbnail_cache import THUMBNAIL_CACHE, stream_map
+from backend.common.thumbnail_waiter import THUMBNAIL_WAITER
 from backend.common.connect import (
     element_path_route,
     get_optional_query_param,
@@ -16,9 +40,13 @@ from backend.common.connect import (
 from onshape_api.api.api_base import Api
 from onshape_api.endpoints import documents, thumbnails
 from onshape_api.paths.doc_path import ElementPath, InstancePath
+from onshape_api.paths.instance_type import InstanceType
 
 router = flask.Blueprint("thumbnails", __name__)
 
+# The number of documents refreshed at once by a thumbnail job
+JOB_CONCURRENCY = 4
+
 
 @cacheable_route(router, "/thumbnail")
 def get_element_thumbnail(**kwargs):
@@ -26,8 +54,30 @@ def get_element_thumbnail(**kwargs):
     thumbnail_id = connect.get_query_param("thumbnailId")
     size = connect.get_query_param("size")
 
-    thumbnail = thumbnails.get_thumbnail_from_id(api, thumbnail_id, size)
-    return flask.send_file(thumbnail, mimetype="image/gif")
+    image_format = negotiate_format(flask.request.headers.get("Accept"))
+
+    cached = THUMBNAIL_CACHE.get(thumbnail_id, size, image_format)
+    if cached != None:
+        response = flask.Response(stream_map(cached), mimetype=image_format)
+        response.content_length = len(cached)
+    else:
+        try:
+            thumbnail = THUMBNAIL_WAITER.wait(
+                lambda: thumbnails.get_thumbnail_from_id(
+                    api, thumbnail_id, size
+                ).getvalue(),
+                thumbnail_id,
+                size,
+            )
+        except TimeoutError:
+            return flask.Response(status=HTTPStatus.REQUEST_TIMEOUT)
+        data = transcode(thumbnail, image_format)
+        THUMBNAIL_CACHE.put(data, thumbnail_id, size, image_format)
+        response = flask.send_file(BytesIO(data), mimetype=image_format)
+
+    # Caches must store each format separately
+    response.headers["Vary"] = "Accept"
+    return response
 
 
 @cacheable_route(router, "/thumbnail-id" + element_path_route())
@@ -69,9 +119,12 @@ class ReloadDocumentThumbnail:
     def upload_thumbnails(
         self,
         api: Api,
+        db: Database,
         document: dict,
         contents: dict,
         version_path: InstancePath,
+        thumbnail_manifest: ThumbnailManifest | None = None,
+        force: bool = False,
     ) -> dict:
         thumbnail_element_id = self.get_thumbnail_element_id(document, contents)
         thumbnail_path = ElementPath.from_path(version_path, thumbnail_element_id)
@@ -79,7 +132,14 @@ class ReloadDocumentThumbnail:
         thumbnail_microversion_id = self.get_microversion_id(
             contents, thumbnail_element_id
         )
-        return upload_thumbnails(api, thumbnail_path, thumbnail_microversion_id)
+        return upload_thumbnails(
+            api,
+            db,
+            thumbnail_path,
+            thumbnail_microversion_id,
+            thumbnail_manifest,
+            force=force,
+        )
 
 
 @router.post("/reload-thumbnail" + library_route() + instance_path_route())
@@ -92,7 +152,7 @@ def reload_document_thumbnail(**kwargs):
     contents = documents.get_contents(api, document_path)
 
     thumbnails = ReloadDocumentThumbnail().upload_thumbnails(
-        api, document, contents, document_path
+        api, connect.get_db(), document, contents, document_path
     )
 
     if len(thumbnails) < 2:
@@ -116,14 +176,14 @@ def reload_element_thumbnail(**kwargs):
     api = connect.get_api()
     element_path = get_route_element_path()
 
-    element_ref = (
-        connect.get_library_ref()
-        .documents.document(element_path.document_id)
-        .elements.element(element_path.element_id)
+    db = connect.get_db()
+    document_ref = connect.get_library_ref().documents.document(
+        element_path.document_id
     )
+    element_ref = document_ref.elements.element(element_path.element_id)
     element = element_ref.get()
 
-    thumbnails = upload_thumbnails(api, element_path, element.microversionId)
+    thumbnails = upload_thumbnails(api, db, element_path, element.microversionId)
     if len(thumbnails) < 2:
         raise HandledException("Failed to upload thumbnail. Does it exist in Onshape?")
 
@@ -132,4 +192,217 @@ def reload_element_thumbnail(**kwargs):
         raise HandledException("Thumbnail is already up to date.", is_error=False)
 
     element_ref.update({"thumbnailUrls": thumbnails})
+    update_thumbnail_atlas(db, document_ref)
     return {"success": True}
+
+
+def update_thumbnail_atlas(db: Database, document_ref: DocumentRef) -> None:
+    """Rebuilds the thumbnail atlas of a document from its thumbnail manifest."""
+    thumbnail_atlas = upload_thumbnail_atlas(
+        document_ref.get().elementOrder,
+        db.get_thumbnail_manifest(document_ref.id).get(),
+    )
+    # Replace the whole atlas rather than merging with old tiles
+    replace_fields(
+        document_ref,
+        {
+            "thumbnailAtlas": (
+                thumbnail_atlas.model_dump() if thumbnail_atlas != None else None
+            )
+        },
+    )
+
+
+class ThumbnailJobRunner:
+    """Refreshes the thumbnails of every document and element in a library.
+
+    Only thumbnailUrls and thumbnail atlases are written; elements, configurations and fasten info are left alone.
+
+    Parameters:
+        job_ref: The job to report progress to, if any. Without a job, errors are raised to the caller instead.
+    """
+
+    def __init__(
+        self,
+        api: Api,
+        db: Database,
+        library_ref: LibraryRef,
+        job_ref: FirestoreDocument[ThumbnailJob] | None,
+        force: bool,
+    ) -> None:
+        self.api = api
+        self.db = db
+        self.library_ref = library_ref
+        self.job_ref = job_ref
+        self.force = force
+        # The number of documents and elements whose thumbnails changed
+        self.updated = 0
+        # The ids of documents and elements which failed to refresh
+        self.failed: list[str] = []
+        self._lock = threading.Lock()
+
+    def run(self) -> None:
+        try:
+            document_refs = self.library_ref.documents.list()
+            # Listed documents are already read, so the total is known before any progress is reported
+            self.report(
+                {
+                    "total": sum(
+                        len(document_ref.get().elementOrder) + 1
+                        for document_ref in document_refs
+                    )
+                }
+            )
+            with ThreadPoolExecutor(
+                max_workers=JOB_CONCURRENCY, thread_name_prefix="thumbnail-job"
+            ) as executor:
+                list(executor.map(self.refresh_document, document_refs))
+        except Exception:
+            APP_LOGGER.exception("Thumbnail job failed")
+            if self.job_ref == None:
+                raise
+        finally:
+            self.report(
+                {"status": JobStatus.DONE, "finishedAt": datetime.now(timezone.utc)}
+            )
+
+    def report(self, progress: dict) -> None:
+        if self.job_ref != None:
+            self.job_ref.update(progress)
+
+    def record(self, results: dict[str, bool | None]) -> None:
+        """Records the results of refreshing a document and its elements in a single write.
+
+        Parameters:
+            results: Maps document and element ids to whether their thumbnails changed, or None if refreshing failed.
+        """
+        updated = sum(1 for result in results.values() if result == True)
+        failed = [target_id for target_id, result in results.items() if result == None]
+        with self._lock:
+            self.updated += updated
+            self.failed.extend(failed)
+
+        progress: dict = {"completed": firestore.Increment(len(results))}
+        if updated > 0:
+            progress["updated"] = firestore.Increment(updated)
+        if len(failed) > 0:
+            progress["failed"] = firestore.ArrayUnion(failed)
+        self.report(progress)
+
+    def refresh_document(self, document_ref: DocumentRef) -> None:
+        document = document_ref.get()
+        results: dict[str, bool | None] = {}
+
+        version_path = InstancePath(
+            document_ref.id, document.instanceId, InstanceType.VERSION
+        )
+        thumbnail_element_id = None
+        try:
+            onshape_document = documents.get_document(self.api, version_path)
+            contents = documents.get_contents(self.api, version_path)
+            reload_thumbnail = ReloadDocumentThumbnail()
+            thumbnail_element_id = reload_thumbnail.get_thumbnail_element_id(
+                onshape_document, contents
+            )
+            thumbnails = reload_thumbnail.upload_thumbnails(
+                self.api,
+                self.db,
+                onshape_document,
+                contents,
+                version_path,
+                force=self.force,
+            )
+            updated = thumbnails != document.thumbnailUrls
+            if updated:
+                document_ref.update({"thumbnailUrls": thumbnails})
+            results[document_ref.id] = updated
+        except Exception:
+            APP_LOGGER.exception(f"Failed to refresh thumbnails of {document.name}")
+            results[document_ref.id] = None
+
+        # Read after uploading the document's thumbnail so its element can reuse it
+        manifest = self.db.get_thumbnail_manifest(document_ref.id).get()
+        any_updated = False
+        for element_id in document.elementOrder:
+            element_ref = document_ref.elements.element(element_id)
+            try:
+                updated = self.refresh_element(
+                    element_ref,
+                    manifest,
+                    # The document's thumbnail element was just refetched
+                    force=self.force and element_id != thumbnail_element_id,
+                )
+                any_updated = any_updated or updated
+                results[element_id] = updated
+            except Exception:
+                APP_LOGGER.exception(f"Failed to refresh thumbnails of {element_id}")
+                results[element_id] = None
+
+        if any_updated or document.thumbnailAtlas == None:
+            update_thumbnail_atlas(self.db, document_ref)
+        self.record(results)
+
+    def refresh_element(
+        self,
+        element_ref: BaseDocument[Element],
+        manifest: ThumbnailManifest,
+        force: bool = False,
+    ) -> bool:
+        """Returns True if the element's thumbnails changed."""
+        element = element_ref.get()
+        element_path = ElementPath(
+            element.documentId,
+            element.instanceId,
+            element_ref.id,
+            instance_type=InstanceType.VERSION,
+        )
+        thumbnails = upload_thumbnails(
+            self.api,
+            self.db,
+            element_path,
+            element.microversionId,
+            manifest,
+            force=force,
+        )
+        if thumbnails == element.thumbnailUrls:
+            return False
+        element_ref.update({"thumbnailUrls": thumbnails})
+        return True
+
+
+@router.post("/reload-thumbnails" + library_route())
+@require_access_level()
+def reload_library_thumbnails(**kwargs):
+    """Starts a job which refreshes every thumbnail in a library.
+
+    Returns:
+        jobId: The id of the job, which can be passed to /thumbnail-job to check its progress.
+    """
+    db = connect.get_db()
+    force = connect.get_query_bool("force", False)
+
+    job_id = uuid.uuid4().hex
+    job_ref = db.get_thumbnail_job(job_id)
+    job_ref.set(
+        ThumbnailJob(
+            library=connect.get_route_library(),
+            force=force,
+            createdAt=datetime.now(timezone.utc),
+        )
+    )
+
+    runner = ThumbnailJobRunner(
+        connect.get_api(), db, connect.get_library_ref(), job_ref, force
+    )
+    threading.Thread(target=runner.run, name="thumbnail-job", daemon=True).start()
+    return {"jobId": job_id}
+
+
+@router.get("/thumbnail-job/<job_id>")
+@require_access_level()
+def get_thumbnail_job(**kwargs):
+    job_id = connect.get_route("job_id")
+    job = connect.get_db().get_thumbnail_job(job_id).maybe_get()
+    if job == None:
+        raise ClientException(f"Thumbnail job {job_id} does not exist.")
+    return job.model_dump_json()
@@ -4,7 +4,11 @@ import flask
 from pydantic import BaseModel
 
 from backend.common import connect, env
-from backend.common.app_access import get_app_access_level
+from backend.common.app_access import (
+    ACCESS_LEVEL_CACHE,
+    get_app_access_level,
+    require_access_level,
+)
 from backend.common.connect import (
     get_db,
     get_route_user_path,
@@ -34,6 +38,19 @@ def get_context_data(**kwargs):
     ).model_dump_json(exclude_none=True)
 
 
+@router.post("/invalidate-access-level")
+@require_access_level(AccessLevel.ADMIN)
+def invalidate_access_level(**kwargs):
+    """Clears cached access levels, e.g., after changing the members of the admin team.
+
+    Invalidates a single user if userId is passed, otherwise every user.
+    Other workers may keep using their in-process cache for up to a minute.
+    """
+    user_id = connect.get_optional_body_arg("userId")
+    ACCESS_LEVEL_CACHE.invalidate(user_id)
+    return {"success": True}
+
+
 def get_cache_version() -> int:
     db = connect.get_db()
     user_id = connect.get_route_user_path().user_id
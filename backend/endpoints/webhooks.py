@@ -0,0 +1,118 @@
+import asyncio
+from http import HTTPStatus
+
+import flask
+from pydantic import ValidationError
+
+from backend.common import connect, env
+from backend.common.app_logging import APP_LOGGER
+from backend.common.backend_exceptions import BaseAppException
+from backend.common.change_feed import (
+    acquire_reload_lease,
+    clear_pending,
+    mark_pending,
+    release_reload_lease,
+)
+from backend.common.models import Library
+from backend.common.previews import queue_previews
+from backend.common.reload_context import ReloadContext
+from backend.common.search_index import update_search_index
+from backend.common.webhooks import (
+    DebouncedQueue,
+    WebhookEvent,
+    WebhookEventType,
+    verify_signature,
+)
+from backend.endpoints.documents import reload_document, save_to_reload_context
+from onshape_api.paths.doc_path import DocumentPath
+
+router = flask.Blueprint("webhooks", __name__)
+
+SIGNATURE_HEADER = "X-Onshape-Webhook-Signature-Primary"
+
+
+class WebhookException(BaseAppException):
+    def __init__(self, message: str, status_code: HTTPStatus = HTTPStatus.UNAUTHORIZED):
+        super().__init__(message, status_code=status_code)
+
+
+def reload_changed_document(library: Library, document_id: str) -> None:
+    """Reloads a document after Onshape reports a new version of it.
+
+    The document stays pending if the reload fails or API keys aren't configured, so the next reload picks it up.
+    Workers share a lease on each document, so a document which is already being reloaded by another worker is retried
+    after another delay.
+    """
+    api = connect.get_service_api()
+    if api == None:
+        APP_LOGGER.info(f"Skipped reloading {document_id} since API keys aren't set")
+        return
+
+    db = connect.get_db()
+    library_ref = db.get_library(library)
+    document_ref = library_ref.documents.document(document_id)
+    try:
+        acquired = acquire_reload_lease(db, library_ref, document_id)
+    except Exception:
+        APP_LOGGER.exception(f"Failed to lease {document_id} in {library}")
+        return
+    if not acquired:
+        APP_LOGGER.info(f"Another worker is reloading {document_id}, retrying later")
+        RELOAD_QUEUE.enqueue(library, document_id)
+        return
+
+    try:
+        # Read before reloading so the document stays pending if it's marked again during the reload
+        mark = library_ref.get().changeFeed.pendingDocuments.get(document_id)
+        reload_context = ReloadContext()
+        save_to_reload_context(reload_context, document_ref)
+        count = asyncio.run(
+            reload_document(
+                api, library_ref.documents, DocumentPath(document_id), reload_context
+            )
+        )
+        if mark != None:
+            clear_pending(db, library_ref, {document_id: mark})
+        if count > 0:
+            update_search_index(library, library_ref)
+            queue_previews(db, library, [document_id])
+        APP_LOGGER.info(f"Reloaded {count} elements of {document_id} in {library}")
+    except Exception:
+        APP_LOGGER.exception(f"Failed to reload {document_id} in {library}")
+    finally:
+        release_reload_lease(library_ref, document_id)
+
+
+RELOAD_QUEUE = DebouncedQueue(reload_changed_document)
+
+
+@router.post("/webhook" + connect.library_route())
+def receive_webhook(**kwargs):
+    """Receives notifications from Onshape webhooks registered against the documents of a library.
+
+    Notifications are signed with WEBHOOK_SECRET. New versions of documents in the library are reloaded after a delay.
+    """
+    body = flask.request.get_data()
+    signature = flask.request.headers.get(SIGNATURE_HEADER)
+    if env.WEBHOOK_SECRET == None or not verify_signature(
+        body, signature, env.WEBHOOK_SECRET
+    ):
+        raise WebhookException("Invalid webhook signature.")
+
+    try:
+        event = WebhookEvent.model_validate_json(body)
+    except ValidationError:
+        raise WebhookException(
+            "Invalid webhook notification.", status_code=HTTPStatus.BAD_REQUEST
+        )
+    if event.event != WebhookEventType.VERSION_CREATED or event.documentId == None:
+        return {"queued": False}
+
+    library = connect.get_route_library()
+    library_ref = connect.get_library_ref()
+    if event.documentId not in library_ref.documents.keys():
+        return {"queued": False}
+
+    mark_pending(library_ref, [event.documentId])
+    RELOAD_QUEUE.enqueue(library, event.documentId)
+    return {"queued": True}
@@ -10,6 +10,7 @@ The frontend should have a /redirect route which calls the /redirect route below
 import flask
 from flask import request
 from backend.common import connect, env
+from backend.common.app_access import prewarm_access_level
 
 
 router = flask.Blueprint("oauth", __name__)
@@ -49,6 +50,9 @@ def redirect():
         code=request.args["code"],
     )
     connect.set_session_token(db, token)
+    # The new token may belong to a different user
+    flask.session.pop("user_id", None)
+    prewarm_access_level(connect.get_api(), connect.get_session_id())
 
     redirect_url = flask.session.get("redirect_url")
     if redirect_url == None:
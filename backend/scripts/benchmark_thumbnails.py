@@ -0,0 +1,70 @@
+"""Measures the bytes saved by transcoding the thumbnails of a library.
+
+Usage:
+    python -m backend.scripts.benchmark_thumbnails [--library frc-design-lib] [--limit 200]
+
+Downloads each stored thumbnail and compares its size against each format supported by the installed Pillow build.
+"""
+
+import argparse
+from collections import defaultdict
+
+import dotenv
+import requests
+from google.cloud import firestore
+
+from backend.common.database import Database
+from backend.common.image_formats import SUPPORTED_FORMATS, transcode
+from backend.common.models import Library
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--library",
+        type=Library,
+        choices=list(Library),
+        default=Library.FRC_DESIGN_LIB,
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=None,
+        help="Stop after downloading this many thumbnails.",
+    )
+    args = parser.parse_args()
+
+    # Picks up FIRESTORE_EMULATOR_HOST in development
+    dotenv.load_dotenv()
+    db = Database(firestore.Client(project="frc-design-lib"))
+    library_ref = db.get_library(args.library)
+
+    urls = []
+    for document_ref in library_ref.documents.list():
+        for element_ref in document_ref.elements.list():
+            urls.extend(element_ref.get().thumbnailUrls.values())
+    if args.limit != None:
+        urls = urls[: args.limit]
+
+    original_bytes = 0
+    transcoded_bytes: defaultdict[str, int] = defaultdict(int)
+    for url in urls:
+        response = requests.get(url)
+        response.raise_for_status()
+        original_bytes += len(response.content)
+        for image_format in SUPPORTED_FORMATS:
+            transcoded_bytes[image_format] += len(
+                transcode(response.content, image_format)
+            )
+
+    print(f"Thumbnails: {len(urls)}")
+    print(f"Stored: {original_bytes:,} bytes")
+    for image_format, size in transcoded_bytes.items():
+        saved = 1 - size / max(original_bytes, 1)
+        print(f"{image_format}: {size:,} bytes ({saved:.1%} saved)")
+
+
+if __name__ == "__main__":
+    main()
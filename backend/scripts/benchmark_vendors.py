@@ -0,0 +1,166 @@
+"""Benchmarks vendor parsing over a synthetic corpus of element names and configuration options.
+
+Usage:
+    python -m backend.scripts.benchmark_vendors [--elements 2000] [--repeat 5]
+
+Compares parse_vendors against the previous implementation, which scanned every Vendor for each word of each name.
+"""
+
+import argparse
+import random
+import re
+import timeit
+
+from backend.common.models import (
+    ConfigurationParameters,
+    EnumConfigurationParameter,
+    EnumOption,
+    ParameterType,
+    Vendor,
+    get_vendor_name,
+)
+from backend.common.vendors import parse_vendors
+
+PART_NAMES = [
+    "MK4i Swerve Module",
+    "Kraken X60 Motor",
+    "NEO Vortex",
+    "Hex Shaft Collar",
+    "Timing Belt Pulley",
+    "Spacer (Aluminum)",
+    "Bearing - Flanged",
+    "#25 Chain Sprocket",
+    "Gusset Plate",
+    "MAXSwerve Module",
+]
+OPTION_NAMES = [
+    '1/2" Hex',
+    "3/8 in Rounded Hex",
+    "10 mm",
+    "Black Anodized",
+    "Clear",
+    "24T",
+    "36T",
+    "Steel",
+    "Aluminum",
+    "Left",
+    "Right",
+]
+
+
+def legacy_parse_name_vendor(name: str) -> Vendor | None:
+    for match in re.finditer(r"\b(\w+)\b", name.upper()):
+        vendor_str = match.group(1)
+        if vendor := next(
+            (vendor for vendor in Vendor if vendor.upper() == vendor_str), None
+        ):
+            return vendor
+
+
+def legacy_parse_vendors(
+    name: str, configuration: ConfigurationParameters | None = None
+) -> list[Vendor]:
+    name_vendor = legacy_parse_name_vendor(name)
+    if name_vendor:
+        return [name_vendor]
+
+    vendors: set[Vendor] = set()
+    if not configuration:
+        return []
+
+    for param in configuration.parameters:
+        if param.type != ParameterType.ENUM:
+            continue
+        for option in param.options:
+            vendor = legacy_parse_name_vendor(option.name)
+            if vendor:
+                vendors.add(vendor)
+                continue
+            vendor = next(
+                (
+                    vendor
+                    for vendor in Vendor
+                    if get_vendor_name(vendor).upper() == option.name.upper()
+                ),
+                None,
+            )
+            if vendor:
+                vendors.add(vendor)
+
+    return list(vendors)
+
+
+def make_corpus(
+    count: int, rng: random.Random
+) -> list[tuple[str, ConfigurationParameters | None]]:
+    """Builds elements resembling a library: most names have no vendor, and some have many configured options."""
+    vendor_options = [vendor.value for vendor in Vendor] + [
+        get_vendor_name(vendor) for vendor in Vendor
+    ]
+
+    corpus = []
+    for _ in range(count):
+        name = rng.choice(PART_NAMES)
+        if rng.random() < 0.3:
+            name = f"{rng.choice(list(Vendor)).value} {name}"
+
+        configuration = None
+        if rng.random() < 0.6:
+            parameters = []
+            for index in range(rng.randint(1, 20)):
+                options = [
+                    EnumOption(id=str(i), name=rng.choice(OPTION_NAMES))
+                    for i in range(rng.randint(2, 12))
+                ]
+                if rng.random() < 0.2:
+                    options.append(
+                        EnumOption(id="vendor", name=rng.choice(vendor_options))
+                    )
+                parameters.append(
+                    EnumConfigurationParameter(
+                        name=f"Parameter {index}",
+                        id=f"parameter{index}",
+                        default="0",
+                        options=options,
+                    )
+                )
+            configuration = ConfigurationParameters(parameters=parameters)
+        corpus.append((name, configuration))
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--elements", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.elements, random.Random(args.seed))
+
+    for name, configuration in corpus:
+        assert sorted(parse_vendors(name, configuration)) == sorted(
+            legacy_parse_vendors(name, configuration)
+        ), name
+
+    for label, function in [
+        ("legacy", legacy_parse_vendors),
+        ("parse_vendors", parse_vendors),
+    ]:
+        seconds = min(
+            timeit.repeat(
+                lambda: [function(name, config) for name, config in corpus],
+                number=1,
+                repeat=args.repeat,
+            )
+        )
+        print(
+            f"{label}: {seconds * 1000:.1f} ms for {len(corpus)} elements "
+            f"({seconds / len(corpus) * 1e6:.1f} us per element)"
+        )
+
+
+if __name__ == "__main__":
+    main()
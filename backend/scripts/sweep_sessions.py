@@ -0,0 +1,51 @@
+"""Deletes expired sessions from the database.
+
+Usage:
+    python -m backend.scripts.sweep_sessions [--batch-size 500] [--max-ops-per-second 50] [--max-batches N]
+
+Intended to be run periodically, e.g., as a scheduled Cloud Run job or cron task.
+"""
+
+import argparse
+
+import dotenv
+from google.cloud import firestore
+
+from backend.common.database import Database, delete_expired_sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument(
+        "--max-ops-per-second",
+        type=int,
+        default=50,
+        help="Limits the delete rate so sweeps don't compete with user traffic.",
+    )
+    parser.add_argument(
+        "--max-batches",
+        type=int,
+        default=None,
+        help="Stop after deleting this many pages of sessions.",
+    )
+    args = parser.parse_args()
+
+    # Picks up FIRESTORE_EMULATOR_HOST in development
+    dotenv.load_dotenv()
+    db = Database(firestore.Client(project="frc-design-lib"))
+
+    deleted = delete_expired_sessions(
+        db,
+        batch_size=args.batch_size,
+        max_ops_per_second=args.max_ops_per_second,
+        max_batches=args.max_batches,
+        on_progress=lambda count: print(f"Deleted {count} expired sessions..."),
+    )
+    print(f"Done. Deleted {deleted} expired sessions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,6 @@ from backend.common.app_logging import APP_LOGGER, log_app_opened
 from backend.endpoints import api
 from backend.common import connect, env
 from backend import oauth
-from onshape_api.endpoints.users import ping
 
 
 def create_app():
@@ -33,10 +32,8 @@ def create_app():
     @app.get("/app")
     async def serve_app():
         """The base route used by Onshape."""
-        api = connect.get_api()
-
-        authorized = api.oauth.authorized and ping(api, catch=True)
-        if not authorized:
+        # Uses the cached token expiry so opening the app doesn't depend on an Onshape call
+        if not connect.is_authorized():
             # Save redirect url to session so we can get back here after processing OAuth2 redirect
             flask.session["redirect_url"] = connect.get_current_url()
 
@@ -96,6 +96,15 @@ export interface LibraryObj {
     documentOrder: string[];
     documents: Documents;
     elements: Elements;
+    /**
+     * Maps element ids to popularity scores computed from recent inserts.
+     * Elements which haven't been inserted recently are omitted.
+     */
+    popularity: Record<string, number | undefined>;
+    /**
+     * The ids of the most popular visible elements, most popular first.
+     */
+    topElements: string[];
 }
 
 export type Documents = Record<string, DocumentObj | undefined>;
@@ -108,6 +117,32 @@ export interface DocumentObj {
     sortAlphabetically: boolean;
     elementOrder: string[];
     path: InstancePath;
+    /**
+     * A single image containing the tiny thumbnails of the document's elements.
+     */
+    thumbnailAtlas?: ThumbnailAtlas;
+}
+
+export interface ThumbnailAtlas {
+    url: string;
+    width: number;
+    height: number;
+    tileWidth: number;
+    tileHeight: number;
+    /**
+     * Maps element ids to the offsets of their thumbnails in pixels.
+     * Elements without an up to date thumbnail are omitted.
+     */
+    tiles: Record<string, { x: number; y: number } | undefined>;
+}
+
+/**
+ * The location of a single thumbnail in a thumbnail atlas.
+ */
+export interface AtlasTile {
+    atlas: ThumbnailAtlas;
+    x: number;
+    y: number;
 }
 
 export interface ElementObj {
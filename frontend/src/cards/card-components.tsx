@@ -23,7 +23,12 @@ import {
     useInsertMutation,
     useIsAssemblyInPartStudio
 } from "../insert/insert-hooks";
-import { ElementObj, ElementType, ThumbnailUrls } from "../api/models";
+import {
+    AtlasTile,
+    ElementObj,
+    ElementType,
+    ThumbnailUrls
+} from "../api/models";
 import { Configuration } from "../insert/configuration-models";
 import { useSearch } from "@tanstack/react-router";
 import { RequireAccessLevel } from "../api/access-level";
@@ -126,10 +131,11 @@ interface CardTitleProps {
     title: string;
     searchHit?: SearchHit;
     thumbnailUrls: ThumbnailUrls;
+    atlasTile?: AtlasTile;
 }
 
 export function CardTitle(props: CardTitleProps) {
-    const { searchHit, title, thumbnailUrls } = props;
+    const { searchHit, title, thumbnailUrls, atlasTile } = props;
     const disabled = props.disabled ?? false;
     const isHidden = props.showHiddenTag ?? false;
 
@@ -152,7 +158,12 @@ export function CardTitle(props: CardTitleProps) {
             className={disabled ? Classes.TEXT_MUTED : undefined}
             ellipsize
             title={cardTitle}
-            icon={<CardThumbnail thumbnailUrls={thumbnailUrls} />}
+            icon={
+                <CardThumbnail
+                    thumbnailUrls={thumbnailUrls}
+                    atlasTile={atlasTile}
+                />
+            }
             tags={hiddenTag}
         />
     );
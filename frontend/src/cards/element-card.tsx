@@ -40,6 +40,7 @@ import { toLibraryPath, useLibrary } from "../api/library";
 import { getAppErrorHandler } from "../api/errors";
 import { getQueryUpdater } from "../common/utils";
 import { router } from "../router";
+import { useAtlasTile } from "../insert/thumbnail";
 
 interface ElementCardProps extends PropsWithChildren {
     element: ElementObj;
@@ -57,6 +58,7 @@ export function ElementCard(props: ElementCardProps): ReactNode {
     const userData = useLibraryUserDataQuery().data;
 
     const isHidden = useIsElementHidden(element);
+    const atlasTile = useAtlasTile(element);
 
     const isAssemblyInPartStudio = useIsAssemblyInPartStudio(
         element.elementType
@@ -102,6 +104,7 @@ export function ElementCard(props: ElementCardProps): ReactNode {
                             searchHit={searchHit}
                             title={element.name}
                             thumbnailUrls={element.thumbnailUrls}
+                            atlasTile={atlasTile}
                             showHiddenTag={!element.isVisible}
                         />
                         <div className="item-card-right-content">
@@ -22,6 +22,7 @@ import {
 } from "../cards/card-components";
 import { useIsElementHidden } from "../cards/card-hooks";
 import { useIsAssemblyInPartStudio } from "../insert/insert-hooks";
+import { useAtlasTile } from "../insert/thumbnail";
 import { ChangeOrderItems } from "../cards/change-order";
 import { toUserApiPath } from "../api/path";
 import { useUiState } from "../api/ui-state";
@@ -49,6 +50,7 @@ export function FavoriteCard(props: FavoriteCardProps): ReactNode {
     const navigate = useNavigate();
 
     const isHidden = useIsElementHidden(element);
+    const atlasTile = useAtlasTile(element);
     const isAssemblyInPartStudio = useIsAssemblyInPartStudio(
         element.elementType
     );
@@ -87,6 +89,7 @@ export function FavoriteCard(props: FavoriteCardProps): ReactNode {
                             disabled={isAssemblyInPartStudio}
                             title={element.name}
                             thumbnailUrls={element.thumbnailUrls}
+                            atlasTile={atlasTile}
                             searchHit={searchHit}
                         />
                         <div className="item-card-right-content">
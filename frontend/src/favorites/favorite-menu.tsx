@@ -136,6 +136,7 @@ function FavoriteMenuDialog(
             <PreviewImageCard
                 path={element.path}
                 configuration={configuration}
+                configurationId={element.configurationId}
             />
             <DialogBody>
                 <ConfigurationWrapper
@@ -152,6 +152,10 @@ export function evaluateCondition(
 export interface ConfigurationResult {
     // defaultConfiguration: string;
     parameters: ParameterObj[];
+    /**
+     * Maps preview keys of common configurations to the urls of pre-rendered previews.
+     */
+    previews?: Record<string, string | undefined>;
 }
 
 export type ParameterObj =
@@ -211,6 +215,17 @@ export function encodeConfigurationForQuery(
         .join(";");
 }
 
+/**
+ * Returns the key of a configuration in ConfigurationResult.previews.
+ * Matches get_preview_key in the backend.
+ */
+export function getPreviewKey(configuration: Configuration): string {
+    return Object.entries(configuration)
+        .sort(([a], [b]) => (a < b ? -1 : a > b ? 1 : 0))
+        .map(([id, value]) => `${id}=${value}`)
+        .join(";");
+}
+
 /**
  * Custom data collected from the current tab the user has open.
  */
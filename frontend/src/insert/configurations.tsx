@@ -12,7 +12,6 @@ import {
     InputGroup,
     NumericInput
 } from "@blueprintjs/core";
-import { useQuery } from "@tanstack/react-query";
 import { useSearch } from "@tanstack/react-router";
 import {
     Dispatch,
@@ -22,7 +21,6 @@ import {
     useState,
     useCallback
 } from "react";
-import { useCacheOptions, apiGet } from "../api/api";
 import {
     Configuration,
     ConfigurationResult,
@@ -47,9 +45,8 @@ import {
     evaluateExpression
 } from "./parser";
 import { Select } from "@blueprintjs/select";
-import { getConfigurationKey, useUnitInfoQuery } from "../queries";
+import { useConfigurationQuery, useUnitInfoQuery } from "../queries";
 import { showErrorToast } from "../common/toaster";
-import { toLibraryPath, useLibrary } from "../api/library";
 
 interface ConfigurationWrapperProps {
     configurationId: string;
@@ -62,22 +59,7 @@ export function ConfigurationWrapper(props: ConfigurationWrapperProps) {
     const { configurationId, documentId, configuration, setConfiguration } =
         props;
 
-    const library = useLibrary();
-    const cacheOptions = useCacheOptions();
-    const query = useQuery<ConfigurationResult>({
-        queryKey: getConfigurationKey(library, configurationId, cacheOptions),
-        queryFn: async () => {
-            return apiGet("/configuration" + toLibraryPath(library), {
-                query: {
-                    documentId,
-                    configurationId
-                },
-                cacheOptions
-            });
-        },
-        // Don't refetch query automatically so we don't reset user inputs
-        refetchInterval: false
-    });
+    const query = useConfigurationQuery(documentId, configurationId);
 
     const search = useSearch({ from: "/app" });
     const unitInfoQuery = useUnitInfoQuery(search);
@@ -95,6 +95,7 @@ function InsertMenuDialog(props: MenuDialogProps<InsertMenuParams>): ReactNode {
             <PreviewImageCard
                 path={element.path}
                 configuration={configuration}
+                configurationId={element.configurationId}
             />
             <DialogBody>{parameters}</DialogBody>
             <DialogFooter actions={actions}>
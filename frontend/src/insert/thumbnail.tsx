@@ -6,6 +6,8 @@ import {
     useCacheOptions
 } from "../api/api";
 import {
+    AtlasTile,
+    ElementObj,
     getHeightAndWidth,
     HeightAndWidth,
     ThumbnailSize,
@@ -24,17 +26,41 @@ import {
 import { ReactNode } from "react";
 import {
     Configuration,
-    encodeConfigurationForQuery
+    encodeConfigurationForQuery,
+    getPreviewKey
 } from "../insert/configuration-models";
-import { getConfigurationMatchKey } from "../queries";
+import {
+    getConfigurationMatchKey,
+    useConfigurationQuery,
+    useLibraryQuery
+} from "../queries";
 import { AppErrorState } from "../common/app-zero-state";
 
 interface CardThumbnailProps {
     thumbnailUrls: ThumbnailUrls;
+    /**
+     * The tiny thumbnail in the document's thumbnail atlas.
+     * Used instead of the tiny thumbnail url when provided.
+     */
+    atlasTile?: AtlasTile;
+}
+
+/**
+ * Returns the location of an element's thumbnail in its document's thumbnail atlas, if any.
+ */
+export function useAtlasTile(element: ElementObj): AtlasTile | undefined {
+    const documents = useLibraryQuery().data?.documents;
+    const atlas = documents?.[element.documentId]?.thumbnailAtlas;
+    const tile = atlas?.tiles[element.id];
+    if (!atlas || !tile) {
+        return undefined;
+    }
+    return { atlas, x: tile.x, y: tile.y };
 }
 
 export function CardThumbnail(props: CardThumbnailProps): ReactNode {
-    const { thumbnailUrls } = props;
+    const { thumbnailUrls, atlasTile } = props;
+    const tinyHeightAndWidth = getHeightAndWidth(ThumbnailSize.TINY, 0.8);
 
     return (
         <Popover
@@ -53,16 +79,49 @@ export function CardThumbnail(props: CardThumbnailProps): ReactNode {
             interactionKind="hover"
         >
             <div style={{ marginRight: "5px" }}>
-                <Thumbnail
-                    url={thumbnailUrls[ThumbnailSize.TINY]}
-                    heightAndWidth={getHeightAndWidth(ThumbnailSize.TINY, 0.8)}
-                    spinnerSize={25}
-                />
+                {atlasTile ? (
+                    <AtlasThumbnail
+                        atlasTile={atlasTile}
+                        heightAndWidth={tinyHeightAndWidth}
+                    />
+                ) : (
+                    <Thumbnail
+                        url={thumbnailUrls[ThumbnailSize.TINY]}
+                        heightAndWidth={tinyHeightAndWidth}
+                        spinnerSize={25}
+                    />
+                )}
             </div>
         </Popover>
     );
 }
 
+interface AtlasThumbnailProps {
+    atlasTile: AtlasTile;
+    heightAndWidth: HeightAndWidth;
+}
+
+/**
+ * A thumbnail drawn from a thumbnail atlas.
+ * Every tile of an atlas shares a single image, so the browser only requests it once.
+ */
+function AtlasThumbnail(props: AtlasThumbnailProps): ReactNode {
+    const { atlasTile, heightAndWidth } = props;
+    const { atlas, x, y } = atlasTile;
+    const scale = heightAndWidth.width / atlas.tileWidth;
+
+    return (
+        <div
+            style={{
+                ...heightAndWidth,
+                backgroundImage: `url(${atlas.url})`,
+                backgroundPosition: `${-x * scale}px ${-y * scale}px`,
+                backgroundSize: `${atlas.width * scale}px ${atlas.height * scale}px`
+            }}
+        />
+    );
+}
+
 interface ThumbnailProps {
     url?: string;
     spinnerSize: SpinnerSize | number;
@@ -114,14 +173,27 @@ export function PreviewImageCard(props: PreviewImageProps): ReactNode {
 interface PreviewImageProps {
     path: ElementPath;
     configuration?: Configuration;
+    /**
+     * The id of the element's configuration, used to look up pre-rendered previews.
+     */
+    configurationId?: string;
 }
 
 export function PreviewImage(props: PreviewImageProps): ReactNode {
-    const { path, configuration } = props;
+    const { path, configuration, configurationId } = props;
     const size = ThumbnailSize.SMALL;
     const isFetchingConfiguration =
         useIsFetching({ queryKey: getConfigurationMatchKey() }) > 0;
 
+    // Common configurations are rendered ahead of time, so they don't need to wait on Onshape
+    const configurationQuery = useConfigurationQuery(
+        path.documentId,
+        configurationId
+    );
+    const previewUrl = configuration
+        ? configurationQuery.data?.previews?.[getPreviewKey(configuration)]
+        : undefined;
+
     // Thumbnail id generation with queries is really unreliable
     // The standard Onshape API for it appears to be broken/bugged
     // So we use an undocumented alternate workflow where insertables returns an id
@@ -138,7 +210,7 @@ export function PreviewImage(props: PreviewImageProps): ReactNode {
         },
         // Don't retry since failures are almost certainly due to an invalid configuration
         retry: false,
-        enabled: !isFetchingConfiguration
+        enabled: !isFetchingConfiguration && previewUrl === undefined
     });
 
     const thumbnailId = thumbnailIdQuery.data;
@@ -161,14 +233,26 @@ export function PreviewImage(props: PreviewImageProps): ReactNode {
             });
         },
         placeholderData: (previousData) => previousData,
-        // Cap max time between retries at 15 seconds with exponential backoff
-        retryDelay: (attempt) => Math.min(1000 * 2 ** attempt, 15000),
-        retry: 15,
-        enabled: !isFetchingConfiguration && thumbnailId !== undefined
+        // The backend waits for Onshape to finish rendering, so only retry a few times in case it times out
+        retry: 2,
+        enabled:
+            !isFetchingConfiguration &&
+            thumbnailId !== undefined &&
+            previewUrl === undefined
     });
 
     const heightAndWidth = getHeightAndWidth(size, 0.7);
 
+    if (previewUrl !== undefined) {
+        return (
+            <Thumbnail
+                url={previewUrl}
+                heightAndWidth={heightAndWidth}
+                spinnerSize={SpinnerSize.STANDARD}
+            />
+        );
+    }
+
     if (thumbnailIdQuery.isError || thumbnailQuery.isError) {
         return (
             <AppErrorState
@@ -20,7 +20,6 @@ import {
     AccessLevel,
     hasMemberAccess,
     Library,
-    LibraryObj,
     Settings,
     Theme,
     UserData
@@ -28,7 +27,6 @@ import {
 import { getLibraryName as getLibraryName } from "../api/library";
 import { ItemRenderer, Select } from "@blueprintjs/select";
 import { capitalize, getQueryUpdater } from "../common/utils";
-import { buildSearchDb } from "../search/search";
 import { toUserApiPath } from "../api/path";
 import { router } from "../router";
 import { OpenUrlButton } from "../common/open-url-button";
@@ -37,7 +35,6 @@ import { FEEDBACK_FORM_URL } from "../common/url";
 import { getAppErrorHandler, HandledError } from "../api/errors";
 import { toLibraryPath, useLibrary } from "../api/library";
 import {
-    libraryQueryKey,
     libraryQueryMatchKey,
     searchDbQueryMatchKey,
     updateSettingsKey,
@@ -241,23 +238,13 @@ function AdminSettings(): ReactNode {
  */
 function PushVersionButton(): ReactNode {
     const library = useLibrary();
-    const search = useSearch({ from: "/app" });
 
     const navigate = useNavigate();
     const pushVersionMutation = useMutation({
         mutationKey: ["library-version", library],
-        mutationFn: async () => {
-            const libraryData = await queryClient.fetchQuery<LibraryObj>({
-                queryKey: libraryQueryKey(library, search)
-            });
-            if (!libraryData) {
-                throw new HandledError("Failed to fetch library data.");
-            }
-            const searchDb = JSON.stringify(buildSearchDb(libraryData));
-            return apiPost("/library-version" + toLibraryPath(library), {
-                body: { searchDb }
-            });
-        },
+        // The search index is rebuilt by the backend
+        mutationFn: async () =>
+            apiPost("/library-version" + toLibraryPath(library)),
         onError: getAppErrorHandler("Unexpectedly failed to push new version."),
         onSuccess: (data: { newVersion: number }) => {
             showSuccessToast("Successfully updated the FRCDesignApp version.");
@@ -22,7 +22,10 @@ import {
     UserPath
 } from "./api/path";
 import { toLibraryPath, useLibrary } from "./api/library";
-import { UnitInfo } from "./insert/configuration-models";
+import {
+    ConfigurationResult,
+    UnitInfo
+} from "./insert/configuration-models";
 import { useLoaderData, useSearch } from "@tanstack/react-router";
 import MiniSearch from "minisearch";
 import { SEARCH_OPTIONS } from "./search/search";
@@ -39,6 +42,29 @@ export function getConfigurationKey(
     return ["configuration", library, configurationId, cacheOptions];
 }
 
+export function useConfigurationQuery(
+    documentId: string,
+    configurationId?: string
+) {
+    const library = useLibrary();
+    const cacheOptions = useCacheOptions();
+    return useQuery<ConfigurationResult>({
+        queryKey: getConfigurationKey(library, configurationId, cacheOptions),
+        queryFn: async () => {
+            return apiGet("/configuration" + toLibraryPath(library), {
+                query: {
+                    documentId,
+                    configurationId
+                },
+                cacheOptions
+            });
+        },
+        // Don't refetch query automatically so we don't reset user inputs
+        refetchInterval: false,
+        enabled: configurationId !== undefined
+    });
+}
+
 export function updateSettingsKey(userPath: UserPath) {
     return ["user-data", toUserApiPath(userPath)];
 }
@@ -146,16 +172,20 @@ export function searchDbQueryKey(library: Library, cacheOptions: CacheOptions) {
 export function getSearchDbQuery(library: Library, cacheOptions: CacheOptions) {
     return queryOptions<MiniSearch | null>({
         queryKey: searchDbQueryKey(library, cacheOptions),
-        queryFn: async () =>
-            apiGet("/search-db" + toLibraryPath(library), {
+        queryFn: async () => {
+            const result = await apiGet("/search-db" + toLibraryPath(library), {
                 cacheOptions
-            }).then((result) => {
-                if (!result.searchDb) {
-                    // Have to use null since TanstackQuery doesn't allow null
-                    return null;
-                }
-                return MiniSearch.loadJSON(result.searchDb, SEARCH_OPTIONS);
-            }),
+            });
+            if (!result.searchDbUrl) {
+                // Have to use null since TanstackQuery doesn't allow null
+                return null;
+            }
+            // Search indexes are built by the backend and never change once uploaded
+            const searchDb = await fetch(result.searchDbUrl).then((response) =>
+                response.text()
+            );
+            return MiniSearch.loadJSON(searchDb, SEARCH_OPTIONS);
+        },
         staleTime: Infinity,
         gcTime: Infinity
     });
@@ -2,7 +2,7 @@ import MiniSearch, {
     Options,
     SearchResult as MiniSearchResult
 } from "minisearch";
-import { Favorites, LibraryObj, Vendor } from "../api/models";
+import { Favorites, Vendor } from "../api/models";
 
 /**
  * A user facing name to use for elements currently being filtered/searched on.
@@ -20,6 +20,7 @@ const deliminator = "^";
 
 /**
  * Adds spaces to a given string so prefix matching is more efficient.
+ * The backend builds search indexes using a copy of this in backend/common/search_index.py, so the two must be kept in sync.
  */
 export function processTerm(term: string): string[] {
     // Split between lowercase-to-uppercase (camelCase -> camel case)
@@ -75,31 +76,6 @@ export const SEARCH_OPTIONS: Options<SearchDocument> = {
     processTerm
 };
 
-export function buildSearchDb(
-    libraryData: LibraryObj
-): MiniSearch<SearchDocument> {
-    const searchDb = new MiniSearch<SearchDocument>(SEARCH_OPTIONS);
-
-    const searchDocuments: SearchDocument[] = Object.values(
-        libraryData.elements
-    )
-        .filter((element) => !!element)
-        .map((element) => {
-            const parentDocument = libraryData.documents[element.documentId];
-            return {
-                id: element.id,
-                documentId: element.documentId,
-                isVisible: element.isVisible,
-                vendors: element.vendors,
-                name: element.name,
-                documentName: parentDocument?.name ?? ""
-            };
-        });
-
-    searchDb.addAll(searchDocuments);
-    return searchDb;
-}
-
 export interface SearchFilters {
     documentId?: string;
     vendors?: Vendor[];
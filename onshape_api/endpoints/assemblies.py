@@ -56,27 +56,20 @@ def create_assembly(api: Api, workspace_path: InstancePath, assembly_name: str)
     )
 
 
-def add_element_to_assembly(
-    api: Api,
-    assembly_path: ElementPath,
+def make_insert_instance(
     element_path: ElementPath,
     element_type: ElementType,
     configuration: dict[str, str] | str | None = None,
     part_types: list[PartType] | None = None,
-    use_transform: bool = False,
-) -> Any:
+) -> dict:
     """
-    Adds the contents of an element tab to an assembly.
+    Constructs an instance which can be used to insert the contents of an element tab into an assembly.
 
     Parameters:
-        assembly_path: The path to the assembly to add to.
         element_path: The path to the element tab to insert into the assembly.
         element_type: The type of the element being inserted (part studio or assembly).
         part_types: If inserting a part studio, the types of parts to include. If None, defaults to PARTS and COMPOSITE_PARTS.
-        use_transform: If True, the transformedinstances endpoint is used. Otherwise, the default endpoint is used and nothing is returned.
     """
-    assert_workspace(assembly_path)
-
     instance = {}
     if configuration != None:
         instance["configuration"] = (
@@ -104,18 +97,37 @@ def add_element_to_assembly(
         )
 
     instance.update(ElementPath.to_api_object(element_path))
+    return instance
+
+
+def add_element_to_assembly(
+    api: Api,
+    assembly_path: ElementPath,
+    element_path: ElementPath,
+    element_type: ElementType,
+    configuration: dict[str, str] | str | None = None,
+    part_types: list[PartType] | None = None,
+    use_transform: bool = False,
+) -> Any:
+    """
+    Adds the contents of an element tab to an assembly.
+
+    Parameters:
+        assembly_path: The path to the assembly to add to.
+        element_path: The path to the element tab to insert into the assembly.
+        element_type: The type of the element being inserted (part studio or assembly).
+        part_types: If inserting a part studio, the types of parts to include. If None, defaults to PARTS and COMPOSITE_PARTS.
+        use_transform: If True, the transformedinstances endpoint is used. Otherwise, the default endpoint is used and nothing is returned.
+    """
+    assert_workspace(assembly_path)
+
+    instance = make_insert_instance(
+        element_path, element_type, configuration=configuration, part_types=part_types
+    )
 
     if use_transform:
         # Use the transformedinstances endpoint to get a return value
-        body = {
-            "transformGroups": [
-                {"instances": [instance], "transform": IDENTITY_TRANSFORM}
-            ]
-        }
-        return api.post(
-            api_path("assemblies", assembly_path, ElementPath, "transformedinstances"),
-            body=body,
-        )
+        return add_instances_to_assembly(api, assembly_path, [instance])
 
     api.post(
         api_path("assemblies", assembly_path, ElementPath, "instances"),
@@ -125,6 +137,31 @@ def add_element_to_assembly(
     return None
 
 
+def add_instances_to_assembly(
+    api: Api, assembly_path: ElementPath, instances: Iterable[dict]
+) -> Any:
+    """
+    Adds multiple instances to an assembly in a single request using the transformedinstances endpoint.
+
+    Parameters:
+        instances: Instances constructed using make_insert_instance.
+
+    Returns:
+        The response from Onshape. insertInstanceResponses is in the same order as instances.
+    """
+    assert_workspace(assembly_path)
+    body = {
+        "transformGroups": [
+            {"instances": [instance], "transform": IDENTITY_TRANSFORM}
+            for instance in instances
+        ]
+    }
+    return api.post(
+        api_path("assemblies", assembly_path, ElementPath, "transformedinstances"),
+        body=body,
+    )
+
+
 def transform_instance(
     api: Api,
     assembly_path: ElementPath,
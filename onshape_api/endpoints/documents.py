@@ -28,6 +28,53 @@ def get_document(api: Api, document_path: DocumentPath) -> dict:
     )
 
 
+class DocumentFilter(enum.IntEnum):
+    """Describes the sets of documents which can be listed."""
+
+    MY_DOCUMENTS = 0
+    CREATED = 1
+    SHARED = 2
+    TRASH = 3
+    PUBLIC = 4
+    RECENT = 5
+    BY_OWNER = 6
+    BY_COMPANY = 7
+    TEAM = 9
+
+
+def get_documents(
+    api: Api,
+    filter: DocumentFilter = DocumentFilter.MY_DOCUMENTS,
+    owner: str | None = None,
+    owner_type: int | None = None,
+    sort_column: str = "modifiedAt",
+    sort_order: str = "desc",
+    offset: int = 0,
+    limit: int = 20,
+) -> dict:
+    """Lists a page of documents.
+
+    Args:
+        owner: The id of the user, company, or team which owns the documents. Required for DocumentFilter.BY_OWNER.
+        owner_type: The type of the owner, as returned in the owner field of a document.
+
+    Returns:
+        A page with the documents in items and the url of the next page, if any, in next.
+    """
+    query: dict = {
+        "filter": filter,
+        "sortColumn": sort_column,
+        "sortOrder": sort_order,
+        "offset": offset,
+        "limit": limit,
+    }
+    if owner != None:
+        query["owner"] = owner
+    if owner_type != None:
+        query["ownerType"] = owner_type
+    return api.get(api_path("documents"), query=query)
+
+
 def get_workspaces(api: Api, document_path: DocumentPath) -> list[dict]:
     """Retrieves the workspaces in a given document."""
     return api.get(api_path("documents", document_path, DocumentPath, "workspaces"))